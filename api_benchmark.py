@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+API Load Benchmark for TimeTracker Pro
+Starts the backend locally in a child process, seeds synthetic companies,
+employees and time entries, then drives a concurrent mixed workload (logins,
+QR scans, dashboard loads, hours reports) for a fixed duration. Throughput and
+p50/p95/p99 latency per endpoint are written to a JSON file; pass a previous
+file as --baseline to diff against it and fail on p95 regressions.
+
+--mongo memory runs against an in-process mongomock stand-in (needs
+mongomock-motor); --mongo local uses a scratch database on the MongoDB
+configured in backend/.env (MONGO_URL). Absolute numbers are only comparable
+between runs with the same --mongo mode, scale and machine.
+
+Usage: python api_benchmark.py [--mongo memory] [--companies 10] [--employees-per-company 100]
+                               [--days 30] [--concurrency 32] [--duration 30]
+                               [--output api_benchmark.json] [--baseline previous.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import requests
+
+BACKEND_DIR = Path(__file__).resolve().parent / "backend"
+PASSWORD = "bench123"
+SEED_CHUNK = 10000
+DEFAULT_MIX = "login=5,scan=40,dashboard=40,report=15"
+
+
+def company_id(c):
+    return f"bench-company-{c}"
+
+
+def admin_username(c):
+    return f"bench-admin-{c}"
+
+
+def qr_code(c, e):
+    return f"QR-BENCH-{c}-{e}"
+
+
+# === SERVER (child process) ===
+
+def serve(args):
+    """Run the API with seeded data; called in the child process"""
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ["DB_NAME"] = args.db
+    sys.path.insert(0, str(BACKEND_DIR))
+
+    import bcrypt
+    import uvicorn
+
+    import server
+
+    if args.mongo == "memory":
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            print("❌ --mongo memory needs mongomock-motor (pip install mongomock-motor)")
+            return 1
+        server.client = AsyncMongoMockClient()
+        server.db = server.client[args.db]
+        # mongomock does not implement {"$type": "null"}; every stored entry
+        # has a check_out field, so equality with None selects the same rows
+        server.OPEN_TIME_ENTRY_FILTER.clear()
+        server.OPEN_TIME_ENTRY_FILTER["check_out"] = None
+    else:
+        server.db = server.client[args.db]
+
+    # Production cost factor, so logins measure real bcrypt work
+    password_hash = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+
+    async def reset():
+        await server.client.drop_database(args.db)
+
+    async def seed():
+        now = datetime.utcnow()
+        await server.db.companies.insert_many([
+            {"id": company_id(c), "name": f"Bench Company {c}", "created_at": now}
+            for c in range(args.companies)
+        ])
+        await server.db.users.insert_many([
+            {
+                "id": f"bench-admin-{c}",
+                "username": admin_username(c),
+                "password_hash": password_hash,
+                "type": "admin",
+                "role": "admin",
+                "company_id": company_id(c),
+                "company_name": f"Bench Company {c}",
+                "created_at": now,
+            }
+            for c in range(args.companies)
+        ])
+        await server.db.employees.insert_many([
+            {
+                "id": f"bench-employee-{c}-{e}",
+                "name": f"Employee {c}-{e}",
+                "qr_code": qr_code(c, e),
+                "company_id": company_id(c),
+                "is_active": True,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for c in range(args.companies)
+            for e in range(args.employees_per_company)
+        ])
+        batch = []
+        for day in range(1, args.days + 1):
+            check_in = (now - timedelta(days=day)).replace(hour=8, minute=0, second=0, microsecond=0)
+            for c in range(args.companies):
+                for e in range(args.employees_per_company):
+                    batch.append({
+                        "id": f"bench-entry-{c}-{e}-{day}",
+                        "employee_id": f"bench-employee-{c}-{e}",
+                        "company_id": company_id(c),
+                        "check_in": check_in,
+                        "check_out": check_in + timedelta(hours=8),
+                        "date": check_in.strftime("%Y-%m-%d"),
+                        "total_hours": 8.0,
+                        "created_at": now,
+                        "updated_at": now,
+                    })
+                    if len(batch) >= SEED_CHUNK:
+                        await server.db.time_entries.insert_many(batch)
+                        batch = []
+        if batch:
+            await server.db.time_entries.insert_many(batch)
+        await server.rebuild_hours_rollups()
+
+    async def cleanup():
+        if args.mongo == "local":
+            await server.client.drop_database(args.db)
+
+    # Reset before migrations run, seed after them, drop before the client closes
+    server.app.router.on_startup.insert(0, reset)
+    server.app.router.on_startup.append(seed)
+    server.app.router.on_shutdown.insert(0, cleanup)
+    uvicorn.run(server.app, host="127.0.0.1", port=args.port, log_level="warning")
+    return 0
+
+
+# === LOAD GENERATOR (parent process) ===
+
+class ApiBenchmark:
+    def __init__(self, args):
+        self.args = args
+        self.base_url = f"http://127.0.0.1:{args.port}/api"
+        self.mix = self.parse_mix(args.mix)
+        self.samples = {}
+        self.errors = {}
+        self.lock = threading.Lock()
+        today = datetime.utcnow()
+        self.report_from = (today - timedelta(days=args.days)).strftime("%Y-%m-%d")
+        self.report_to = today.strftime("%Y-%m-%d")
+        print(f"🔧 Benchmarking local backend at: {self.base_url} (mongo: {args.mongo})")
+        print("=" * 60)
+
+    @staticmethod
+    def parse_mix(mix):
+        weights = {}
+        for part in mix.split(","):
+            name, weight = part.split("=")
+            if name not in ("login", "scan", "dashboard", "report"):
+                raise ValueError(f"Unknown workload '{name}'")
+            weights[name] = float(weight)
+        return weights
+
+    def start_server(self):
+        command = [
+            sys.executable, str(Path(__file__).resolve()), "--serve",
+            "--mongo", self.args.mongo, "--db", self.args.db, "--port", str(self.args.port),
+            "--companies", str(self.args.companies),
+            "--employees-per-company", str(self.args.employees_per_company),
+            "--days", str(self.args.days),
+        ]
+        self.process = subprocess.Popen(command, cwd=str(BACKEND_DIR))
+        deadline = time.monotonic() + self.args.startup_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {self.process.returncode}")
+            try:
+                requests.get(f"{self.base_url}/", timeout=1)
+                return
+            except requests.exceptions.ConnectionError:
+                time.sleep(0.5)
+        raise RuntimeError("Server did not start in time")
+
+    def stop_server(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+    def record(self, name, response, elapsed_ms, recording):
+        if not recording:
+            return
+        with self.lock:
+            if response.status_code < 400:
+                self.samples.setdefault(name, []).append(elapsed_ms)
+            else:
+                errors = self.errors.setdefault(name, {})
+                errors[str(response.status_code)] = errors.get(str(response.status_code), 0) + 1
+
+    def call(self, session, name, method, path, recording, **kwargs):
+        start = time.perf_counter()
+        response = session.request(method, f"{self.base_url}{path}", timeout=60, **kwargs)
+        self.record(name, response, (time.perf_counter() - start) * 1000, recording)
+        return response
+
+    def login(self, session, company, recording):
+        response = self.call(
+            session, "POST /api/auth/login", "POST", "/auth/login", recording,
+            json={"username": admin_username(company), "password": PASSWORD},
+        )
+        if response.status_code == 200:
+            session.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+
+    def run_operation(self, operation, session, company, rng, recording):
+        if operation == "login":
+            self.login(session, company, recording)
+        elif operation == "scan":
+            employee = rng.randrange(self.args.employees_per_company)
+            self.call(
+                session, "POST /api/time-entries/scan", "POST", "/time-entries/scan", recording,
+                json={"qr_code": qr_code(company, employee)},
+            )
+        elif operation == "dashboard":
+            self.call(session, "GET /api/employees", "GET", "/employees", recording)
+            self.call(session, "GET /api/time-entries/page", "GET", "/time-entries/page?limit=100", recording)
+        elif operation == "report":
+            self.call(
+                session, "GET /api/reports/hours", "GET", "/reports/hours", recording,
+                params={"date_from": self.report_from, "date_to": self.report_to, "period": "day"},
+            )
+
+    def worker(self, index, stop_at, recording):
+        rng = random.Random(self.args.seed * 1000 + index)
+        company = index % self.args.companies
+        operations = list(self.mix)
+        weights = [self.mix[name] for name in operations]
+        with requests.Session() as session:
+            self.login(session, company, recording=False)
+            while time.monotonic() < stop_at:
+                self.run_operation(rng.choices(operations, weights)[0], session, company, rng, recording)
+
+    def drive(self, seconds, recording):
+        stop_at = time.monotonic() + seconds
+        with ThreadPoolExecutor(max_workers=self.args.concurrency) as pool:
+            list(pool.map(lambda i: self.worker(i, stop_at, recording), range(self.args.concurrency)))
+
+    @staticmethod
+    def percentile(sorted_samples, fraction):
+        return sorted_samples[min(int(len(sorted_samples) * fraction), len(sorted_samples) - 1)]
+
+    def summarize(self, elapsed):
+        endpoints = {}
+        for name in sorted(set(self.samples) | set(self.errors)):
+            samples = sorted(self.samples.get(name, []))
+            errors = self.errors.get(name, {})
+            endpoint = {
+                "requests": len(samples),
+                "errors": errors,
+                "throughput_rps": len(samples) / elapsed,
+            }
+            if samples:
+                endpoint.update({
+                    "mean_ms": sum(samples) / len(samples),
+                    "p50_ms": self.percentile(samples, 0.50),
+                    "p95_ms": self.percentile(samples, 0.95),
+                    "p99_ms": self.percentile(samples, 0.99),
+                })
+            endpoints[name] = endpoint
+        total = sum(len(samples) for samples in self.samples.values())
+        return {
+            "meta": {
+                "timestamp": datetime.utcnow().isoformat(),
+                "git_commit": self.git_commit(),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "cpu_count": os.cpu_count(),
+                "mongo": self.args.mongo,
+                "companies": self.args.companies,
+                "employees_per_company": self.args.employees_per_company,
+                "days": self.args.days,
+                "concurrency": self.args.concurrency,
+                "duration_seconds": elapsed,
+                "mix": self.mix,
+                "seed": self.args.seed,
+            },
+            "total_throughput_rps": total / elapsed,
+            "endpoints": endpoints,
+        }
+
+    @staticmethod
+    def git_commit():
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=Path(__file__).parent
+            ).stdout.strip() or None
+        except OSError:
+            return None
+
+    @staticmethod
+    def print_summary(results):
+        print(f"\n📊 {results['total_throughput_rps']:.1f} req/s overall")
+        for name, endpoint in results["endpoints"].items():
+            if "p50_ms" not in endpoint:
+                print(f"   {name:<28} no successful requests, errors {endpoint['errors']}")
+                continue
+            print(
+                f"   {name:<28} {endpoint['throughput_rps']:8.1f} req/s  p50 {endpoint['p50_ms']:8.2f} ms  "
+                f"p95 {endpoint['p95_ms']:8.2f} ms  p99 {endpoint['p99_ms']:8.2f} ms"
+                + (f"  errors {endpoint['errors']}" if endpoint["errors"] else "")
+            )
+
+    def run(self):
+        total = self.args.companies * self.args.employees_per_company
+        print(
+            f"\n📦 Seeding {self.args.companies} companies, {total:,} employees, "
+            f"{total * self.args.days:,} time entries..."
+        )
+        self.start_server()
+        try:
+            print(f"\n🔥 Warming up for {self.args.warmup} s")
+            self.drive(self.args.warmup, recording=False)
+            print(f"\n🚀 Running {self.args.concurrency} workers for {self.args.duration} s, mix {self.args.mix}")
+            start = time.perf_counter()
+            self.drive(self.args.duration, recording=True)
+            elapsed = time.perf_counter() - start
+        finally:
+            self.stop_server()
+        results = self.summarize(elapsed)
+        self.print_summary(results)
+        return results
+
+
+def compare(results, baseline, max_regression):
+    """Print per-endpoint changes against a baseline; returns the regressed endpoints"""
+    print(f"\n📈 Compared with baseline from {baseline['meta']['timestamp']} ({baseline['meta'].get('git_commit')})")
+    for key in ("mongo", "companies", "employees_per_company", "days", "concurrency", "mix"):
+        if baseline["meta"].get(key) != results["meta"][key]:
+            print(f"   ⚠️  {key} differs: baseline {baseline['meta'].get(key)}, now {results['meta'][key]}")
+    regressions = []
+    for name, endpoint in results["endpoints"].items():
+        before = baseline["endpoints"].get(name)
+        if not before or "p95_ms" not in before or "p95_ms" not in endpoint:
+            print(f"   {name:<28} no comparable baseline")
+            continue
+        changes = {
+            metric: (endpoint[metric] - before[metric]) / before[metric] if before[metric] else 0.0
+            for metric in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms")
+        }
+        regressed = changes["p95_ms"] > max_regression
+        if regressed:
+            regressions.append(name)
+        print(
+            f"   {'❌' if regressed else '✅'} {name:<28} "
+            + "  ".join(f"{metric.replace('_ms', '')} {change:+6.1%}" for metric, change in changes.items())
+        )
+    return regressions
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a mixed-workload load benchmark against a local API")
+    parser.add_argument("--mongo", choices=("memory", "local"), default="memory")
+    parser.add_argument("--db", default="timetracker_api_benchmark")
+    parser.add_argument("--companies", type=int, default=10)
+    parser.add_argument("--employees-per-company", type=int, default=100)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Workload weights (default {DEFAULT_MIX})")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--port", type=int, default=0, help="Port for the local server (default: any free port)")
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    parser.add_argument("--output", default="api_benchmark.json")
+    parser.add_argument("--baseline", help="Previous results file to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed p95 increase (0.2 = 20%%)")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args)
+
+    args.port = args.port or free_port()
+    benchmark = ApiBenchmark(args)
+    try:
+        results = benchmark.run()
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return 1
+    Path(args.output).write_text(json.dumps(results, indent=2))
+    print(f"\n💾 Results written to {args.output}")
+
+    print("\n" + "=" * 60)
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text()), args.max_regression)
+        if regressions:
+            print(f"❌ p95 regressed by more than {args.max_regression:.0%} on: {', '.join(regressions)}")
+            return 1
+    print("✅ Benchmark complete")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+"""
+Prometheus metrics for TimeTracker Pro
+Minimal counters, gauges and histograms rendered in the Prometheus text
+exposition format, so the API can serve /metrics without an extra
+dependency. Every metric is thread-safe: pymongo reports command events
+from its own threads.
+"""
+
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from pymongo import monitoring
+
+# Seconds; covers a cached lookup (~1 ms) up to a slow report or bcrypt call
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + "}"
+
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: LabelValues) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self) -> List[Sample]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> [per-bucket counts, sum]
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * len(self.buckets), 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+
+    def samples(self) -> List[Sample]:
+        samples = []
+        with self._lock:
+            for key, (counts, total) in self._values.items():
+                labels = self._labels(key)
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    samples.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+                samples.append((f"{self.name}_sum", labels, total))
+                samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+
+class CollectedMetric(_Metric):
+    """A metric whose samples are read from existing stats at scrape time"""
+
+    def __init__(self, name: str, documentation: str, type_name: str,
+                 collect: Callable[[], Iterable[Tuple[Dict[str, str], float]]]):
+        super().__init__(name, documentation)
+        self.type_name = type_name
+        self._collect = collect
+
+    def samples(self) -> List[Sample]:
+        return [(self.name, labels, value) for labels, value in self._collect()]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def collected(self, name: str, documentation: str, type_name: str,
+                  collect: Callable[[], Iterable[Tuple[Dict[str, str], float]]]) -> CollectedMetric:
+        return self._register(CollectedMetric(name, documentation, type_name, collect))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Records MongoDB command latency per collection and command name.
+    Pass an instance to AsyncIOMotorClient(event_listeners=[...])."""
+
+    def __init__(self, duration: Histogram, failures: Counter):
+        self.duration = duration
+        self.failures = failures
+        # (connection, request id) -> collection, filled in by started()
+        self._pending: Dict[tuple, str] = {}
+
+    @staticmethod
+    def _collection(event: monitoring.CommandStartedEvent) -> str:
+        if event.command_name == "getMore":
+            return str(event.command.get("collection", ""))
+        target = event.command.get(event.command_name)
+        return target if isinstance(target, str) else ""
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        self._pending[(event.connection_id, event.request_id)] = self._collection(event)
+
+    def _finish(self, event) -> str:
+        return self._pending.pop((event.connection_id, event.request_id), "")
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        collection = self._finish(event)
+        self.duration.observe(event.duration_micros / 1e6, collection=collection, command=event.command_name)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        collection = self._finish(event)
+        self.duration.observe(event.duration_micros / 1e6, collection=collection, command=event.command_name)
+        self.failures.inc(collection=collection, command=event.command_name)
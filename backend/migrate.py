@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Data migrations for TimeTracker Pro
+Run from the backend directory so server.py picks up backend/.env.
+
+Usage: python migrate.py status
+       python migrate.py run
+       python migrate.py backfill-time-entry-company [--batch-size 500]
+       python migrate.py rebuild-hours-rollups
+"""
+
+import argparse
+import asyncio
+import sys
+
+import server
+
+
+async def status(args):
+    state = await server.get_migration_state()
+    print(f"Schema version {state['version']} of {server.LATEST_MIGRATION}")
+    for version, name, _ in server.MIGRATIONS:
+        marker = "✅" if version <= state["version"] else "⏳"
+        print(f"   {marker} {version:04d} {name}")
+    indexes_current = state["index_fingerprint"] == server.index_specs_fingerprint()
+    print(f"   {'✅' if indexes_current else '⏳'} indexes")
+
+
+async def run(args):
+    await server.run_migrations()
+    state = await server.get_migration_state()
+    print(f"✅ Database at schema version {state['version']}")
+
+
+async def backfill_time_entry_company(args):
+    await server.ensure_indexes()
+    modified = await server.backfill_time_entry_company_ids(batch_size=args.batch_size)
+    print(f"✅ Backfilled company_id on {modified} time entries")
+
+
+async def rebuild_hours_rollups(args):
+    await server.ensure_indexes()
+    written = await server.rebuild_hours_rollups()
+    print(f"✅ Rebuilt {written} hours rollup documents")
+
+
+COMMANDS = {
+    "status": status,
+    "run": run,
+    "backfill-time-entry-company": backfill_time_entry_company,
+    "rebuild-hours-rollups": rebuild_hours_rollups,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run TimeTracker Pro data migrations")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("status", help="Show applied and pending migrations")
+    subparsers.add_parser("run", help="Apply pending migrations (the API also does this on startup)")
+
+    backfill = subparsers.add_parser(
+        "backfill-time-entry-company",
+        help="Copy each employee's company_id onto their time entries",
+    )
+    backfill.add_argument("--batch-size", type=int, default=500)
+
+    subparsers.add_parser(
+        "rebuild-hours-rollups",
+        help="Recompute the daily and monthly hours rollups from time entries",
+    )
+
+    args = parser.parse_args()
+    try:
+        asyncio.run(COMMANDS[args.command](args))
+    finally:
+        server.client.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
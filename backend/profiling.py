@@ -0,0 +1,230 @@
+"""
+Request profiling for TimeTracker Pro
+Opt-in breakdown of where a request spends its time: MongoDB commands,
+Pydantic validation, response serialization, the endpoint itself and
+everything else (dependencies, middleware). A request is profiled when it
+carries the trigger header or is picked by sampling. The breakdown is
+returned in a Server-Timing header; requests slower than the threshold are
+logged and, when an output directory is set, saved as JSON plus a cProfile
+dump readable with `python -m pstats` or snakeviz.
+"""
+
+import cProfile
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+_current_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("request_profile", default=None)
+# cProfile can only trace one request per thread at a time
+_cprofile_lock = threading.Lock()
+_hooks_installed = False
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.phases: Dict[str, float] = {"endpoint": 0.0, "validation": 0.0, "serialization": 0.0}
+        self.queries: List[dict] = []
+        # Mongo events arrive on Motor's worker threads
+        self._lock = threading.Lock()
+
+    def add(self, phase: str, seconds: float) -> None:
+        with self._lock:
+            self.phases[phase] += seconds
+
+    def total_except(self, phase: str) -> float:
+        with self._lock:
+            return sum(seconds for name, seconds in self.phases.items() if name != phase)
+
+    def add_query(self, collection: str, command: str, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self.queries.append({"collection": collection, "command": command, "ms": seconds * 1000, "ok": ok})
+
+    def summary(self, total_seconds: float, status: int) -> dict:
+        phases_ms = {phase: seconds * 1000 for phase, seconds in self.phases.items()}
+        total_ms = total_seconds * 1000
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": status,
+            "total_ms": total_ms,
+            "db_ms": sum(query["ms"] for query in self.queries),
+            **{f"{phase}_ms": ms for phase, ms in phases_ms.items()},
+            "other_ms": max(total_ms - sum(phases_ms.values()), 0.0),
+            "queries": self.queries,
+        }
+
+    def server_timing(self, elapsed_seconds: float) -> str:
+        db_ms = sum(query["ms"] for query in self.queries)
+        parts = [f"db;dur={db_ms:.2f}"]
+        parts += [f"{phase};dur={seconds * 1000:.2f}" for phase, seconds in self.phases.items()]
+        parts.append(f"total;dur={elapsed_seconds * 1000:.2f}")
+        return ", ".join(parts)
+
+
+class ProfileCommandListener(monitoring.CommandListener):
+    """Attributes MongoDB command time to the request being profiled.
+    Motor copies the caller's context into its worker threads, so the
+    profile is visible from started()."""
+
+    def __init__(self):
+        self._pending: Dict[tuple, tuple] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        profile = _current_profile.get()
+        if profile is None:
+            return
+        target = event.command.get("collection" if event.command_name == "getMore" else event.command_name)
+        self._pending[(event.connection_id, event.request_id)] = (
+            profile, target if isinstance(target, str) else ""
+        )
+
+    def _finish(self, event, ok: bool) -> None:
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is not None:
+            profile, collection = pending
+            profile.add_query(collection, event.command_name, event.duration_micros / 1e6, ok)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finish(event, True)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finish(event, False)
+
+
+def _timed(phase: str, func):
+    def wrapper(*args, **kwargs):
+        profile = _current_profile.get()
+        if profile is None:
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.add(phase, time.perf_counter() - start)
+    return wrapper
+
+
+def _timed_async(phase: str, func):
+    async def wrapper(*args, **kwargs):
+        profile = _current_profile.get()
+        if profile is None:
+            return await func(*args, **kwargs)
+        start = time.perf_counter()
+        nested_before = profile.total_except(phase)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            # Endpoints that build their own response (ORJSONResponse) serialize
+            # inside this call; report that time once, under its own phase
+            nested = profile.total_except(phase) - nested_before
+            profile.add(phase, time.perf_counter() - start - nested)
+    return wrapper
+
+
+def install_framework_hooks() -> None:
+    """Wrap the FastAPI/Starlette internals that run the endpoint, validate
+    with Pydantic and render JSON (including the orjson fast path used by
+    the list routes). The wrappers only time anything while a
+    profile is active."""
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    import fastapi.routing
+    from fastapi._compat import ModelField
+    from fastapi.responses import ORJSONResponse
+    from starlette.responses import JSONResponse
+
+    fastapi.routing.run_endpoint_function = _timed_async("endpoint", fastapi.routing.run_endpoint_function)
+    ModelField.validate = _timed("validation", ModelField.validate)
+    ModelField.serialize = _timed("serialization", ModelField.serialize)
+    JSONResponse.render = _timed("serialization", JSONResponse.render)
+    # Overrides render, so it is not covered by the JSONResponse hook
+    ORJSONResponse.render = _timed("serialization", ORJSONResponse.render)
+    _hooks_installed = True
+
+
+class ProfilingMiddleware:
+    def __init__(self, app, header: str, token: Optional[str], sample_rate: float,
+                 slow_ms: float, output_dir: Optional[str]):
+        self.app = app
+        self.header = header.lower().encode("latin-1")
+        self.token = token
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.output_dir = Path(output_dir) if output_dir else None
+        if self.output_dir:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+
+    def _requested(self, scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == self.header:
+                requested = value.decode("latin-1")
+                return requested == self.token if self.token else requested not in ("", "0", "false")
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"])
+        context_token = _current_profile.set(profile)
+        profiler = None
+        if self.output_dir and _cprofile_lock.acquire(blocking=False):
+            profiler = cProfile.Profile()
+            profiler.enable()
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", profile.server_timing(time.perf_counter() - start).encode("latin-1")))
+                headers.append((b"x-profile-id", profile.id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            elapsed = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+                _cprofile_lock.release()
+            _current_profile.reset(context_token)
+            if elapsed * 1000 >= self.slow_ms:
+                self._record(profile.summary(elapsed, status), profiler)
+
+    def _record(self, summary: dict, profiler: Optional[cProfile.Profile]) -> None:
+        logger.warning(
+            f"Slow request {summary['method']} {summary['path']} {summary['total_ms']:.0f} ms "
+            f"(db {summary['db_ms']:.0f} ms in {len(summary['queries'])} queries, "
+            f"validation {summary['validation_ms']:.0f} ms, serialization {summary['serialization_ms']:.0f} ms) "
+            f"profile {summary['id']}"
+        )
+        if not self.output_dir:
+            return
+        stem = f"{datetime.utcnow():%Y%m%dT%H%M%S}-{summary['id']}"
+        try:
+            (self.output_dir / f"{stem}.json").write_text(json.dumps(summary, indent=2))
+            if profiler is not None:
+                profiler.dump_stats(str(self.output_dir / f"{stem}.prof"))
+        except OSError as e:
+            logger.warning(f"Could not write profile {stem}: {e}")
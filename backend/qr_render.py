@@ -0,0 +1,24 @@
+"""
+QR code rendering for TimeTracker Pro
+Kept apart from server.py so the spawned processes that render badge batches
+import only qrcode and Pillow, not the application with its database client.
+"""
+
+import io
+
+import qrcode
+import qrcode.image.svg
+
+
+def render_qr(data: str, image_format: str = "png", box_size: int = 10, border: int = 5) -> bytes:
+    """Render a QR code as PNG or SVG bytes"""
+    qr = qrcode.QRCode(version=1, box_size=box_size, border=border)
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    buf = io.BytesIO()
+    if image_format == "svg":
+        qr.make_image(image_factory=qrcode.image.svg.SvgPathImage).save(buf)
+    else:
+        qr.make_image(fill_color="black", back_color="white").save(buf, format='PNG')
+    return buf.getvalue()
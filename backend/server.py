@@ -1,36 +1,187 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import FileResponse, ORJSONResponse, Response, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import InsertOne, ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, Field, ValidationError
+from typing import Any, Dict, List, Optional
+from collections import OrderedDict, deque
 import uuid
-from datetime import datetime, timedelta
+import time
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 import jwt
 import bcrypt
-import qrcode
 import io
 import base64
+import json
+import hashlib
+import secrets
+import socket
+import re
+import zipfile
+import csv
+import codecs
+import mimetypes
+from PIL import Image, ImageDraw, ImageFont
+from metrics import MetricsRegistry, MongoCommandMetrics
+from profiling import ProfileCommandListener, ProfilingMiddleware, install_framework_hooks
+from compression import CompressionMiddleware, choose_encoding
+from qr_render import render_qr
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Metrics served at /metrics. Created before the Mongo client so it can
+# report command timings; set METRICS_TOKEN to require a bearer token.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+metrics_registry = MetricsRegistry()
+http_requests_total = metrics_registry.counter(
+    "timetracker_http_requests_total", "HTTP requests by route and status", ("method", "route", "status")
+)
+http_request_seconds = metrics_registry.histogram(
+    "timetracker_http_request_duration_seconds", "HTTP request latency by route", ("method", "route")
+)
+http_requests_in_flight = metrics_registry.gauge(
+    "timetracker_http_requests_in_flight", "HTTP requests currently being served"
+)
+mongo_command_seconds = metrics_registry.histogram(
+    "timetracker_mongo_command_duration_seconds", "MongoDB command latency", ("collection", "command")
+)
+mongo_command_failures = metrics_registry.counter(
+    "timetracker_mongo_command_failures_total", "Failed MongoDB commands", ("collection", "command")
+)
+bcrypt_seconds = metrics_registry.histogram(
+    "timetracker_bcrypt_duration_seconds", "Time spent inside bcrypt", ("operation",)
+)
+bcrypt_wait_seconds = metrics_registry.histogram(
+    "timetracker_bcrypt_wait_seconds", "Time bcrypt calls spent queued for a worker", ("operation",)
+)
+
+# Request profiling (off by default). When enabled, a request is profiled if it
+# sends PROFILE_HEADER (equal to PROFILE_TOKEN when set) or is sampled; those
+# slower than PROFILE_SLOW_MS are logged and dumped to PROFILE_DIR if set.
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'false').lower() == 'true'
+PROFILE_HEADER = os.environ.get('PROFILE_HEADER', 'X-Profile')
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', '500'))
+PROFILE_DIR = os.environ.get('PROFILE_DIR')
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(
+    mongo_url,
+    event_listeners=[MongoCommandMetrics(mongo_command_seconds, mongo_command_failures), ProfileCommandListener()]
+)
 db = client[os.environ['DB_NAME']]
 
 # JWT Configuration
 JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key-here')
 JWT_ALGORITHM = 'HS256'
-JWT_EXPIRATION_HOURS = 24
+ACCESS_TOKEN_EXPIRATION_MINUTES = int(os.environ.get('ACCESS_TOKEN_EXPIRATION_MINUTES', '15'))
+REFRESH_TOKEN_EXPIRATION_DAYS = int(os.environ.get('REFRESH_TOKEN_EXPIRATION_DAYS', '30'))
+TOKEN_CACHE_MAX_SIZE = int(os.environ.get('TOKEN_CACHE_MAX_SIZE', '10000'))
+# How often each worker pulls token revocations written by other workers
+TOKEN_REVOCATION_REFRESH_SECONDS = float(os.environ.get('TOKEN_REVOCATION_REFRESH_SECONDS', '5'))
+# How often each worker pulls list change versions bumped by other workers; a
+# conditional GET can answer 304 for changes made elsewhere until then
+CHANGE_VERSION_REFRESH_SECONDS = float(os.environ.get('CHANGE_VERSION_REFRESH_SECONDS', '2'))
+
+# Authenticated user cache. Each worker keeps its own copy, so the TTL bounds
+# how long another worker can serve a user changed elsewhere.
+USER_CACHE_TTL_SECONDS = float(os.environ.get('USER_CACHE_TTL_SECONDS', '30'))
+USER_CACHE_MAX_SIZE = int(os.environ.get('USER_CACHE_MAX_SIZE', '10000'))
+COMPANY_CACHE_TTL_SECONDS = float(os.environ.get('COMPANY_CACHE_TTL_SECONDS', '60'))
+
+# Password hashing pool. bcrypt releases the GIL, so a small thread pool keeps
+# hashing off the event loop; calls beyond workers + queue are rejected (429).
+BCRYPT_POOL_SIZE = int(os.environ.get('BCRYPT_POOL_SIZE', str(min(4, os.cpu_count() or 1))))
+BCRYPT_MAX_QUEUE = int(os.environ.get('BCRYPT_MAX_QUEUE', '32'))
+
+# Login throttling: failed attempts allowed per sliding window before an
+# exponentially growing lockout. 'mongo' shares state between workers.
+LOGIN_USER_MAX_FAILURES = int(os.environ.get('LOGIN_USER_MAX_FAILURES', '5'))
+LOGIN_USER_WINDOW_SECONDS = int(os.environ.get('LOGIN_USER_WINDOW_SECONDS', '900'))
+LOGIN_IP_MAX_FAILURES = int(os.environ.get('LOGIN_IP_MAX_FAILURES', '20'))
+LOGIN_IP_WINDOW_SECONDS = int(os.environ.get('LOGIN_IP_WINDOW_SECONDS', '300'))
+LOGIN_LOCKOUT_BASE_SECONDS = int(os.environ.get('LOGIN_LOCKOUT_BASE_SECONDS', '30'))
+LOGIN_LOCKOUT_MAX_SECONDS = int(os.environ.get('LOGIN_LOCKOUT_MAX_SECONDS', '3600'))
+LOGIN_THROTTLE_STORE = os.environ.get('LOGIN_THROTTLE_STORE', 'memory')
+LOGIN_THROTTLE_MAX_KEYS = int(os.environ.get('LOGIN_THROTTLE_MAX_KEYS', '100000'))
+# Only enable behind a proxy that sets X-Forwarded-For; otherwise clients can spoof it
+TRUST_FORWARDED_FOR = os.environ.get('TRUST_FORWARDED_FOR', 'false').lower() == 'true'
+
+# Write-behind for POST /api/time-entries: entries are acknowledged once queued
+# and inserted in batches. See TimeEntryWriteBuffer for the durability trade-off.
+WRITE_BEHIND_ENABLED = os.environ.get('WRITE_BEHIND_ENABLED', 'false').lower() == 'true'
+WRITE_BEHIND_MAX_QUEUE = int(os.environ.get('WRITE_BEHIND_MAX_QUEUE', '10000'))
+WRITE_BEHIND_BATCH_SIZE = int(os.environ.get('WRITE_BEHIND_BATCH_SIZE', '500'))
+WRITE_BEHIND_FLUSH_INTERVAL_MS = int(os.environ.get('WRITE_BEHIND_FLUSH_INTERVAL_MS', '50'))
+
+# Presence board: each worker resyncs from open entries this often, which also
+# picks up punches handled by other workers
+PRESENCE_RESYNC_SECONDS = float(os.environ.get('PRESENCE_RESYNC_SECONDS', '30'))
+PRESENCE_HEARTBEAT_SECONDS = 15
+PRESENCE_SUBSCRIBER_QUEUE = 100
+
+# Migrations: a worker holding the lock longer than this without renewing it
+# is presumed dead; other workers wait up to MIGRATION_WAIT_SECONDS for it.
+# The wait is never shorter than the lock, so a dead holder's lock expires
+# and is taken over before the waiters give up.
+MIGRATION_LOCK_SECONDS = int(os.environ.get('MIGRATION_LOCK_SECONDS', '600'))
+MIGRATION_WAIT_SECONDS = max(int(os.environ.get('MIGRATION_WAIT_SECONDS', '900')), MIGRATION_LOCK_SECONDS + 30)
+
+# Cascade deletion: documents depending on a deleted company or employee are
+# removed in the background, in batches of this size with a pause in between.
+# A job whose worker stops renewing its lease is resumed by another worker.
+CASCADE_BATCH_SIZE = int(os.environ.get('CASCADE_BATCH_SIZE', '1000'))
+CASCADE_BATCH_PAUSE_MS = int(os.environ.get('CASCADE_BATCH_PAUSE_MS', '50'))
+CASCADE_LEASE_SECONDS = int(os.environ.get('CASCADE_LEASE_SECONDS', '120'))
+CASCADE_POLL_SECONDS = float(os.environ.get('CASCADE_POLL_SECONDS', '30'))
+CASCADE_MAX_ATTEMPTS = 5
+
+# QR image cache. Images are content-addressed by payload and render options,
+# so entries never go stale; QR_CACHE_DIR adds an on-disk layer shared by workers.
+QR_CACHE_MAX_SIZE = int(os.environ.get('QR_CACHE_MAX_SIZE', '2048'))
+QR_CACHE_DIR = os.environ.get('QR_CACHE_DIR')
+QR_RENDER_WORKERS = int(os.environ.get('QR_RENDER_WORKERS', str(os.cpu_count() or 1)))
+
+# Bulk import: rows are validated and written in chunks of this size
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', '500'))
+IMPORT_MAX_ERRORS = 1000
+
+# Incremental sync: deletions are remembered this long (older cursors must
+# reload everything), and changes younger than the settle time are held back
+# so writes still in flight on other workers cannot be skipped
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.environ.get('SYNC_TOMBSTONE_RETENTION_DAYS', '30'))
+SYNC_SETTLE_SECONDS = float(os.environ.get('SYNC_SETTLE_SECONDS', '2'))
+
+# Offline kiosk batches: idempotency keys are remembered this long
+SCAN_BATCH_MAX_EVENTS = 1000
+# Single scans that lose a check-in race retry the toggle this many times
+SCAN_TOGGLE_ATTEMPTS = 3
+SCAN_EVENT_RETENTION_DAYS = int(os.environ.get('SCAN_EVENT_RETENTION_DAYS', '30'))
+# A key still pending after this long belongs to a request that died; it may be claimed again
+SCAN_CLAIM_LEASE_SECONDS = int(os.environ.get('SCAN_CLAIM_LEASE_SECONDS', '60'))
+
+# Responses at least this large are sent brotli/gzip compressed when accepted
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+# Optional: serve the built frontend (e.g. ../frontend/build) from this app
+FRONTEND_BUILD_DIR = os.environ.get('FRONTEND_BUILD_DIR')
 
 # Security
 security = HTTPBearer()
+# EventSource cannot send headers, so streams also accept ?access_token=
+optional_security = HTTPBearer(auto_error=False)
 
 # Create the main app without a prefix
 app = FastAPI(title="TimeTracker Pro API", version="1.0.0")
@@ -79,6 +230,11 @@ class LoginResponse(BaseModel):
     access_token: str
     token_type: str
     user: UserResponse
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None  # access token lifetime in seconds
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 class Company(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -98,6 +254,7 @@ class Employee(BaseModel):
     company_id: str
     is_active: bool = True
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
 
 class EmployeeCreate(BaseModel):
     name: str
@@ -110,11 +267,13 @@ class EmployeeUpdate(BaseModel):
 class TimeEntry(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     employee_id: str
+    company_id: Optional[str] = None  # denormalised from the employee
     check_in: datetime
     check_out: Optional[datetime] = None
     date: str
     total_hours: Optional[float] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
 
 class TimeEntryCreate(BaseModel):
     employee_id: str
@@ -125,6 +284,93 @@ class TimeEntryUpdate(BaseModel):
     check_in: Optional[datetime] = None
     check_out: Optional[datetime] = None
 
+class TimeEntryPage(BaseModel):
+    items: List[TimeEntry]
+    next_cursor: Optional[str] = None
+
+class SyncDeletion(BaseModel):
+    collection: str  # 'employees' or 'time_entries'
+    id: str
+    deleted_at: datetime
+
+class SyncResponse(BaseModel):
+    employees: List[Employee]
+    time_entries: List[TimeEntry]
+    deleted: List[SyncDeletion]
+    cursor: str
+    has_more: bool
+
+class DeletionJobStep(BaseModel):
+    collection: str
+    total: Optional[int] = None  # counted when the step starts
+    deleted: int = 0
+    done: bool = False
+
+class DeletionJob(BaseModel):
+    id: str
+    kind: str  # 'company' or 'employee'
+    target_id: str
+    company_id: Optional[str] = None
+    status: str  # 'pending', 'running', 'done' or 'failed'
+    steps: List[DeletionJobStep]
+    attempts: int = 0
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    finished_at: Optional[datetime] = None
+
+class HoursReportRow(BaseModel):
+    period: str  # day/week start date (YYYY-MM-DD) or month (YYYY-MM)
+    employee_id: Optional[str] = None
+    company_id: Optional[str] = None
+    total_hours: float
+    entry_count: int
+
+class HoursReport(BaseModel):
+    period: str
+    group_by: str
+    date_from: str
+    date_to: str
+    rows: List[HoursReportRow]
+
+class ImportRowError(BaseModel):
+    row: int
+    error: str
+
+class ImportReport(BaseModel):
+    total_rows: int
+    inserted: int
+    error_count: int
+    errors: List[ImportRowError]  # capped at IMPORT_MAX_ERRORS
+
+class ScanRequest(BaseModel):
+    qr_code: str
+
+class ScanResponse(BaseModel):
+    action: str  # 'check_in' or 'check_out'
+    employee_id: str
+    employee_name: str
+    time_entry: TimeEntry
+
+class ScanEvent(BaseModel):
+    idempotency_key: str
+    qr_code: str
+    scanned_at: datetime
+    action: Optional[str] = None  # 'check_in' or 'check_out'; toggles when omitted
+
+class ScanBatchRequest(BaseModel):
+    events: List[ScanEvent] = Field(..., max_length=SCAN_BATCH_MAX_EVENTS)
+
+class ScanEventResult(BaseModel):
+    idempotency_key: str
+    status: str  # 'applied', 'duplicate' or 'error'
+    action: Optional[str] = None
+    time_entry_id: Optional[str] = None
+    error: Optional[str] = None
+
+class ScanBatchResponse(BaseModel):
+    results: List[ScanEventResult]
+
 class StatusCheck(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     client_name: str
@@ -137,32 +383,494 @@ class QRResponse(BaseModel):
     qr_code_data: str
     qr_code_image: str  # base64 encoded image
 
+# === CACHING ===
+
+class TTLCache:
+    """Bounded in-process LRU cache whose entries expire after a fixed TTL
+    (or never, when ttl_seconds is None)"""
+
+    def __init__(self, max_size: int, ttl_seconds: Optional[float]):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[Any, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Any) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        value, expires_at = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Any, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        ttl_seconds = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        expires_at = float("inf") if ttl_seconds is None else time.monotonic() + ttl_seconds
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Any) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+user_cache = TTLCache(USER_CACHE_MAX_SIZE, USER_CACHE_TTL_SECONDS)
+# Decoded access token payloads keyed by token hash, kept for the token's remaining lifetime
+token_cache = TTLCache(TOKEN_CACHE_MAX_SIZE, None)
+# Holds a single entry: the full company id -> name map
+company_names_cache = TTLCache(1, COMPANY_CACHE_TTL_SECONDS)
+
+async def get_company_names() -> dict:
+    """Return a company id -> name map, loaded in one query and cached"""
+    names = company_names_cache.get("all")
+    if names is None:
+        companies = await db.companies.find({}, {"_id": 0, "id": 1, "name": 1}).to_list(None)
+        names = {company["id"]: company["name"] for company in companies}
+        company_names_cache.set("all", names)
+    return names
+
+class CollectionMirror:
+    """In-memory copy of a small collection whose documents carry updated_at.
+    refresh() reads only what changed since the last one; subclasses apply
+    each document in _apply."""
+
+    collection_name = ""
+    # Re-read this much history on each refresh to tolerate clock skew between workers
+    SYNC_OVERLAP = timedelta(seconds=2)
+
+    def __init__(self):
+        self.synced_until: Optional[datetime] = None
+        self.refreshes = 0
+
+    def _apply(self, document: dict) -> None:
+        raise NotImplementedError
+
+    async def refresh(self) -> None:
+        query = {}
+        if self.synced_until:
+            query = {"updated_at": {"$gte": self.synced_until - self.SYNC_OVERLAP}}
+        async for document in db[self.collection_name].find(query):
+            self._apply(document)
+            if not self.synced_until or document["updated_at"] > self.synced_until:
+                self.synced_until = document["updated_at"]
+        self.refreshes += 1
+
+    def stats(self) -> dict:
+        return {"synced_until": self.synced_until, "refreshes": self.refreshes}
+
+async def refresh_periodically(refresh, interval_seconds: float, name: str) -> None:
+    """Await refresh() every interval_seconds until cancelled, logging failures"""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await refresh()
+        except Exception as e:
+            logger.error(f"Failed to refresh {name}: {e}")
+
+# === PASSWORD HASHING ===
+
+class BcryptPool:
+    """Size-limited thread pool for bcrypt work with a bounded wait queue"""
+
+    def __init__(self, size: int, max_queue: int):
+        self.size = size
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="bcrypt")
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.busy_seconds = 0.0
+
+    async def run(self, func, *args):
+        if self.in_flight >= self.size + self.max_queue:
+            self.rejected += 1
+            raise HTTPException(status_code=429, detail="Server busy, please retry")
+        self.in_flight += 1
+        operation = func.__name__.rsplit("_", 1)[-1]
+        queued_at = time.perf_counter()
+        try:
+            result, elapsed = await asyncio.get_running_loop().run_in_executor(
+                self._executor, _timed_call, func, args
+            )
+            self.busy_seconds += elapsed
+            bcrypt_seconds.observe(elapsed, operation=operation)
+            bcrypt_wait_seconds.observe(time.perf_counter() - queued_at - elapsed, operation=operation)
+            self.completed += 1
+            return result
+        finally:
+            self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "max_queue": self.max_queue,
+            "active": min(self.in_flight, self.size),
+            "queued": max(self.in_flight - self.size, 0),
+            "utilization": min(self.in_flight, self.size) / self.size,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "busy_seconds": self.busy_seconds,
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+def _timed_call(func, args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def _bcrypt_hash(password: str) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+def _bcrypt_check(password: str, password_hash: str) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+
+bcrypt_pool = BcryptPool(BCRYPT_POOL_SIZE, BCRYPT_MAX_QUEUE)
+
+# === LOGIN THROTTLING ===
+
+def _new_attempt_state() -> dict:
+    return {"attempts": [], "locked_until": 0.0, "lockouts": 0}
+
+def _lockout_after(state: dict, now: float, window: float) -> tuple:
+    """(lockouts, locked_until) when state's full window of attempts locks the key at now"""
+    first = min(attempt["at"] for attempt in state["attempts"])
+    # Quiet for a full window since the last lockout: start over
+    lockouts = 1 if state.get("locked_until", 0.0) < first - window else state.get("lockouts", 0) + 1
+    lockout = min(LOGIN_LOCKOUT_BASE_SECONDS * 2 ** (lockouts - 1), LOGIN_LOCKOUT_MAX_SECONDS)
+    return lockouts, now + lockout
+
+class MemoryAttemptStore:
+    """Per-worker attempt state, bounded to the most recently used keys.
+    Methods never await between reading and writing a key, so each is atomic."""
+
+    def __init__(self, max_keys: int):
+        self._states = TTLCache(max_keys, None)
+
+    async def reserve(self, key: str, attempt: dict, max_failures: int, window: float) -> Optional[float]:
+        now = attempt["at"]
+        state = self._states.get(key) or _new_attempt_state()
+        state["attempts"] = [a for a in state["attempts"] if a["at"] > now - window]
+        if state["locked_until"] > now or len(state["attempts"]) >= max_failures:
+            return state["locked_until"]
+        state["attempts"].append(attempt)
+        self._states.set(key, state, max(window, state["locked_until"] - now) + window)
+        return None
+
+    async def release(self, key: str, attempt: dict) -> None:
+        state = self._states.get(key)
+        if state:
+            state["attempts"] = [a for a in state["attempts"] if a["id"] != attempt["id"]]
+
+    async def lock_if_full(self, key: str, now: float, max_failures: int, window: float) -> bool:
+        state = self._states.get(key)
+        if not state or state["locked_until"] > now or len(state["attempts"]) < max_failures:
+            return False
+        state["lockouts"], state["locked_until"] = _lockout_after(state, now, window)
+        state["attempts"] = []
+        self._states.set(key, state, state["locked_until"] - now + window)
+        return True
+
+    async def delete(self, key: str) -> None:
+        self._states.invalidate(key)
+
+class MongoAttemptStore:
+    """Attempt state shared by all workers through the login_attempts collection.
+    Reservations and lockouts are conditional single-document updates, so
+    concurrent attempts on any worker are counted exactly."""
+
+    async def reserve(self, key: str, attempt: dict, max_failures: int, window: float) -> Optional[float]:
+        now = attempt["at"]
+        await db.login_attempts.update_one(
+            {"key": key},
+            {"$pull": {"attempts": {"at": {"$lte": now - window}}}, "$setOnInsert": {"locked_until": 0.0, "lockouts": 0}},
+            upsert=True
+        )
+        reserved = await db.login_attempts.find_one_and_update(
+            {"key": key, "locked_until": {"$not": {"$gt": now}}, f"attempts.{max_failures - 1}": {"$exists": False}},
+            {
+                "$push": {"attempts": attempt},
+                "$max": {"expires_at": datetime.utcnow() + timedelta(seconds=2 * window)}
+            }
+        )
+        if reserved:
+            return None
+        state = await db.login_attempts.find_one({"key": key}, {"_id": 0, "locked_until": 1})
+        return (state or {}).get("locked_until", 0.0)
+
+    async def release(self, key: str, attempt: dict) -> None:
+        await db.login_attempts.update_one({"key": key}, {"$pull": {"attempts": {"id": attempt["id"]}}})
+
+    async def lock_if_full(self, key: str, now: float, max_failures: int, window: float) -> bool:
+        # Locking for the base time first makes this request the only one to extend it
+        state = await db.login_attempts.find_one_and_update(
+            {"key": key, "locked_until": {"$not": {"$gt": now}}, f"attempts.{max_failures - 1}": {"$exists": True}},
+            {"$set": {"attempts": [], "locked_until": now + LOGIN_LOCKOUT_BASE_SECONDS}},
+            projection={"_id": 0}
+        )
+        if not state:
+            return False
+        lockouts, locked_until = _lockout_after(state, now, window)
+        await db.login_attempts.update_one({"key": key}, {
+            "$set": {"lockouts": lockouts, "locked_until": locked_until},
+            "$max": {"expires_at": datetime.utcnow() + timedelta(seconds=locked_until - now + window)}
+        })
+        return True
+
+    async def delete(self, key: str) -> None:
+        await db.login_attempts.delete_one({"key": key})
+
+class LoginThrottle:
+    """Sliding-window failure limiter with exponential lockout. Every login
+    reserves an attempt on each key before any bcrypt work and keeps it if the
+    password is wrong, so no more than the allowed number of verifications run
+    per window however many requests arrive at once."""
+
+    def __init__(self, store, rules: Dict[str, tuple]):
+        self.store = store
+        self.rules = rules  # kind -> (max failures, window seconds)
+        self.counters = {"checked": 0, "failures": 0, "lockouts": 0}
+        self.rejected = {kind: 0 for kind in rules}
+
+    async def reserve(self, keys: Dict[str, str]) -> dict:
+        """Count an attempt against each of the keys (kind -> key), or raise 429
+        if any of them is locked out or already has its window full"""
+        self.counters["checked"] += 1
+        now = time.time()
+        attempt = {"at": now, "id": uuid.uuid4().hex}
+        reserved = []
+        for kind, key in keys.items():
+            max_failures, window = self.rules[kind]
+            locked_until = await self.store.reserve(f"{kind}:{key}", attempt, max_failures, window)
+            if locked_until is None:
+                reserved.append(f"{kind}:{key}")
+                continue
+            for store_key in reserved:
+                await self.store.release(store_key, attempt)
+            self.rejected[kind] += 1
+            # Without a lockout the window is full of attempts still being verified
+            retry_after = max(int(locked_until - now) + 1, 1)
+            raise HTTPException(
+                status_code=429,
+                detail="Too many failed login attempts, please retry later",
+                headers={"Retry-After": str(retry_after)}
+            )
+        return attempt
+
+    async def record_failure(self, keys: Dict[str, str]) -> None:
+        """Keep the reserved attempt and lock out the keys whose window is now full"""
+        self.counters["failures"] += 1
+        now = time.time()
+        for kind, key in keys.items():
+            max_failures, window = self.rules[kind]
+            if await self.store.lock_if_full(f"{kind}:{key}", now, max_failures, window):
+                self.counters["lockouts"] += 1
+
+    async def record_success(self, keys: Dict[str, str], attempt: dict) -> None:
+        # Only the account is cleared; an IP keeps its earlier failures across accounts
+        for kind, key in keys.items():
+            if kind == "user":
+                await self.store.delete(f"user:{key}")
+            else:
+                await self.store.release(f"{kind}:{key}", attempt)
+
+    def stats(self) -> dict:
+        return {**self.counters, "rejected": dict(self.rejected), "store": type(self.store).__name__}
+
+login_throttle = LoginThrottle(
+    MongoAttemptStore() if LOGIN_THROTTLE_STORE == "mongo" else MemoryAttemptStore(LOGIN_THROTTLE_MAX_KEYS),
+    {
+        "user": (LOGIN_USER_MAX_FAILURES, LOGIN_USER_WINDOW_SECONDS),
+        "ip": (LOGIN_IP_MAX_FAILURES, LOGIN_IP_WINDOW_SECONDS),
+    }
+)
+
+def client_ip(request: Request) -> str:
+    if TRUST_FORWARDED_FOR and request.headers.get("x-forwarded-for"):
+        return request.headers["x-forwarded-for"].split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+# === TOKEN REVOCATION ===
+
+# Minimum token version that no issued token can reach; used for deleted users
+TOKEN_VERSION_REVOKED = 2 ** 31 - 1
+
+class TokenRevocations(CollectionMirror):
+    """In-memory mirror of token_revocations: the minimum token version each
+    changed user must present. Users without an entry accept any version."""
+
+    collection_name = "token_revocations"
+
+    def __init__(self):
+        super().__init__()
+        self.min_versions = {}
+
+    def is_revoked(self, user_id: str, version: int) -> bool:
+        return version < self.min_versions.get(user_id, 0)
+
+    def apply(self, user_id: str, min_version: int) -> None:
+        self.min_versions[user_id] = max(self.min_versions.get(user_id, 0), min_version)
+
+    def _apply(self, revocation: dict) -> None:
+        self.apply(revocation["user_id"], revocation["min_version"])
+
+    async def revoke(self, user_id: str, min_version: int) -> None:
+        """Reject tokens of user_id older than min_version, on every worker"""
+        self.apply(user_id, min_version)
+        await db.token_revocations.update_one(
+            {"user_id": user_id},
+            {"$max": {"min_version": min_version}, "$set": {"updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+
+    def stats(self) -> dict:
+        return {"size": len(self.min_versions), **super().stats()}
+
+token_revocations = TokenRevocations()
+
+# === CHANGE VERSIONS ===
+
+class ChangeVersions(CollectionMirror):
+    """In-memory mirror of change_versions: a counter per (collection, company)
+    bumped by every write, plus a "*" counter per collection for owners. List
+    routes derive their ETag from it, so a matching If-None-Match is answered
+    without touching the database."""
+
+    ALL = "*"
+    collection_name = "change_versions"
+
+    def __init__(self):
+        super().__init__()
+        # "collection:scope" -> (version, created_at); created_at tells a
+        # recreated counter apart from the one a client's ETag came from
+        self.versions: Dict[str, tuple] = {}
+        self.bumps = 0
+
+    def _apply(self, counter: dict) -> None:
+        current = self.versions.get(counter["_id"])
+        if current is None or current[1] != counter["created_at"] or current[0] < counter["version"]:
+            self.versions[counter["_id"]] = (counter["version"], counter["created_at"])
+
+    async def bump(self, collection: str, company_ids) -> None:
+        """Record a write to `collection` affecting the given companies"""
+        now = datetime.utcnow()
+        for scope in {*(company_id for company_id in company_ids if company_id), self.ALL}:
+            counter = await db.change_versions.find_one_and_update(
+                {"_id": f"{collection}:{scope}"},
+                {"$inc": {"version": 1}, "$set": {"updated_at": now}, "$setOnInsert": {"created_at": now}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            self._apply(counter)
+        self.bumps += 1
+
+    def etag(self, collection: str, scope: str) -> str:
+        key = f"{collection}:{scope}"
+        version, created_at = self.versions.get(key, (0, None))
+        digest = hashlib.sha256(f"{key}:{created_at}:{version}".encode('utf-8')).hexdigest()[:16]
+        return f'"{collection}-{version}-{digest}"'
+
+    def stats(self) -> dict:
+        return {"size": len(self.versions), **super().stats(), "bumps": self.bumps}
+
+change_versions = ChangeVersions()
+
+def list_scope(current_user: dict) -> str:
+    """Change version scope matching what a list route returns to this user"""
+    return ChangeVersions.ALL if current_user["type"] == "owner" else current_user["company_id"]
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    # If-None-Match uses the weak comparison, so W/ prefixes added by proxies still match
+    candidates = {candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")}
+    return etag in candidates or "*" in candidates
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
 # === UTILITY FUNCTIONS ===
 
-def hash_password(password: str) -> str:
+async def hash_password(password: str) -> str:
     """Hash a password"""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return await bcrypt_pool.run(_bcrypt_hash, password)
 
-def verify_password(password: str, password_hash: str) -> bool:
+async def verify_password(password: str, password_hash: str) -> bool:
     """Verify a password against its hash"""
-    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+    return await bcrypt_pool.run(_bcrypt_check, password, password_hash)
+
+def to_naive_utc(value: datetime) -> datetime:
+    """Convert an aware datetime to the naive UTC form stored in MongoDB"""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+def to_bson_datetime(value: datetime) -> datetime:
+    """Truncate to the millisecond precision MongoDB stores, so written values compare equal on read"""
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
+def token_claims(user: dict) -> dict:
+    """Claims embedded in access tokens so authorization needs no DB read"""
+    return {
+        "user_id": user["id"],
+        "username": user["username"],
+        "type": user["type"],
+        "role": user["role"],
+        "company_id": user.get("company_id"),
+        "ver": user.get("token_version", 0),
+    }
 
 def create_access_token(data: dict) -> str:
     """Create JWT access token"""
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(hours=JWT_EXPIRATION_HOURS)
+    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRATION_MINUTES)
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, JWT_SECRET, algorithm=JWT_ALGORITHM)
     return encoded_jwt
 
+def hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
 def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
     """Verify JWT token"""
+    token_hash = hash_token(credentials.credentials)
+    payload = token_cache.get(token_hash)
+    if payload is not None:
+        return payload
     try:
         payload = jwt.decode(credentials.credentials, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        if "exp" in payload:
+            token_cache.set(token_hash, payload, payload["exp"] - time.time())
         return payload
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.JWTError:
+    except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
 async def get_current_user(token_payload: dict = Depends(verify_token)) -> dict:
@@ -170,27 +878,283 @@ async def get_current_user(token_payload: dict = Depends(verify_token)) -> dict:
     user_id = token_payload.get("user_id")
     if not user_id:
         raise HTTPException(status_code=401, detail="Invalid token")
+    if token_revocations.is_revoked(user_id, token_payload.get("ver", 0)):
+        raise HTTPException(status_code=401, detail="Token revoked")
     
-    user = await db.users.find_one({"id": user_id})
-    if not user:
-        raise HTTPException(status_code=401, detail="User not found")
+    if "type" in token_payload:
+        return {
+            "id": user_id,
+            "username": token_payload.get("username"),
+            "type": token_payload["type"],
+            "role": token_payload.get("role", token_payload["type"]),
+            "company_id": token_payload.get("company_id"),
+        }
     
-    return user
+    # Tokens issued before claims were embedded still need the user document
+    user = user_cache.get(user_id)
+    if user is None:
+        user = await db.users.find_one({"id": user_id})
+        if not user:
+            raise HTTPException(status_code=401, detail="User not found")
+        user_cache.set(user_id, user)
+    
+    return dict(user)
+
+async def get_stream_user(
+    access_token: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+) -> dict:
+    """get_current_user for long-lived streams: bearer header or access_token query parameter"""
+    token = credentials.credentials if credentials else access_token
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    payload = verify_token(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token))
+    return await get_current_user(payload)
+
+# === QR CODES ===
+
+QR_MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+qr_image_cache = TTLCache(QR_CACHE_MAX_SIZE, None)
+_qr_render_pool: Optional[ProcessPoolExecutor] = None
+
+def qr_cache_key(data: str, image_format: str, box_size: int, border: int) -> str:
+    """Content address of a rendered QR image"""
+    raw = json.dumps([data, image_format, box_size, border]).encode('utf-8')
+    return hashlib.sha256(raw).hexdigest()
 
-def generate_qr_code(data: str) -> str:
+def _qr_disk_path(key: str, image_format: str) -> Optional[Path]:
+    return Path(QR_CACHE_DIR) / f"{key}.{image_format}" if QR_CACHE_DIR else None
+
+def _read_qr_file(path: Path) -> Optional[bytes]:
+    try:
+        return path.read_bytes()
+    except FileNotFoundError:
+        return None
+
+def _write_qr_file(path: Path, image: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write then rename so concurrent workers never read a partial file
+    tmp_path = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+    tmp_path.write_bytes(image)
+    tmp_path.replace(path)
+
+async def _cached_qr(key: str, image_format: str) -> Optional[bytes]:
+    image = qr_image_cache.get(key)
+    path = _qr_disk_path(key, image_format)
+    if image is None and path:
+        # Disk I/O runs in the default thread pool, like rendering
+        image = await asyncio.get_running_loop().run_in_executor(None, _read_qr_file, path)
+        if image is not None:
+            qr_image_cache.set(key, image)
+    return image
+
+async def _store_qr(key: str, image_format: str, image: bytes) -> None:
+    qr_image_cache.set(key, image)
+    path = _qr_disk_path(key, image_format)
+    if path:
+        await asyncio.get_running_loop().run_in_executor(None, _write_qr_file, path, image)
+
+async def get_qr_image(data: str, image_format: str = "png", box_size: int = 10, border: int = 5) -> tuple:
+    """Return (image bytes, cache key) for a QR code, rendering only on a cache miss"""
+    key = qr_cache_key(data, image_format, box_size, border)
+    image = await _cached_qr(key, image_format)
+    if image is None:
+        # Rendering takes milliseconds of CPU; keep it off the event loop
+        loop = asyncio.get_running_loop()
+        image = await loop.run_in_executor(None, render_qr, data, image_format, box_size, border)
+        await _store_qr(key, image_format, image)
+    return image, key
+
+async def get_qr_images(payloads: List[str], image_format: str = "png", box_size: int = 10, border: int = 5) -> List[bytes]:
+    """Return QR images for many payloads, rendering cache misses in a process pool"""
+    global _qr_render_pool
+    keys = [qr_cache_key(data, image_format, box_size, border) for data in payloads]
+    images = list(await asyncio.gather(*(_cached_qr(key, image_format) for key in keys)))
+    missing = [i for i, image in enumerate(images) if image is None]
+    if missing:
+        if _qr_render_pool is None:
+            # Forking a process that runs Motor and bcrypt threads can deadlock the child
+            _qr_render_pool = ProcessPoolExecutor(
+                max_workers=QR_RENDER_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        loop = asyncio.get_running_loop()
+        rendered = await asyncio.gather(*(
+            loop.run_in_executor(_qr_render_pool, render_qr, payloads[i], image_format, box_size, border)
+            for i in missing
+        ))
+        for i, image in zip(missing, rendered):
+            await _store_qr(keys[i], image_format, image)
+            images[i] = image
+    return images
+
+async def generate_qr_code(data: str) -> str:
     """Generate QR code and return base64 encoded image"""
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(data)
-    qr.make(fit=True)
+    image, _ = await get_qr_image(data)
+    return base64.b64encode(image).decode()
+
+def _badge_filename(employee: dict, image_format: str) -> str:
+    safe_name = re.sub(r"[^\w.-]+", "_", employee["name"]).strip("_")
+    return f"{employee['qr_code']}_{safe_name}.{image_format}"
+
+def build_badges_zip(employees: List[dict], images: List[bytes], image_format: str) -> bytes:
+    """Pack one badge image per employee into a ZIP archive"""
+    buf = io.BytesIO()
+    # PNGs are already compressed; only SVGs benefit from deflate
+    compression = zipfile.ZIP_DEFLATED if image_format == "svg" else zipfile.ZIP_STORED
+    with zipfile.ZipFile(buf, "w", compression=compression) as archive:
+        for employee, image in zip(employees, images):
+            archive.writestr(_badge_filename(employee, image_format), image)
+    return buf.getvalue()
+
+def build_badges_pdf(employees: List[dict], images: List[bytes]) -> bytes:
+    """Lay out badges on printable A4 pages (150 dpi, 3 x 4 per page).
+    A company without employees gets a single blank page."""
+    page_size, columns, rows = (1240, 1754), 3, 4
+    cell_width, cell_height = page_size[0] // columns, page_size[1] // rows
+    qr_size = min(cell_width, cell_height) - 100
+    font = ImageFont.load_default()
+    
+    pages = []
+    per_page = columns * rows
+    for start in range(0, max(len(employees), 1), per_page):
+        page = Image.new("RGB", page_size, "white")
+        draw = ImageDraw.Draw(page)
+        for slot, (employee, image) in enumerate(zip(employees[start:start + per_page], images[start:start + per_page])):
+            left = (slot % columns) * cell_width
+            top = (slot // columns) * cell_height
+            qr_image = Image.open(io.BytesIO(image)).convert("RGB").resize((qr_size, qr_size), Image.NEAREST)
+            page.paste(qr_image, (left + (cell_width - qr_size) // 2, top + 20))
+            draw.text((left + 30, top + qr_size + 30), employee["name"], fill="black", font=font)
+            draw.text((left + 30, top + qr_size + 50), employee["qr_code"], fill="black", font=font)
+        pages.append(page)
     
-    img = qr.make_image(fill_color="black", back_color="white")
     buf = io.BytesIO()
-    img.save(buf, format='PNG')
-    img_str = base64.b64encode(buf.getvalue()).decode()
-    return img_str
+    pages[0].save(buf, format="PDF", save_all=True, append_images=pages[1:], resolution=150)
+    return buf.getvalue()
 
 # === INITIALIZATION ===
 
+# Matches time entries that are still open (checked in, not yet checked out).
+# Uses $type so queries can be served by the partial index below.
+OPEN_TIME_ENTRY_FILTER = {"check_out": {"$type": "null"}}
+
+# Indexes every collection needs, keyed by collection name. Each spec is
+# created idempotently at startup and compared against the live indexes
+# to report drift.
+INDEX_SPECS = {
+    "users": [
+        {"name": "id_unique", "keys": [("id", 1)], "unique": True},
+        {"name": "username_unique", "keys": [("username", 1)], "unique": True},
+        {"name": "company_id", "keys": [("company_id", 1)]},
+    ],
+    "companies": [
+        {"name": "id_unique", "keys": [("id", 1)], "unique": True},
+    ],
+    "employees": [
+        {"name": "id_unique", "keys": [("id", 1)], "unique": True},
+        {"name": "qr_code_unique", "keys": [("qr_code", 1)], "unique": True},
+        {"name": "company_id", "keys": [("company_id", 1)]},
+        {"name": "company_id_updated_at_id", "keys": [("company_id", 1), ("updated_at", 1), ("id", 1)]},
+        {"name": "updated_at_id", "keys": [("updated_at", 1), ("id", 1)]},
+    ],
+    "time_entries": [
+        {"name": "id_unique", "keys": [("id", 1)], "unique": True},
+        {"name": "employee_id_date", "keys": [("employee_id", 1), ("date", 1)]},
+        {"name": "date_id", "keys": [("date", 1), ("id", 1)]},
+        {"name": "company_id_date_id", "keys": [("company_id", 1), ("date", 1), ("id", 1)]},
+        {"name": "company_id_updated_at_id", "keys": [("company_id", 1), ("updated_at", 1), ("id", 1)]},
+        {"name": "updated_at_id", "keys": [("updated_at", 1), ("id", 1)]},
+        {
+            # At most one open entry per employee, so concurrent check-ins cannot both win
+            "name": "open_entries_by_employee",
+            "keys": [("employee_id", 1)],
+            "unique": True,
+            "partialFilterExpression": OPEN_TIME_ENTRY_FILTER,
+        },
+    ],
+    "token_revocations": [
+        {"name": "user_id_unique", "keys": [("user_id", 1)], "unique": True},
+        # Outlives any access token (including 24h ones issued before refresh tokens)
+        {"name": "updated_at_ttl", "keys": [("updated_at", 1)], "expireAfterSeconds": 25 * 3600},
+    ],
+    "refresh_tokens": [
+        {"name": "token_hash_unique", "keys": [("token_hash", 1)], "unique": True},
+        {"name": "expires_at_ttl", "keys": [("expires_at", 1)], "expireAfterSeconds": 0},
+        {"name": "family_id", "keys": [("family_id", 1)]},
+        {"name": "user_id", "keys": [("user_id", 1)]},
+    ],
+    "login_attempts": [
+        {"name": "key_unique", "keys": [("key", 1)], "unique": True},
+        {"name": "expires_at_ttl", "keys": [("expires_at", 1)], "expireAfterSeconds": 0},
+    ],
+    "scan_events": [
+        {"name": "idempotency_key_unique", "keys": [("idempotency_key", 1)], "unique": True},
+        {"name": "created_at_ttl", "keys": [("created_at", 1)], "expireAfterSeconds": SCAN_EVENT_RETENTION_DAYS * 86400},
+    ],
+    "tombstones": [
+        {"name": "company_id_updated_at_id", "keys": [("company_id", 1), ("updated_at", 1), ("id", 1)]},
+        {"name": "updated_at_id", "keys": [("updated_at", 1), ("id", 1)]},
+        {"name": "updated_at_ttl", "keys": [("updated_at", 1)], "expireAfterSeconds": SYNC_TOMBSTONE_RETENTION_DAYS * 86400},
+    ],
+    "deletion_jobs": [
+        {"name": "id_unique", "keys": [("id", 1)], "unique": True},
+        {"name": "status_created_at", "keys": [("status", 1), ("created_at", 1)]},
+        {"name": "company_id_created_at", "keys": [("company_id", 1), ("created_at", -1)]},
+    ],
+    "change_versions": [
+        {"name": "updated_at", "keys": [("updated_at", 1)]},
+    ],
+    "hours_rollups": [
+        {"name": "employee_period_key_unique", "keys": [("employee_id", 1), ("period", 1), ("key", 1)], "unique": True},
+        {"name": "company_period_key", "keys": [("company_id", 1), ("period", 1), ("key", 1)]},
+    ],
+}
+
+def _index_options(spec: dict) -> dict:
+    """Return the options that distinguish an index besides its keys"""
+    return {
+        "unique": spec.get("unique", False),
+        "partialFilterExpression": spec.get("partialFilterExpression"),
+        "expireAfterSeconds": spec.get("expireAfterSeconds"),
+    }
+
+async def ensure_indexes():
+    """Create all declared indexes (no-op for ones that already exist)"""
+    for collection, specs in INDEX_SPECS.items():
+        for spec in specs:
+            options = {k: v for k, v in _index_options(spec).items() if v is not None and v is not False}
+            try:
+                await db[collection].create_index(spec["keys"], name=spec["name"], **options)
+            except OperationFailure as e:
+                # Keep booting; the index shows up as missing in the drift report
+                logger.error(f"Failed to create index {collection}.{spec['name']}: {e}")
+
+async def get_index_drift() -> dict:
+    """Compare declared indexes with the ones present in the database"""
+    drift = {}
+    for collection, specs in INDEX_SPECS.items():
+        existing = await db[collection].index_information()
+        declared = {spec["name"]: spec for spec in specs}
+        missing, mismatched = [], []
+        for name, spec in declared.items():
+            actual = existing.get(name)
+            if actual is None:
+                missing.append(name)
+            elif (
+                [tuple(k) for k in actual["key"]] != list(spec["keys"])
+                or _index_options(actual) != _index_options(spec)
+            ):
+                mismatched.append(name)
+        unexpected = [name for name in existing if name != "_id_" and name not in declared]
+        if missing or mismatched or unexpected:
+            drift[collection] = {
+                "missing": missing,
+                "mismatched": mismatched,
+                "unexpected": unexpected,
+            }
+    return drift
+
 async def init_default_data():
     """Initialize default data if not exists"""
     # Check if owner exists
@@ -201,7 +1165,7 @@ async def init_default_data():
             {
                 "id": str(uuid.uuid4()),
                 "username": "owner",
-                "password_hash": hash_password("owner123"),
+                "password_hash": await hash_password("owner123"),
                 "type": "owner",
                 "role": "owner",
                 "company_id": None,
@@ -211,7 +1175,7 @@ async def init_default_data():
             {
                 "id": str(uuid.uuid4()),
                 "username": "admin",
-                "password_hash": hash_password("admin123"),
+                "password_hash": await hash_password("admin123"),
                 "type": "admin",
                 "role": "admin",
                 "company_id": "1",
@@ -221,7 +1185,7 @@ async def init_default_data():
             {
                 "id": str(uuid.uuid4()),
                 "username": "user",
-                "password_hash": hash_password("user123"),
+                "password_hash": await hash_password("user123"),
                 "type": "user",
                 "role": "user",
                 "company_id": "1",
@@ -272,6 +1236,7 @@ async def init_default_data():
             {
                 "id": "1",
                 "employee_id": "1",
+                "company_id": "1",
                 "check_in": datetime.utcnow().replace(hour=8, minute=0, second=0),
                 "check_out": datetime.utcnow().replace(hour=16, minute=0, second=0),
                 "date": datetime.utcnow().strftime("%Y-%m-%d"),
@@ -281,6 +1246,7 @@ async def init_default_data():
             {
                 "id": "2",
                 "employee_id": "2",
+                "company_id": "1",
                 "check_in": datetime.utcnow().replace(hour=9, minute=0, second=0),
                 "check_out": datetime.utcnow().replace(hour=17, minute=0, second=0),
                 "date": datetime.utcnow().strftime("%Y-%m-%d"),
@@ -290,24 +1256,1030 @@ async def init_default_data():
         ]
         await db.time_entries.insert_many(default_time_entries)
 
-# === AUTHENTICATION ROUTES ===
+async def backfill_time_entry_company_ids(batch_size: int = 500) -> int:
+    """Copy each employee's company_id onto time entries that lack it"""
+    modified = 0
+    operations = []
+    async for employee in db.employees.find({}, {"_id": 0, "id": 1, "company_id": 1}):
+        operations.append(UpdateMany(
+            {"employee_id": employee["id"], "company_id": None},
+            {"$set": {"company_id": employee["company_id"]}}
+        ))
+        if len(operations) >= batch_size:
+            result = await db.time_entries.bulk_write(operations, ordered=False)
+            modified += result.modified_count
+            operations = []
+    if operations:
+        result = await db.time_entries.bulk_write(operations, ordered=False)
+        modified += result.modified_count
+    return modified
+
+async def backfill_updated_at(batch_size: int = 500) -> int:
+    """Give employees and time entries written before sync their created_at as updated_at"""
+    modified = 0
+    for collection in (db.employees, db.time_entries):
+        while True:
+            documents = await collection.find(
+                {"updated_at": None}, {"_id": 1, "created_at": 1}
+            ).to_list(batch_size)
+            if not documents:
+                break
+            result = await collection.bulk_write([
+                UpdateOne({"_id": document["_id"]}, {"$set": {"updated_at": document.get("created_at") or datetime.utcnow()}})
+                for document in documents
+            ], ordered=False)
+            modified += result.modified_count
+    return modified
+
+async def close_duplicate_open_entries() -> int:
+    """Close all but the latest open entry of each employee (at the next
+    check-in) and rebuild open_entries_by_employee as a unique index"""
+    now = datetime.utcnow()
+    changes = []
+    duplicates = db.time_entries.aggregate([
+        {"$match": OPEN_TIME_ENTRY_FILTER},
+        {"$group": {"_id": "$employee_id", "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ])
+    async for duplicate in duplicates:
+        entries = await db.time_entries.find(
+            {"employee_id": duplicate["_id"], **OPEN_TIME_ENTRY_FILTER}
+        ).sort("check_in", 1).to_list(None)
+        for entry, following in zip(entries, entries[1:]):
+            closed = {
+                "check_out": following["check_in"],
+                "total_hours": (following["check_in"] - entry["check_in"]).total_seconds() / 3600,
+                "updated_at": now,
+            }
+            await db.time_entries.update_one({"_id": entry["_id"]}, {"$set": closed})
+            changes.append((entry, {**entry, **closed}))
+    await apply_hours_rollup_changes(changes)
+    indexes = await db.time_entries.index_information()
+    if "open_entries_by_employee" in indexes and not indexes["open_entries_by_employee"].get("unique"):
+        await db.time_entries.drop_index("open_entries_by_employee")
+    await ensure_indexes()
+    return len(changes)
+
+# === HOURS ROLLUPS ===
+
+# hours_rollups holds one document per employee per day ("day", YYYY-MM-DD)
+# and per month ("month", YYYY-MM) with running totals. Every time entry write
+# applies its delta with $inc, so reports never scan time_entries.
+ROLLUP_PERIODS = {"day": lambda date: date, "month": lambda date: date[:7]}
+
+def _rollup_contributions(entry: Optional[dict], sign: int) -> Dict[tuple, list]:
+    """Map (employee_id, company_id, period, key) to [hours, count] for one entry"""
+    if not entry:
+        return {}
+    return {
+        (entry["employee_id"], entry.get("company_id"), period, to_key(entry["date"])):
+            [sign * (entry.get("total_hours") or 0.0), sign]
+        for period, to_key in ROLLUP_PERIODS.items()
+    }
+
+async def apply_hours_rollup_changes(changes: List[tuple]):
+    """Apply many (old_entry, new_entry) changes to the rollups in one bulk write"""
+    deltas = {}
+    for old_entry, new_entry in changes:
+        for sign, entry in ((-1, old_entry), (1, new_entry)):
+            for rollup_key, (hours, count) in _rollup_contributions(entry, sign).items():
+                current = deltas.setdefault(rollup_key, [0.0, 0])
+                current[0] += hours
+                current[1] += count
+    operations = [
+        UpdateOne(
+            {"employee_id": employee_id, "period": period, "key": key},
+            {"$inc": {"total_hours": hours, "entry_count": count}, "$set": {"company_id": company_id}},
+            upsert=True
+        )
+        for (employee_id, company_id, period, key), (hours, count) in deltas.items()
+        if hours or count
+    ]
+    if operations:
+        await db.hours_rollups.bulk_write(operations, ordered=False)
+
+async def rebuild_hours_rollups() -> int:
+    """Recompute every rollup document from time_entries"""
+    await db.hours_rollups.delete_many({})
+    pipeline = [
+        {"$group": {
+            "_id": {"employee_id": "$employee_id", "date": "$date"},
+            "company_id": {"$first": "$company_id"},
+            "total_hours": {"$sum": {"$ifNull": ["$total_hours", 0]}},
+            "entry_count": {"$sum": 1},
+        }},
+    ]
+    written = 0
+    batch = []
+    months = {}
+    async for row in db.time_entries.aggregate(pipeline, allowDiskUse=True):
+        employee_id, date = row["_id"]["employee_id"], row["_id"]["date"]
+        batch.append({
+            "employee_id": employee_id,
+            "company_id": row["company_id"],
+            "period": "day",
+            "key": date,
+            "total_hours": row["total_hours"],
+            "entry_count": row["entry_count"],
+        })
+        # Month documents are summed from the day rows instead of a second scan
+        month = months.setdefault((employee_id, date[:7]), {
+            "employee_id": employee_id,
+            "company_id": row["company_id"],
+            "period": "month",
+            "key": date[:7],
+            "total_hours": 0.0,
+            "entry_count": 0,
+        })
+        month["total_hours"] += row["total_hours"]
+        month["entry_count"] += row["entry_count"]
+        if len(batch) >= 1000:
+            await db.hours_rollups.insert_many(batch)
+            written += len(batch)
+            batch = []
+    batch.extend(months.values())
+    for start in range(0, len(batch), 1000):
+        await db.hours_rollups.insert_many(batch[start:start + 1000])
+    return written + len(batch)
+
+# === PRESENCE ===
+
+def _presence_time(check_in) -> datetime:
+    # Mongo keeps milliseconds; compare entries fresh from a request at the same precision
+    check_in = to_naive_utc(check_in)
+    return check_in.replace(microsecond=check_in.microsecond // 1000 * 1000)
+
+class PresenceBoard:
+    """Per-company index of who is on site (employee id -> open check-in time).
+
+    Loaded from open time entries at startup, updated from every time entry
+    write in this worker and resynced periodically for writes made by other
+    workers. Changes are pushed to subscriber queues as small events."""
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self.companies: Dict[str, Dict[str, datetime]] = {}
+        self.subscribers: Dict[str, set] = {}
+        # Employees changed while a resync was reading, so its stale view is skipped
+        self._touched: Optional[set] = None
+        self.counters = {"events": 0, "resyncs": 0, "overflows": 0}
+
+    def snapshot(self, company_id: str) -> dict:
+        present = self.companies.get(company_id, {})
+        return {
+            "type": "snapshot",
+            "company_id": company_id,
+            "present": [
+                {"employee_id": employee_id, "check_in": check_in.isoformat()}
+                for employee_id, check_in in sorted(present.items(), key=lambda item: item[1])
+            ],
+        }
+
+    def _publish(self, company_id: str, event: dict) -> None:
+        self.counters["events"] += 1
+        for queue in self.subscribers.get(company_id, ()):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # A slow client gets a fresh snapshot instead of the backlog
+                self.counters["overflows"] += 1
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self.snapshot(company_id))
+
+    def _check_in(self, company_id: str, employee_id: str, check_in: datetime) -> None:
+        present = self.companies.setdefault(company_id, {})
+        if present.get(employee_id) != check_in:
+            present[employee_id] = check_in
+            self._publish(company_id, {"type": "check_in", "employee_id": employee_id, "check_in": check_in.isoformat()})
+
+    def _check_out(self, company_id: str, employee_id: str) -> None:
+        if self.companies.get(company_id, {}).pop(employee_id, None) is not None:
+            self._publish(company_id, {"type": "check_out", "employee_id": employee_id})
+
+    def remove(self, company_id: str, employee_id: Optional[str] = None) -> None:
+        """Drop a deleted employee, or everyone of a deleted company"""
+        employee_ids = [employee_id] if employee_id else list(self.companies.get(company_id, {}))
+        for employee_id in employee_ids:
+            self._check_out(company_id, employee_id)
+
+    def apply(self, changes: List[tuple]) -> None:
+        """Apply written (old_entry, new_entry) changes; either side may be None"""
+        for old_entry, new_entry in changes:
+            new_is_open = bool(new_entry) and new_entry.get("check_out") is None
+            for entry in (old_entry, new_entry):
+                if not entry or not entry.get("company_id"):
+                    continue
+                if self._touched is not None:
+                    self._touched.add((entry["company_id"], entry["employee_id"]))
+                if entry is new_entry and new_is_open:
+                    self._check_in(entry["company_id"], entry["employee_id"], _presence_time(entry["check_in"]))
+                elif (
+                    self.companies.get(entry["company_id"], {}).get(entry["employee_id"]) == _presence_time(entry["check_in"])
+                    and not (new_is_open and entry["employee_id"] == new_entry["employee_id"])
+                ):
+                    self._check_out(entry["company_id"], entry["employee_id"])
+
+    async def load(self) -> None:
+        """Resync from open time entries, publishing whatever changed"""
+        self._touched = set()
+        try:
+            current: Dict[str, Dict[str, datetime]] = {}
+            cursor = db.time_entries.find(
+                {**OPEN_TIME_ENTRY_FILTER, "company_id": {"$ne": None}},
+                {"_id": 0, "employee_id": 1, "company_id": 1, "check_in": 1}
+            )
+            async for entry in cursor:
+                present = current.setdefault(entry["company_id"], {})
+                # With several open entries the latest check-in wins, as in scans
+                check_in = _presence_time(entry["check_in"])
+                if present.get(entry["employee_id"], datetime.min) < check_in:
+                    present[entry["employee_id"]] = check_in
+            for company_id in set(current) | set(self.companies):
+                loaded = current.get(company_id, {})
+                for employee_id in set(loaded) | set(self.companies.get(company_id, {})):
+                    if (company_id, employee_id) in self._touched:
+                        continue
+                    if employee_id in loaded:
+                        self._check_in(company_id, employee_id, loaded[employee_id])
+                    else:
+                        self._check_out(company_id, employee_id)
+            self.counters["resyncs"] += 1
+        finally:
+            self._touched = None
+
+    def subscribe(self, company_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        queue.put_nowait(self.snapshot(company_id))
+        self.subscribers.setdefault(company_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, company_id: str, queue: asyncio.Queue) -> None:
+        subscribers = self.subscribers.get(company_id)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self.subscribers[company_id]
+
+    def stats(self) -> dict:
+        return {
+            "companies": len(self.companies),
+            "present": sum(len(present) for present in self.companies.values()),
+            "subscribers": sum(len(queues) for queues in self.subscribers.values()),
+            **self.counters,
+        }
+
+presence_board = PresenceBoard(PRESENCE_SUBSCRIBER_QUEUE)
+
+async def record_time_entry_changes(changes: List[tuple]):
+    """Propagate written (old_entry, new_entry) changes to the hours rollups,
+    the presence board and the time entry change versions"""
+    await apply_hours_rollup_changes(changes)
+    presence_board.apply(changes)
+    await change_versions.bump(
+        "time_entries", {entry.get("company_id") for change in changes for entry in change if entry}
+    )
 
-@api_router.post("/auth/login", response_model=LoginResponse)
-async def login(request: LoginRequest):
-    """User login"""
-    user = await db.users.find_one({"username": request.username})
-    if not user or not verify_password(request.password, user["password_hash"]):
-        raise HTTPException(status_code=401, detail="Invalid credentials")
+# === MIGRATIONS ===
+
+# Ordered data migrations; append new ones with the next version number and
+# never renumber or edit applied ones. Progress is recorded in the migrations
+# collection ("state" document) and a "lock" document makes sure only one
+# worker applies them. Index changes are rolled out whenever INDEX_SPECS changes.
+MIGRATIONS = [
+    (1, "seed_default_data", init_default_data),
+    (2, "backfill_time_entry_company_ids", backfill_time_entry_company_ids),
+    (3, "build_hours_rollups", rebuild_hours_rollups),
+    (4, "backfill_updated_at", backfill_updated_at),
+    (5, "close_duplicate_open_entries", close_duplicate_open_entries),
+]
+LATEST_MIGRATION = MIGRATIONS[-1][0]
+
+# Identifies this worker in the migration lock and deletion job leases
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+def index_specs_fingerprint() -> str:
+    return hashlib.sha256(json.dumps(INDEX_SPECS, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+async def get_migration_state() -> dict:
+    state = await db.migrations.find_one({"_id": "state"}) or {}
+    return {"version": state.get("version", 0), "index_fingerprint": state.get("index_fingerprint")}
+
+def _migrations_current(state: dict) -> bool:
+    return state["version"] >= LATEST_MIGRATION and state["index_fingerprint"] == index_specs_fingerprint()
+
+async def _acquire_migration_lock() -> bool:
+    now = datetime.utcnow()
+    try:
+        await db.migrations.update_one(
+            {"_id": "lock", "$or": [{"expires_at": {"$lt": now}}, {"owner": WORKER_ID}]},
+            {"$set": {"owner": WORKER_ID, "expires_at": now + timedelta(seconds=MIGRATION_LOCK_SECONDS)}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        # The upsert tried to insert a second "lock": someone else holds it
+        return False
+
+async def _release_migration_lock() -> None:
+    await db.migrations.delete_one({"_id": "lock", "owner": WORKER_ID})
+
+class MigrationLockLost(Exception):
+    """Another worker took over the migration lock after ours expired"""
+
+async def _renew_migration_lock() -> None:
+    # Renewed between migrations so a long run is not mistaken for a dead worker
+    if not await _acquire_migration_lock():
+        raise MigrationLockLost()
+
+async def apply_pending_migrations() -> List[str]:
+    """Apply outstanding migrations while holding the lock; returns what was applied"""
+    applied = []
+    state = await get_migration_state()
+    if state["index_fingerprint"] != index_specs_fingerprint():
+        await ensure_indexes()
+        drift = await get_index_drift()
+        if drift:
+            logger.warning(f"Index drift detected: {drift}")
+        await db.migrations.update_one(
+            {"_id": "state"}, {"$set": {"index_fingerprint": index_specs_fingerprint()}}, upsert=True
+        )
+        applied.append("indexes")
+    for version, name, migration in MIGRATIONS:
+        if version <= state["version"]:
+            continue
+        await _renew_migration_lock()
+        start = time.perf_counter()
+        result = await migration()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        # The new holder reruns this migration if the lock expired while it ran
+        await _renew_migration_lock()
+        await db.migrations.update_one(
+            {"_id": "state"}, {"$set": {"version": version, "updated_at": datetime.utcnow()}}, upsert=True
+        )
+        await db.migrations.replace_one({"_id": f"migration:{version:04d}"}, {
+            "name": name,
+            "result": result,
+            "duration_ms": elapsed_ms,
+            "applied_at": datetime.utcnow(),
+            "applied_by": WORKER_ID,
+        }, upsert=True)
+        logger.info(f"Applied migration {version} ({name}) in {elapsed_ms:.0f} ms")
+        applied.append(name)
+    return applied
+
+async def run_migrations() -> None:
+    """Bring the database up to date exactly once across workers.
+    Costs a single read when nothing is pending."""
+    if _migrations_current(await get_migration_state()):
+        return
+    deadline = time.monotonic() + MIGRATION_WAIT_SECONDS
+    while True:
+        if await _acquire_migration_lock():
+            try:
+                await apply_pending_migrations()
+                return
+            except MigrationLockLost:
+                logger.error("Lost the migration lock to another worker; waiting for it to finish")
+            finally:
+                await _release_migration_lock()
+        await asyncio.sleep(0.5)
+        if _migrations_current(await get_migration_state()):
+            return
+        if time.monotonic() > deadline:
+            logger.warning("Timed out waiting for another worker to finish migrations; starting anyway")
+            return
+
+# === WRITE-BEHIND BUFFER ===
+
+class TimeEntryWriteBuffer:
+    """Bounded in-process queue of time entries flushed with insert_many.
+
+    Durability: an entry is acknowledged once it is queued, so it lives only
+    in this worker's memory until the next flush (at most flush_interval_ms
+    or batch_size entries later). Graceful shutdown drains the queue; a
+    crash loses whatever was still queued. Reads may not see an entry until
+    it has been flushed. When the queue is full, writes fall back to a
+    direct insert_one.
+
+    A check-in is rejected when the employee already has an open entry in
+    the database or queued on this worker, as the direct insert would be.
+    One opened in between by a scan or another worker still makes the
+    queued check-in fail at flush time; it is then discarded and counted
+    under "conflicts"."""
+
+    FLUSH_RETRIES = 3
+    _STOP = object()
+
+    def __init__(self, max_queue: int, batch_size: int, flush_interval_ms: int):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._batch_ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._queued_open: Dict[str, str] = {}  # employee id -> id of its queued open entry
+        self.counters = {"enqueued": 0, "direct_writes": 0, "flushed": 0, "flushes": 0, "dropped": 0, "conflicts": 0}
+        self.flush_seconds_total = 0.0
+        self.flush_seconds_max = 0.0
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def add(self, entry: dict) -> None:
+        """Queue entry; raises DuplicateKeyError for a second open entry of an employee"""
+        is_open = entry.get("check_out") is None
+        if is_open and await db.time_entries.find_one(
+            {"employee_id": entry["employee_id"], **OPEN_TIME_ENTRY_FILTER}, {"_id": 0, "id": 1}
+        ):
+            raise DuplicateKeyError("Employee is already checked in")
+        # No await from here until the entry is queued, so concurrent check-ins see each other
+        if is_open and entry["employee_id"] in self._queued_open:
+            raise DuplicateKeyError("Employee is already checked in")
+        try:
+            self._queue.put_nowait(entry)
+            self.counters["enqueued"] += 1
+            if is_open:
+                self._queued_open[entry["employee_id"]] = entry["id"]
+        except asyncio.QueueFull:
+            self.counters["direct_writes"] += 1
+            await db.time_entries.insert_one(entry)
+            await record_time_entry_changes([(None, entry)])
+            return
+        if self._queue.qsize() >= self.batch_size:
+            self._batch_ready.set()
+
+    async def _next_batch(self) -> List[Any]:
+        batch = [await self._queue.get()]
+        if batch[0] is not self._STOP and self._queue.qsize() + 1 < self.batch_size:
+            # Wait for a full batch or the flush interval, whichever comes first.
+            # Items are only taken with get_nowait below, so a timeout never loses one.
+            self._batch_ready.clear()
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+        while len(batch) < self.batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _flush(self, batch: List[dict]) -> None:
+        start = time.perf_counter()
+        pending, written = batch, []
+        for attempt in range(1, self.FLUSH_RETRIES + 1):
+            # Stamped when written, not when queued, so a late flush still lands after sync cursors
+            flushed_at = datetime.utcnow()
+            for entry in pending:
+                entry["updated_at"] = flushed_at
+            try:
+                await db.time_entries.insert_many(pending, ordered=False)
+                written += pending
+                pending = []
+                break
+            except BulkWriteError as e:
+                errors = {error["index"]: error for error in e.details.get("writeErrors", [])}
+                duplicates = [pending[index] for index, error in errors.items() if error.get("code") == 11000]
+                landed, conflicts = await self._split_duplicates(duplicates)
+                # Entries that did land (or already existed) must not be retried
+                written += [entry for index, entry in enumerate(pending) if index not in errors or entry["id"] in landed]
+                pending = [
+                    pending[index] for index in sorted(errors)
+                    if pending[index]["id"] not in landed and pending[index]["id"] not in conflicts
+                ]
+                if conflicts:
+                    self.counters["conflicts"] += len(conflicts)
+                    logger.error(f"Discarded {len(conflicts)} queued check-ins of employees already checked in")
+                if not pending:
+                    break
+                logger.error(f"Write-behind flush attempt {attempt} failed for {len(pending)} entries")
+            except Exception as e:
+                logger.error(f"Write-behind flush attempt {attempt} failed: {e}")
+            if attempt == self.FLUSH_RETRIES:
+                self.counters["dropped"] += len(pending)
+                logger.error(f"Dropped {len(pending)} time entries after {attempt} failed flushes")
+                break
+            await asyncio.sleep(0.1 * attempt)
+        for entry in batch:
+            if self._queued_open.get(entry["employee_id"]) == entry["id"]:
+                del self._queued_open[entry["employee_id"]]
+        if written:
+            try:
+                await record_time_entry_changes([(None, entry) for entry in written])
+            except Exception as e:
+                # The entries are stored; keep the flusher alive
+                logger.error(f"Failed to record {len(written)} flushed time entries: {e}")
+        elapsed = time.perf_counter() - start
+        self.counters["flushes"] += 1
+        self.counters["flushed"] += len(written)
+        self.flush_seconds_total += elapsed
+        self.flush_seconds_max = max(self.flush_seconds_max, elapsed)
+
+    async def _split_duplicates(self, entries: List[dict]) -> tuple:
+        """Split duplicate-key rows into ids an earlier attempt already wrote
+        and ids of second open entries, which can never be written"""
+        if not entries:
+            return set(), set()
+        try:
+            landed = {
+                entry["id"] async for entry in db.time_entries.find(
+                    {"id": {"$in": [entry["id"] for entry in entries]}}, {"_id": 0, "id": 1}
+                )
+            }
+        except Exception as e:
+            # Unknown for now; they are retried and looked up again
+            logger.error(f"Write-behind could not check duplicate entries: {e}")
+            return set(), set()
+        return landed, {entry["id"] for entry in entries} - landed
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping or not self._queue.empty():
+            batch = await self._next_batch()
+            entries = [entry for entry in batch if entry is not self._STOP]
+            stopping = stopping or len(entries) != len(batch)
+            if entries:
+                await self._flush(entries)
+
+    async def stop(self) -> None:
+        """Write out everything still queued, then stop the flusher"""
+        if self._task is None:
+            return
+        await self._queue.put(self._STOP)
+        self._batch_ready.set()
+        await self._task
+        self._task = None
+
+    def stats(self) -> dict:
+        flushes = self.counters["flushes"]
+        return {
+            "enabled": self._task is not None,
+            "queue_depth": self._queue.qsize(),
+            "max_queue": self._queue.maxsize,
+            **self.counters,
+            "flush_ms_avg": self.flush_seconds_total / flushes * 1000 if flushes else 0.0,
+            "flush_ms_max": self.flush_seconds_max * 1000,
+        }
+
+time_entry_buffer = TimeEntryWriteBuffer(WRITE_BEHIND_MAX_QUEUE, WRITE_BEHIND_BATCH_SIZE, WRITE_BEHIND_FLUSH_INTERVAL_MS)
+
+# === CASCADE DELETION ===
+
+# Documents removed after a company or employee is deleted, in order, with the
+# field linking them to it. Users and employees go first so nobody can log in
+# or punch for a company being deleted; rollups go last because time entry
+# writes still in flight update them.
+CASCADE_STEPS = {
+    "company": [
+        ("users", "company_id"),
+        ("employees", "company_id"),
+        ("time_entries", "company_id"),
+        ("hours_rollups", "company_id"),
+    ],
+    "employee": [
+        ("time_entries", "employee_id"),
+        ("hours_rollups", "employee_id"),
+    ],
+}
+
+class CascadeDeleter:
+    """Background worker for the jobs in deletion_jobs.
+
+    A step deletes the next batch_size matching documents until none are
+    left, recording progress and renewing the job's lease after every batch.
+    Steps are idempotent, so a job interrupted by a restart or crash simply
+    continues with its remaining steps once the lease is released or expires.
+    A failing job is retried with backoff up to CASCADE_MAX_ATTEMPTS times."""
+
+    def __init__(self, batch_size: int, batch_pause_ms: int):
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause_ms / 1000
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.counters = {"jobs_started": 0, "jobs_done": 0, "jobs_failed": 0, "batches": 0, "deleted": 0}
+
+    def start(self) -> None:
+        self._stopping = False
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop after the current batch and hand unfinished jobs back immediately"""
+        if self._task is None:
+            return
+        # Checked between batches; cancelling could interrupt one after its tombstones were written
+        self._stopping = True
+        self._wake.set()
+        await self._task
+        self._task = None
+        await db.deletion_jobs.update_many(
+            {"status": "running", "lease_owner": WORKER_ID},
+            {"$set": {"lease_owner": None, "lease_expires_at": None}}
+        )
+
+    async def enqueue(self, kind: str, target_id: str, company_id: Optional[str]) -> dict:
+        now = datetime.utcnow()
+        job = {
+            "id": str(uuid.uuid4()),
+            "kind": kind,
+            "target_id": target_id,
+            "company_id": company_id,
+            "status": "pending",
+            "steps": [
+                {"collection": collection, "field": field, "total": None, "deleted": 0, "done": False}
+                for collection, field in CASCADE_STEPS[kind]
+            ],
+            "attempts": 0,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            "finished_at": None,
+            "lease_owner": None,
+            "lease_expires_at": None,
+        }
+        await db.deletion_jobs.insert_one(job)
+        if self._wake is not None:
+            self._wake.set()
+        return job
+
+    async def _claim(self) -> Optional[dict]:
+        now = datetime.utcnow()
+        return await db.deletion_jobs.find_one_and_update(
+            {
+                "status": {"$in": ["pending", "running"]},
+                "$or": [{"lease_expires_at": None}, {"lease_expires_at": {"$lt": now}}],
+            },
+            {"$set": {
+                "status": "running",
+                "lease_owner": WORKER_ID,
+                "lease_expires_at": now + timedelta(seconds=CASCADE_LEASE_SECONDS),
+                "updated_at": now,
+            }},
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            # Cleared before claiming so a job enqueued meanwhile is not missed
+            self._wake.clear()
+            try:
+                job = await self._claim()
+            except Exception as e:
+                logger.error(f"Failed to claim deletion job: {e}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), CASCADE_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._execute(job)
+            except Exception as e:
+                # Even recording the failure failed; the job is retried once its lease expires
+                logger.error(f"Deletion job {job['id']} could not record its failure: {e}")
+
+    async def _save(self, job: dict, fields: dict, increments: Optional[dict] = None) -> bool:
+        """Record progress and renew the lease; False if the job was taken over"""
+        now = datetime.utcnow()
+        update: Dict[str, Any] = {"$set": {
+            "updated_at": now, "lease_expires_at": now + timedelta(seconds=CASCADE_LEASE_SECONDS), **fields
+        }}
+        if increments:
+            update["$inc"] = increments
+        result = await db.deletion_jobs.update_one({"id": job["id"], "lease_owner": WORKER_ID}, update)
+        return result.matched_count == 1
+
+    async def _execute(self, job: dict) -> None:
+        self.counters["jobs_started"] += 1
+        try:
+            for index, step in enumerate(job["steps"]):
+                if step["done"]:
+                    continue
+                if not await self._run_step(job, index, step):
+                    if not self._stopping:
+                        logger.warning(f"Deletion job {job['id']} was taken over by another worker")
+                    return
+            await self._save(job, {
+                "status": "done", "error": None, "finished_at": datetime.utcnow(),
+                "lease_owner": None, "lease_expires_at": None,
+            })
+            self.counters["jobs_done"] += 1
+            logger.info(f"Deletion job {job['id']} ({job['kind']} {job['target_id']}) finished")
+        except Exception as e:
+            attempts = job["attempts"] + 1
+            logger.error(f"Deletion job {job['id']} failed (attempt {attempts}): {e}")
+            fields = {
+                "attempts": attempts,
+                "error": str(e),
+                # Back off instead of retrying in a tight loop
+                "lease_expires_at": datetime.utcnow() + timedelta(seconds=CASCADE_POLL_SECONDS * attempts),
+            }
+            if attempts >= CASCADE_MAX_ATTEMPTS:
+                fields.update(status="failed", finished_at=datetime.utcnow(), lease_expires_at=None)
+                self.counters["jobs_failed"] += 1
+            await self._save(job, fields)
+
+    async def _run_step(self, job: dict, index: int, step: dict) -> bool:
+        """Run one step to completion; False if the job was taken over or the worker is stopping"""
+        query = {step["field"]: job["target_id"]}
+        if step["total"] is None:
+            step["total"] = await db[step["collection"]].count_documents(query)
+            if not await self._save(job, {f"steps.{index}.total": step["total"]}):
+                return False
+        while True:
+            deleted = await self._delete_batch(job, step["collection"], query)
+            if not deleted:
+                break
+            self.counters["batches"] += 1
+            self.counters["deleted"] += deleted
+            if not await self._save(job, {}, {f"steps.{index}.deleted": deleted}) or self._stopping:
+                return False
+            await asyncio.sleep(self.batch_pause)
+        if step["collection"] == "time_entries":
+            # Open entries are gone, so resyncs will not bring anyone back
+            presence_board.remove(job["company_id"], job["target_id"] if job["kind"] == "employee" else None)
+        return await self._save(job, {f"steps.{index}.done": True})
+
+    async def _delete_batch(self, job: dict, collection: str, query: dict) -> int:
+        documents = await db[collection].find(
+            query, {"_id": 1, "id": 1, "company_id": 1}
+        ).limit(self.batch_size).to_list(self.batch_size)
+        if not documents:
+            return 0
+        if collection == "users":
+            user_ids = [user["id"] for user in documents]
+            for user_id in user_ids:
+                await token_revocations.revoke(user_id, TOKEN_VERSION_REVOKED)
+                user_cache.invalidate(user_id)
+            await db.refresh_tokens.delete_many({"user_id": {"$in": user_ids}})
+        elif collection in ("employees", "time_entries"):
+            await write_tombstones(collection, documents)
+        result = await db[collection].delete_many({"_id": {"$in": [document["_id"] for document in documents]}})
+        if collection in ("employees", "time_entries"):
+            await change_versions.bump(collection, [job["company_id"]])
+        return result.deleted_count
+
+    async def stats(self) -> dict:
+        return {
+            "running": self._task is not None,
+            "pending_jobs": await db.deletion_jobs.count_documents({"status": "pending"}),
+            "running_jobs": await db.deletion_jobs.count_documents({"status": "running"}),
+            "failed_jobs": await db.deletion_jobs.count_documents({"status": "failed"}),
+            **self.counters,
+        }
+
+cascade_deleter = CascadeDeleter(CASCADE_BATCH_SIZE, CASCADE_BATCH_PAUSE_MS)
+
+# === BULK IMPORT/EXPORT ===
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "json": "application/json", "csv": "text/csv"}
+
+async def iter_upload_lines(request: Request, keepends: bool = False):
+    """Yield lines of the request body as it streams in, without buffering it whole.
+    A leading byte order mark (as written by Excel) is dropped."""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    pending = ""
+    async for chunk in request.stream():
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n" if keepends else line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending if keepends else pending.rstrip("\r")
+
+class _LineFeed:
+    """Line iterator for csv.reader that is refilled as the upload streams in.
+    Unlike a generator it can run dry and be iterated again."""
+
+    def __init__(self):
+        self.lines = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+async def iter_csv_rows(request: Request):
+    """Yield (values or None, error or None) per CSV record, parsed by a single
+    csv.reader. Quoted fields may span lines: a record is handed to the reader
+    once its quotes are balanced (or it outgrows csv's field size limit)."""
+    feed = _LineFeed()
+    reader = csv.reader(feed, strict=True)
+    quotes = size = 0
+    
+    def next_row():
+        try:
+            return next(reader), None
+        except csv.Error as e:
+            feed.lines.clear()
+            return None, f"Invalid CSV: {e}"
     
-    # Create access token
-    access_token = create_access_token({"user_id": user["id"]})
+    async for line in iter_upload_lines(request, keepends=True):
+        feed.lines.append(line)
+        quotes += line.count('"')
+        size += len(line)
+        if quotes % 2 and size <= csv.field_size_limit():
+            continue
+        quotes = size = 0
+        yield next_row()
+    if feed.lines:
+        yield next_row()
+
+async def iter_upload_records(request: Request, upload_format: str):
+    """Yield (row number, record dict or None, error or None) for a CSV or NDJSON upload.
+    CSV input must have a header row; NDJSON has one record per line."""
+    row = 0
+    if upload_format == "csv":
+        header = None
+        async for values, error in iter_csv_rows(request):
+            if values is not None and len(values) <= 1 and not "".join(values).strip():
+                continue
+            if header is None:
+                if error:
+                    raise HTTPException(status_code=400, detail=f"Invalid CSV header: {error}")
+                header = [name.strip() for name in values]
+                continue
+            row += 1
+            if error:
+                yield row, None, error
+                continue
+            if len(values) != len(header):
+                yield row, None, f"Expected {len(header)} columns, got {len(values)}"
+                continue
+            # Empty CSV cells mean "not provided"
+            yield row, {k: v for k, v in zip(header, values) if v != ""}, None
+        return
+    async for line in iter_upload_lines(request):
+        if not line.strip():
+            continue
+        row += 1
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield row, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield row, None, "Expected a JSON object"
+            continue
+        yield row, record, None
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(p) for p in e['loc'])}: {e['msg']}" for e in error.errors())
+
+async def run_import(request: Request, upload_format: str, build_batch, collection, after_insert=None) -> ImportReport:
+    """Validate uploaded records in batches and insert them with insert_many.
+    build_batch(records) returns (documents, errors) where documents is a list of
+    (row, document) and errors a list of ImportRowError; after_insert, if given,
+    is awaited with the documents that were written."""
+    total_rows = inserted = error_count = 0
+    errors: List[ImportRowError] = []
+    
+    def record_errors(new_errors):
+        nonlocal error_count
+        error_count += len(new_errors)
+        errors.extend(new_errors[:max(IMPORT_MAX_ERRORS - len(errors), 0)])
+    
+    async def flush(batch):
+        nonlocal inserted
+        documents, batch_errors = await build_batch(batch)
+        record_errors(batch_errors)
+        if not documents:
+            return
+        try:
+            await collection.insert_many([document for _, document in documents], ordered=False)
+            inserted += len(documents)
+            failed = set()
+        except BulkWriteError as e:
+            write_errors = e.details.get("writeErrors", [])
+            failed = {error["index"] for error in write_errors}
+            inserted += e.details.get("nInserted", 0)
+            record_errors([
+                ImportRowError(row=documents[error["index"]][0], error=error.get("errmsg", "Write failed"))
+                for error in write_errors
+            ])
+        if after_insert:
+            await after_insert([document for i, (_, document) in enumerate(documents) if i not in failed])
+    
+    batch = []
+    async for row, record, error in iter_upload_records(request, upload_format):
+        total_rows += 1
+        if error:
+            record_errors([ImportRowError(row=row, error=error)])
+            continue
+        batch.append((row, record))
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            await flush(batch)
+            batch = []
+    if batch:
+        await flush(batch)
+    
+    errors.sort(key=lambda error: error.row)
+    return ImportReport(total_rows=total_rows, inserted=inserted, error_count=error_count, errors=errors)
+
+def _export_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def stream_export(mongo_cursor, model, export_format: str) -> StreamingResponse:
+    """Stream documents from a Motor cursor as NDJSON, a JSON array or CSV"""
+    fields = list(model.model_fields)
+    
+    async def ndjson_rows():
+        async for document in mongo_cursor:
+            yield model(**document).json() + "\n"
+    
+    async def json_array_rows():
+        separator = ""
+        yield "["
+        async for document in mongo_cursor:
+            yield separator + model(**document).json()
+            separator = ","
+        yield "]"
+    
+    async def csv_rows():
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(fields)
+        async for document in mongo_cursor:
+            data = model(**document).dict()
+            writer.writerow([_export_value(data[field]) for field in fields])
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+        yield buf.getvalue()
+    
+    rows = {"ndjson": ndjson_rows, "json": json_array_rows, "csv": csv_rows}[export_format]
+    return StreamingResponse(rows(), media_type=EXPORT_MEDIA_TYPES[export_format])
+
+# === FAST LIST RESPONSES ===
+
+# Large list routes skip response_model re-validation: documents written by this
+# API already match their model, so they are projected to the model's fields in
+# the query and serialised straight to bytes with orjson. The response_model is
+# kept on the route for the OpenAPI schema.
+_list_response_specs: Dict[type, tuple] = {}
+
+def _list_response_spec(model) -> tuple:
+    spec = _list_response_specs.get(model)
+    if spec is None:
+        projection = {"_id": 0, **{field: 1 for field in model.model_fields}}
+        # Plain defaults only; id/created_at come from factories and are always stored
+        defaults = {
+            name: field.default for name, field in model.model_fields.items()
+            if not field.is_required() and field.default_factory is None
+        }
+        spec = _list_response_specs[model] = (projection, defaults)
+    return spec
+
+def list_projection(model) -> dict:
+    """Mongo projection returning exactly the fields of `model`"""
+    return _list_response_spec(model)[0]
+
+def list_response(documents: List[dict], model, etag: Optional[str] = None) -> ORJSONResponse:
+    """Serialise trusted documents fetched with list_projection(model)"""
+    defaults = _list_response_spec(model)[1]
+    if defaults:
+        for document in documents:
+            for name, default in defaults.items():
+                document.setdefault(name, default)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"} if etag else None
+    return ORJSONResponse(documents, headers=headers)
+
+# === AUTHENTICATION ROUTES ===
+
+async def create_refresh_token(user_id: str, family_id: Optional[str] = None) -> str:
+    """Issue an opaque refresh token; only its hash is stored"""
+    refresh_token = secrets.token_urlsafe(32)
+    now = datetime.utcnow()
+    await db.refresh_tokens.insert_one({
+        "token_hash": hash_token(refresh_token),
+        "user_id": user_id,
+        # All tokens rotated from one login share a family, revoked together on reuse
+        "family_id": family_id or str(uuid.uuid4()),
+        "used_at": None,
+        "expires_at": now + timedelta(days=REFRESH_TOKEN_EXPIRATION_DAYS),
+        "created_at": now
+    })
+    return refresh_token
+
+async def build_login_response(user: dict, family_id: Optional[str] = None) -> LoginResponse:
+    """Issue a new access/refresh token pair for user"""
+    access_token = create_access_token(token_claims(user))
+    refresh_token = await create_refresh_token(user["id"], family_id)
     
     # Get company name if user belongs to a company
     company_name = user.get("company_name")
     if user.get("company_id"):
-        company = await db.companies.find_one({"id": user["company_id"]})
-        if company:
-            company_name = company["name"]
+        company_names = await get_company_names()
+        company_name = company_names.get(user["company_id"], company_name)
     
     user_response = UserResponse(
         id=user["id"],
@@ -322,19 +2294,68 @@ async def login(request: LoginRequest):
     return LoginResponse(
         access_token=access_token,
         token_type="bearer",
-        user=user_response
+        user=user_response,
+        refresh_token=refresh_token,
+        expires_in=ACCESS_TOKEN_EXPIRATION_MINUTES * 60
+    )
+
+@api_router.post("/auth/login", response_model=LoginResponse)
+async def login(request: LoginRequest, http_request: Request):
+    """User login"""
+    throttle_keys = {"user": request.username.strip().lower(), "ip": client_ip(http_request)}
+    attempt = await login_throttle.reserve(throttle_keys)
+    
+    user = await db.users.find_one({"username": request.username})
+    if not user or not await verify_password(request.password, user["password_hash"]):
+        await login_throttle.record_failure(throttle_keys)
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    
+    await login_throttle.record_success(throttle_keys, attempt)
+    return await build_login_response(user)
+
+@api_router.post("/auth/refresh", response_model=LoginResponse)
+async def refresh_access_token(request: RefreshRequest):
+    """Exchange a refresh token for a new token pair (no password check)"""
+    token_hash = hash_token(request.refresh_token)
+    stored = await db.refresh_tokens.find_one_and_update(
+        {"token_hash": token_hash, "used_at": None, "expires_at": {"$gt": datetime.utcnow()}},
+        {"$set": {"used_at": datetime.utcnow()}}
     )
+    if not stored:
+        reused = await db.refresh_tokens.find_one({"token_hash": token_hash, "used_at": {"$ne": None}})
+        if reused:
+            # A rotated token came back: assume it leaked and end the whole session
+            await db.refresh_tokens.delete_many({"family_id": reused["family_id"]})
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    
+    user = await db.users.find_one({"id": stored["user_id"]})
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found")
+    
+    return await build_login_response(user, stored["family_id"])
+
+@api_router.post("/auth/logout")
+async def logout(request: RefreshRequest):
+    """Revoke a refresh token and every token rotated from the same login"""
+    stored = await db.refresh_tokens.find_one({"token_hash": hash_token(request.refresh_token)})
+    if stored:
+        await db.refresh_tokens.delete_many({"family_id": stored["family_id"]})
+    
+    return {"message": "Logged out successfully"}
 
 # === COMPANY ROUTES ===
 
 @api_router.get("/companies", response_model=List[Company])
-async def get_companies(current_user: dict = Depends(get_current_user)):
+async def get_companies(request: Request, current_user: dict = Depends(get_current_user)):
     """Get all companies (owner only)"""
     if current_user["type"] != "owner":
         raise HTTPException(status_code=403, detail="Access denied")
     
-    companies = await db.companies.find().to_list(1000)
-    return companies
+    etag = change_versions.etag("companies", ChangeVersions.ALL)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    companies = await db.companies.find({}, list_projection(Company)).to_list(1000)
+    return list_response(companies, Company, etag)
 
 @api_router.post("/companies", response_model=Company)
 async def create_company(company: CompanyCreate, current_user: dict = Depends(get_current_user)):
@@ -344,6 +2365,8 @@ async def create_company(company: CompanyCreate, current_user: dict = Depends(ge
     
     company_obj = Company(**company.dict())
     await db.companies.insert_one(company_obj.dict())
+    company_names_cache.clear()
+    await change_versions.bump("companies", [])
     return company_obj
 
 @api_router.put("/companies/{company_id}", response_model=Company)
@@ -359,21 +2382,26 @@ async def update_company(company_id: str, company: CompanyUpdate, current_user:
     update_data = {k: v for k, v in company.dict().items() if v is not None}
     if update_data:
         await db.companies.update_one({"id": company_id}, {"$set": update_data})
+        company_names_cache.clear()
+        await change_versions.bump("companies", [])
     
     updated_company = await db.companies.find_one({"id": company_id})
     return updated_company
 
 @api_router.delete("/companies/{company_id}")
 async def delete_company(company_id: str, current_user: dict = Depends(get_current_user)):
-    """Delete company (owner only)"""
+    """Delete company and, in the background, its users, employees and time entries (owner only)"""
     if current_user["type"] != "owner":
         raise HTTPException(status_code=403, detail="Access denied")
     
     result = await db.companies.delete_one({"id": company_id})
+    company_names_cache.clear()
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Company not found")
+    await change_versions.bump("companies", [])
+    job = await cascade_deleter.enqueue("company", company_id, company_id)
     
-    return {"message": "Company deleted successfully"}
+    return {"message": "Company deleted successfully", "deletion_job_id": job["id"]}
 
 # === USER ROUTES ===
 
@@ -384,13 +2412,12 @@ async def get_users(current_user: dict = Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="Access denied")
     
     users = await db.users.find().to_list(1000)
+    company_names = await get_company_names()
     user_responses = []
     for user in users:
         company_name = user.get("company_name")
         if user.get("company_id"):
-            company = await db.companies.find_one({"id": user["company_id"]})
-            if company:
-                company_name = company["name"]
+            company_name = company_names.get(user["company_id"], company_name)
         
         user_responses.append(UserResponse(
             id=user["id"],
@@ -424,7 +2451,7 @@ async def create_user(user: UserCreate, current_user: dict = Depends(get_current
     
     user_obj = User(
         username=user.username,
-        password_hash=hash_password(user.password),
+        password_hash=await hash_password(user.password),
         type=user.type,
         role=user.type,
         company_id=user.company_id,
@@ -455,7 +2482,7 @@ async def update_user(user_id: str, user: UserUpdate, current_user: dict = Depen
     
     update_data = {k: v for k, v in user.dict().items() if v is not None}
     if "password" in update_data:
-        update_data["password_hash"] = hash_password(update_data.pop("password"))
+        update_data["password_hash"] = await hash_password(update_data.pop("password"))
     if "type" in update_data:
         update_data["role"] = update_data["type"]
     
@@ -466,9 +2493,19 @@ async def update_user(user_id: str, user: UserUpdate, current_user: dict = Depen
             update_data["company_name"] = company["name"]
     
     if update_data:
-        await db.users.update_one({"id": user_id}, {"$set": update_data})
+        # Bumping the token version invalidates tokens carrying the old claims
+        updated_user = await db.users.find_one_and_update(
+            {"id": user_id},
+            {"$set": update_data, "$inc": {"token_version": 1}},
+            return_document=ReturnDocument.AFTER
+        )
+        user_cache.invalidate(user_id)
+        await token_revocations.revoke(user_id, updated_user["token_version"])
+        if "password_hash" in update_data:
+            await db.refresh_tokens.delete_many({"user_id": user_id})
+    else:
+        updated_user = existing_user
     
-    updated_user = await db.users.find_one({"id": user_id})
     return UserResponse(
         id=updated_user["id"],
         username=updated_user["username"],
@@ -486,22 +2523,25 @@ async def delete_user(user_id: str, current_user: dict = Depends(get_current_use
         raise HTTPException(status_code=403, detail="Access denied")
     
     result = await db.users.delete_one({"id": user_id})
+    user_cache.invalidate(user_id)
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    await token_revocations.revoke(user_id, TOKEN_VERSION_REVOKED)
+    await db.refresh_tokens.delete_many({"user_id": user_id})
     
     return {"message": "User deleted successfully"}
 
 # === EMPLOYEE ROUTES ===
 
 @api_router.get("/employees", response_model=List[Employee])
-async def get_employees(current_user: dict = Depends(get_current_user)):
+async def get_employees(request: Request, current_user: dict = Depends(get_current_user)):
     """Get employees (admin/user for their company, owner for all)"""
-    if current_user["type"] == "owner":
-        employees = await db.employees.find().to_list(1000)
-    else:
-        employees = await db.employees.find({"company_id": current_user["company_id"]}).to_list(1000)
-    
-    return employees
+    etag = change_versions.etag("employees", list_scope(current_user))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    query = {} if current_user["type"] == "owner" else {"company_id": current_user["company_id"]}
+    employees = await db.employees.find(query, list_projection(Employee)).to_list(1000)
+    return list_response(employees, Employee, etag)
 
 @api_router.post("/employees", response_model=Employee)
 async def create_employee(employee: EmployeeCreate, current_user: dict = Depends(get_current_user)):
@@ -519,8 +2559,53 @@ async def create_employee(employee: EmployeeCreate, current_user: dict = Depends
     )
     
     await db.employees.insert_one(employee_obj.dict())
+    await change_versions.bump("employees", [employee_obj.company_id])
     return employee_obj
 
+@api_router.get("/employees/export")
+async def export_employees(
+    format: str = Query("ndjson", pattern="^(ndjson|json|csv)$"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Stream employees as NDJSON, a JSON array or CSV"""
+    query = {} if current_user["type"] == "owner" else {"company_id": current_user["company_id"]}
+    mongo_cursor = db.employees.find(query, {"_id": 0}).sort("id", 1).batch_size(500)
+    return stream_export(mongo_cursor, Employee, format)
+
+@api_router.post("/employees/import", response_model=ImportReport)
+async def import_employees(
+    request: Request,
+    format: str = Query(..., pattern="^(csv|ndjson)$"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Bulk import employees from a streamed CSV or NDJSON body (admin only).
+    Each row needs a name; company_id defaults to the admin's company and
+    qr_code is generated when missing."""
+    if current_user["type"] not in ["owner", "admin"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    async def build_batch(records):
+        documents, errors = [], []
+        for row, record in records:
+            if current_user["type"] != "owner":
+                record.setdefault("company_id", current_user.get("company_id"))
+                if record["company_id"] != current_user.get("company_id"):
+                    errors.append(ImportRowError(row=row, error="Access denied for company"))
+                    continue
+            record.setdefault("qr_code", f"QR-EMP-{str(uuid.uuid4())[:8].upper()}")
+            record.pop("id", None)
+            record.pop("updated_at", None)
+            try:
+                documents.append((row, Employee(**record).dict()))
+            except ValidationError as e:
+                errors.append(ImportRowError(row=row, error=_validation_message(e)))
+        return documents, errors
+    
+    async def after_insert(documents):
+        await change_versions.bump("employees", {document["company_id"] for document in documents})
+    
+    return await run_import(request, format, build_batch, db.employees, after_insert)
+
 @api_router.put("/employees/{employee_id}", response_model=Employee)
 async def update_employee(employee_id: str, employee: EmployeeUpdate, current_user: dict = Depends(get_current_user)):
     """Update employee (admin only)"""
@@ -533,22 +2618,28 @@ async def update_employee(employee_id: str, employee: EmployeeUpdate, current_us
     
     update_data = {k: v for k, v in employee.dict().items() if v is not None}
     if update_data:
+        update_data["updated_at"] = datetime.utcnow()
         await db.employees.update_one({"id": employee_id}, {"$set": update_data})
+        await change_versions.bump("employees", [existing_employee["company_id"]])
     
     updated_employee = await db.employees.find_one({"id": employee_id})
     return updated_employee
 
 @api_router.delete("/employees/{employee_id}")
 async def delete_employee(employee_id: str, current_user: dict = Depends(get_current_user)):
-    """Delete employee (admin only)"""
+    """Delete employee and, in the background, their time entries (admin only)"""
     if current_user["type"] not in ["owner", "admin"]:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    result = await db.employees.delete_one({"id": employee_id})
-    if result.deleted_count == 0:
+    deleted_employee = await db.employees.find_one_and_delete({"id": employee_id}, {"id": 1, "company_id": 1})
+    if not deleted_employee:
         raise HTTPException(status_code=404, detail="Employee not found")
+    await write_tombstone("employees", deleted_employee)
+    await change_versions.bump("employees", [deleted_employee.get("company_id")])
+    presence_board.remove(deleted_employee.get("company_id"), employee_id)
+    job = await cascade_deleter.enqueue("employee", employee_id, deleted_employee.get("company_id"))
     
-    return {"message": "Employee deleted successfully"}
+    return {"message": "Employee deleted successfully", "deletion_job_id": job["id"]}
 
 @api_router.post("/employees/{employee_id}/qr", response_model=QRResponse)
 async def generate_employee_qr(employee_id: str, current_user: dict = Depends(get_current_user)):
@@ -560,27 +2651,214 @@ async def generate_employee_qr(employee_id: str, current_user: dict = Depends(ge
     if not employee:
         raise HTTPException(status_code=404, detail="Employee not found")
     
-    qr_image = generate_qr_code(employee["qr_code"])
+    qr_image = await generate_qr_code(employee["qr_code"])
     
     return QRResponse(
         qr_code_data=employee["qr_code"],
         qr_code_image=qr_image
     )
 
+@api_router.get("/employees/{employee_id}/qr/image")
+async def get_employee_qr_image(
+    employee_id: str,
+    request: Request,
+    format: str = Query("png", pattern="^(png|svg)$"),
+    box_size: int = Query(10, ge=1, le=40),
+    border: int = Query(5, ge=0, le=20),
+    current_user: dict = Depends(get_current_user)
+):
+    """Serve an employee's QR code as a raw PNG or SVG image (admin only)"""
+    if current_user["type"] not in ["owner", "admin"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    employee = await db.employees.find_one({"id": employee_id}, {"_id": 0, "qr_code": 1, "company_id": 1})
+    if not employee or (current_user["type"] != "owner" and employee["company_id"] != current_user.get("company_id")):
+        raise HTTPException(status_code=404, detail="Employee not found")
+    
+    etag = f'"{qr_cache_key(employee["qr_code"], format, box_size, border)}"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=86400"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    
+    image, _ = await get_qr_image(employee["qr_code"], format, box_size, border)
+    return Response(content=image, media_type=QR_MEDIA_TYPES[format], headers=headers)
+
+@api_router.get("/companies/{company_id}/qr-badges")
+async def export_company_qr_badges(
+    company_id: str,
+    format: str = Query("zip", pattern="^(zip|pdf)$"),
+    image_format: str = Query("png", pattern="^(png|svg)$"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Render every badge of a company into one ZIP or printable PDF (admin only)"""
+    if current_user["type"] not in ["owner", "admin"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+    if current_user["type"] != "owner" and current_user.get("company_id") != company_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    employees = await db.employees.find(
+        {"company_id": company_id}, {"_id": 0, "name": 1, "qr_code": 1}
+    ).sort("name", 1).to_list(None)
+    if format == "pdf":
+        image_format = "png"
+    images = await get_qr_images([employee["qr_code"] for employee in employees], image_format)
+    
+    loop = asyncio.get_running_loop()
+    if format == "pdf":
+        content = await loop.run_in_executor(None, build_badges_pdf, employees, images)
+        media_type = "application/pdf"
+    else:
+        content = await loop.run_in_executor(None, build_badges_zip, employees, images, image_format)
+        media_type = "application/zip"
+    return Response(
+        content=content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="badges-{company_id}.{format}"'}
+    )
+
 # === TIME ENTRY ROUTES ===
 
+async def time_entries_scope(current_user: dict) -> dict:
+    """Build the time entry filter limiting a user to their company"""
+    if current_user["type"] == "owner":
+        return {}
+    return {"company_id": current_user["company_id"]}
+
+def encode_cursor(entry: dict) -> str:
+    """Encode the (date, id) keyset position of an entry as an opaque cursor"""
+    raw = json.dumps([entry["date"], entry["id"]]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_cursor(cursor: str) -> tuple:
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        date, entry_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return str(date), str(entry_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def time_entries_query(
+    current_user: dict,
+    employee_id: Optional[str],
+    date_from: Optional[str],
+    date_to: Optional[str],
+    cursor: Optional[str] = None
+) -> dict:
+    """Combine the user's scope with the request filters and keyset position"""
+    conditions = [await time_entries_scope(current_user)]
+    if employee_id:
+        conditions.append({"employee_id": employee_id})
+    date_range = {}
+    if date_from:
+        date_range["$gte"] = date_from
+    if date_to:
+        date_range["$lte"] = date_to
+    if date_range:
+        conditions.append({"date": date_range})
+    if cursor:
+        last_date, last_id = decode_cursor(cursor)
+        conditions.append({"$or": [
+            {"date": {"$gt": last_date}},
+            {"date": last_date, "id": {"$gt": last_id}}
+        ]})
+    conditions = [c for c in conditions if c]
+    if not conditions:
+        return {}
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+TIME_ENTRY_SORT = [("date", 1), ("id", 1)]
+DATE_PATTERN = r"^\d{4}-\d{2}-\d{2}$"
+
 @api_router.get("/time-entries", response_model=List[TimeEntry])
-async def get_time_entries(current_user: dict = Depends(get_current_user)):
+async def get_time_entries(request: Request, current_user: dict = Depends(get_current_user)):
     """Get time entries (admin/user for their company, owner for all)"""
-    if current_user["type"] == "owner":
-        time_entries = await db.time_entries.find().to_list(1000)
-    else:
-        # Get employees from user's company first
-        employees = await db.employees.find({"company_id": current_user["company_id"]}).to_list(1000)
-        employee_ids = [emp["id"] for emp in employees]
-        time_entries = await db.time_entries.find({"employee_id": {"$in": employee_ids}}).to_list(1000)
+    etag = change_versions.etag("time_entries", list_scope(current_user))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    time_entries = await db.time_entries.find(
+        await time_entries_scope(current_user), list_projection(TimeEntry)
+    ).to_list(1000)
+    return list_response(time_entries, TimeEntry, etag)
+
+@api_router.get("/time-entries/page", response_model=TimeEntryPage)
+async def get_time_entries_page(
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    employee_id: Optional[str] = None,
+    date_from: Optional[str] = Query(None, pattern=DATE_PATTERN),
+    date_to: Optional[str] = Query(None, pattern=DATE_PATTERN),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get one page of time entries ordered by (date, id)"""
+    query = await time_entries_query(current_user, employee_id, date_from, date_to, cursor)
+    # Fetch one extra row to know whether another page exists
+    time_entries = await db.time_entries.find(query, {"_id": 0}).sort(TIME_ENTRY_SORT).limit(limit + 1).to_list(limit + 1)
+    next_cursor = None
+    if len(time_entries) > limit:
+        time_entries = time_entries[:limit]
+        next_cursor = encode_cursor(time_entries[-1])
+    
+    return TimeEntryPage(items=time_entries, next_cursor=next_cursor)
+
+@api_router.get("/time-entries/stream")
+@api_router.get("/time-entries/export")
+async def stream_time_entries(
+    format: str = Query("ndjson", pattern="^(ndjson|json|csv)$"),
+    employee_id: Optional[str] = None,
+    date_from: Optional[str] = Query(None, pattern=DATE_PATTERN),
+    date_to: Optional[str] = Query(None, pattern=DATE_PATTERN),
+    current_user: dict = Depends(get_current_user)
+):
+    """Stream all matching time entries as NDJSON, a JSON array or CSV"""
+    query = await time_entries_query(current_user, employee_id, date_from, date_to)
+    mongo_cursor = db.time_entries.find(query, {"_id": 0}).sort(TIME_ENTRY_SORT).batch_size(500)
+    return stream_export(mongo_cursor, TimeEntry, format)
+
+@api_router.post("/time-entries/import", response_model=ImportReport)
+async def import_time_entries(
+    request: Request,
+    format: str = Query(..., pattern="^(csv|ndjson)$"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Bulk import time entries from a streamed CSV or NDJSON body (admin only).
+    Each row needs employee_id and check_in; check_out is optional."""
+    if current_user["type"] not in ["owner", "admin"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    async def build_batch(records):
+        employee_ids = list({str(record.get("employee_id")) for _, record in records})
+        employees = {
+            employee["id"]: employee
+            async for employee in db.employees.find({"id": {"$in": employee_ids}}, {"_id": 0, "id": 1, "company_id": 1})
+        }
+        documents, errors = [], []
+        for row, record in records:
+            try:
+                time_entry = TimeEntryCreate(**record)
+            except ValidationError as e:
+                errors.append(ImportRowError(row=row, error=_validation_message(e)))
+                continue
+            employee = employees.get(time_entry.employee_id)
+            if not employee or (current_user["type"] != "owner" and employee["company_id"] != current_user.get("company_id")):
+                errors.append(ImportRowError(row=row, error="Employee not found"))
+                continue
+            total_hours = None
+            if time_entry.check_out:
+                total_hours = (time_entry.check_out - time_entry.check_in).total_seconds() / 3600
+            documents.append((row, TimeEntry(
+                employee_id=time_entry.employee_id,
+                company_id=employee["company_id"],
+                check_in=time_entry.check_in,
+                check_out=time_entry.check_out,
+                date=time_entry.check_in.strftime("%Y-%m-%d"),
+                total_hours=total_hours
+            ).dict()))
+        return documents, errors
     
-    return time_entries
+    async def after_insert(documents):
+        await record_time_entry_changes([(None, document) for document in documents])
+    
+    return await run_import(request, format, build_batch, db.time_entries, after_insert)
 
 @api_router.post("/time-entries", response_model=TimeEntry)
 async def create_time_entry(time_entry: TimeEntryCreate, current_user: dict = Depends(get_current_user)):
@@ -597,15 +2875,303 @@ async def create_time_entry(time_entry: TimeEntryCreate, current_user: dict = De
     
     time_entry_obj = TimeEntry(
         employee_id=time_entry.employee_id,
+        company_id=employee["company_id"],
         check_in=time_entry.check_in,
         check_out=time_entry.check_out,
         date=time_entry.check_in.strftime("%Y-%m-%d"),
         total_hours=total_hours
     )
     
-    await db.time_entries.insert_one(time_entry_obj.dict())
+    try:
+        if WRITE_BEHIND_ENABLED:
+            await time_entry_buffer.add(time_entry_obj.dict())
+            return time_entry_obj
+        await db.time_entries.insert_one(time_entry_obj.dict())
+    except DuplicateKeyError:
+        # Only open entries are unique per employee
+        raise HTTPException(status_code=409, detail="Employee is already checked in")
+    await record_time_entry_changes([(None, time_entry_obj.dict())])
     return time_entry_obj
 
+@api_router.post("/time-entries/scan", response_model=ScanResponse)
+async def scan_time_entry(scan: ScanRequest, current_user: dict = Depends(get_current_user)):
+    """Toggle check-in/check-out for the employee owning a QR code"""
+    employee = await db.employees.find_one(
+        {"qr_code": scan.qr_code},
+        {"_id": 0, "id": 1, "name": 1, "company_id": 1, "is_active": 1}
+    )
+    if not employee:
+        raise HTTPException(status_code=404, detail="Employee not found")
+    if current_user["type"] != "owner" and employee["company_id"] != current_user.get("company_id"):
+        raise HTTPException(status_code=404, detail="Employee not found")
+    if not employee.get("is_active", True):
+        raise HTTPException(status_code=403, detail="Employee is inactive")
+    
+    # Close the open entry, if any, or open one. A check-in that loses a race
+    # (double tap) hits the unique open-entry index and is retried as a toggle.
+    for _ in range(SCAN_TOGGLE_ATTEMPTS):
+        now = datetime.utcnow()
+        # Computes total hours server-side in one update
+        closed_entry = await db.time_entries.find_one_and_update(
+            {"employee_id": employee["id"], **OPEN_TIME_ENTRY_FILTER},
+            [{"$set": {
+                "check_out": now,
+                "total_hours": {"$divide": [{"$subtract": [now, "$check_in"]}, 3600000]},
+                "updated_at": now
+            }}],
+            return_document=ReturnDocument.AFTER
+        )
+        if closed_entry:
+            await record_time_entry_changes([({**closed_entry, "total_hours": None}, closed_entry)])
+            return ScanResponse(
+                action="check_out",
+                employee_id=employee["id"],
+                employee_name=employee["name"],
+                time_entry=TimeEntry(**closed_entry)
+            )
+        
+        time_entry_obj = TimeEntry(
+            employee_id=employee["id"],
+            company_id=employee["company_id"],
+            check_in=now,
+            date=now.strftime("%Y-%m-%d")
+        )
+        try:
+            await db.time_entries.insert_one(time_entry_obj.dict())
+        except DuplicateKeyError:
+            continue
+        await record_time_entry_changes([(None, time_entry_obj.dict())])
+        return ScanResponse(
+            action="check_in",
+            employee_id=employee["id"],
+            employee_name=employee["name"],
+            time_entry=time_entry_obj
+        )
+    raise HTTPException(status_code=409, detail="Concurrent scans for this employee, please retry")
+
+@api_router.post("/time-entries/scan-batch", response_model=ScanBatchResponse)
+async def scan_time_entries_batch(batch: ScanBatchRequest, current_user: dict = Depends(get_current_user)):
+    """Apply an ordered batch of offline kiosk scans, skipping already-seen idempotency keys"""
+    results = {}
+    events = []
+    for event in batch.events:
+        if event.idempotency_key in results:
+            continue
+        results[event.idempotency_key] = None
+        events.append(event)
+    
+    # Claim the keys first; the unique index makes concurrent replays skip them
+    claimed = await claim_scan_events(list(results))
+    try:
+        return await apply_scan_batch(batch, events, results, claimed, current_user)
+    except Exception:
+        # apply_scan_batch drops keys from `claimed` once their punches are written;
+        # nothing was stored for the rest, so the kiosk must be able to retry them
+        await db.scan_events.delete_many({"idempotency_key": {"$in": list(claimed)}, "status": "pending"})
+        raise
+
+async def claim_scan_events(keys: List[str]) -> set:
+    """Insert pending scan_events for keys and return the ones this request now owns.
+    Pending claims older than SCAN_CLAIM_LEASE_SECONDS are taken over."""
+    if not keys:
+        return set()
+    now = datetime.utcnow()
+    claimed = set(keys)
+    try:
+        await db.scan_events.insert_many([
+            {"idempotency_key": key, "status": "pending", "created_at": now} for key in keys
+        ], ordered=False)
+        return claimed
+    except BulkWriteError as e:
+        taken = {keys[error["index"]] for error in e.details.get("writeErrors", [])}
+    stale = await db.scan_events.delete_many({
+        "idempotency_key": {"$in": list(taken)},
+        "status": "pending",
+        "created_at": {"$lt": now - timedelta(seconds=SCAN_CLAIM_LEASE_SECONDS)},
+    })
+    if stale.deleted_count:
+        retry = [key for key in keys if key in taken]
+        try:
+            await db.scan_events.insert_many([
+                {"idempotency_key": key, "status": "pending", "created_at": now} for key in retry
+            ], ordered=False)
+            taken = set()
+        except BulkWriteError as e:
+            taken = {retry[error["index"]] for error in e.details.get("writeErrors", [])}
+    return claimed - taken
+
+async def apply_scan_batch(batch: ScanBatchRequest, events: list, results: dict, claimed: set,
+                           current_user: dict) -> ScanBatchResponse:
+    def fail(event, error):
+        results[event.idempotency_key] = ScanEventResult(idempotency_key=event.idempotency_key, status="error", error=error)
+    
+    duplicates = set(results) - claimed
+    if duplicates:
+        async for previous in db.scan_events.find({"idempotency_key": {"$in": list(duplicates)}}, {"_id": 0}):
+            results[previous["idempotency_key"]] = ScanEventResult(
+                idempotency_key=previous["idempotency_key"],
+                status="duplicate",
+                action=previous.get("action"),
+                time_entry_id=previous.get("time_entry_id"),
+                error=previous.get("error")
+            )
+    events = [event for event in events if event.idempotency_key in claimed]
+    
+    employees = {
+        employee["qr_code"]: employee
+        async for employee in db.employees.find(
+            {"qr_code": {"$in": list({event.qr_code for event in events})}},
+            {"_id": 0, "id": 1, "qr_code": 1, "company_id": 1, "is_active": 1}
+        )
+    }
+    open_entries = {
+        entry["employee_id"]: entry
+        async for entry in db.time_entries.find(
+            {"employee_id": {"$in": [employee["id"] for employee in employees.values()]}, **OPEN_TIME_ENTRY_FILTER},
+            {"_id": 0}
+        )
+    }
+    
+    # Replay the events in order against the in-memory open-entry state
+    new_entries = {}  # id -> entry document inserted by this batch
+    closed_entries = {}  # id -> (entry before, entry after) for entries already in the DB
+    entry_events = {}  # id -> idempotency keys applied to that entry
+    for event in events:
+        employee = employees.get(event.qr_code)
+        if not employee or (current_user["type"] != "owner" and employee["company_id"] != current_user.get("company_id")):
+            fail(event, "Employee not found")
+            continue
+        if not employee.get("is_active", True):
+            fail(event, "Employee is inactive")
+            continue
+        scanned_at = to_bson_datetime(to_naive_utc(event.scanned_at))
+        open_entry = open_entries.get(employee["id"])
+        action = event.action or ("check_out" if open_entry else "check_in")
+        if action == "check_in":
+            if open_entry:
+                fail(event, "Employee is already checked in")
+                continue
+            entry = TimeEntry(
+                employee_id=employee["id"],
+                company_id=employee["company_id"],
+                check_in=scanned_at,
+                date=scanned_at.strftime("%Y-%m-%d")
+            ).dict()
+            new_entries[entry["id"]] = entry
+            open_entries[employee["id"]] = entry
+        elif action == "check_out":
+            if not open_entry:
+                fail(event, "Employee is not checked in")
+                continue
+            if scanned_at < open_entry["check_in"]:
+                fail(event, "Check-out is earlier than check-in")
+                continue
+            closed = {
+                **open_entry,
+                "check_out": scanned_at,
+                "total_hours": (scanned_at - open_entry["check_in"]).total_seconds() / 3600,
+                "updated_at": to_bson_datetime(datetime.utcnow())
+            }
+            if open_entry["id"] in new_entries:
+                new_entries[open_entry["id"]] = closed
+            else:
+                closed_entries[open_entry["id"]] = (open_entry, closed)
+            entry = closed
+            del open_entries[employee["id"]]
+        else:
+            fail(event, f"Unknown action: {action}")
+            continue
+        entry_events.setdefault(entry["id"], []).append(event.idempotency_key)
+        results[event.idempotency_key] = ScanEventResult(
+            idempotency_key=event.idempotency_key,
+            status="applied",
+            action=action,
+            time_entry_id=entry["id"]
+        )
+    
+    written = list(new_entries) + list(closed_entries)
+    operations = [InsertOne(entry) for entry in new_entries.values()] + [
+        UpdateOne(
+            {"id": entry_id, **OPEN_TIME_ENTRY_FILTER},
+            {"$set": {"check_out": after["check_out"], "total_hours": after["total_hours"], "updated_at": after["updated_at"]}}
+        )
+        for entry_id, (_, after) in closed_entries.items()
+    ]
+    write_errors, matched = {}, len(closed_entries)
+    if operations:
+        try:
+            matched = (await db.time_entries.bulk_write(operations, ordered=False)).matched_count
+        except BulkWriteError as e:
+            # Unordered: every operation without a write error was applied
+            write_errors = {written[error["index"]]: error for error in e.details.get("writeErrors", [])}
+            matched = e.details.get("nMatched", 0)
+    # From here on a failure must not release the keys of punches that were stored
+    claimed.difference_update(
+        key for entry_id in written if entry_id not in write_errors for key in entry_events[entry_id]
+    )
+    
+    released = []
+    for entry_id, error in write_errors.items():
+        new_entries.pop(entry_id, None)
+        closed_entries.pop(entry_id, None)
+        for key in entry_events[entry_id]:
+            if error.get("code") == 11000:
+                # An online scan opened an entry for this employee after the batch read its state
+                results[key] = ScanEventResult(idempotency_key=key, status="error", error="Employee is already checked in")
+            else:
+                results[key] = ScanEventResult(idempotency_key=key, status="error", error="Not stored, retry later")
+                released.append(key)
+    if matched < len(closed_entries):
+        # Some entries were checked out elsewhere first. The ones carrying our check-out and
+        # updated_at (both to the millisecond) are ours; an online scan stamps both with its own clock
+        ours = set()
+        async for stored in db.time_entries.find(
+            {"id": {"$in": list(closed_entries)}}, {"_id": 0, "id": 1, "check_out": 1, "updated_at": 1}
+        ):
+            after = closed_entries[stored["id"]][1]
+            if (stored.get("check_out"), stored.get("updated_at")) == (after["check_out"], after["updated_at"]):
+                ours.add(stored["id"])
+        for entry_id in set(closed_entries) - ours:
+            del closed_entries[entry_id]
+            for key in entry_events[entry_id]:
+                results[key] = ScanEventResult(idempotency_key=key, status="error", error="Employee is already checked out")
+    
+    if released:
+        await db.scan_events.delete_many({"idempotency_key": {"$in": released}, "status": "pending"})
+    recorded = [event for event in events if event.idempotency_key not in released]
+    if recorded:
+        # Recorded before anything else can fail, so the punches are never replayed
+        await db.scan_events.bulk_write([
+            UpdateOne(
+                {"idempotency_key": event.idempotency_key},
+                {"$set": {
+                    "status": results[event.idempotency_key].status,
+                    "action": results[event.idempotency_key].action,
+                    "time_entry_id": results[event.idempotency_key].time_entry_id,
+                    "error": results[event.idempotency_key].error
+                }}
+            )
+            for event in recorded
+        ], ordered=False)
+    if new_entries or closed_entries:
+        try:
+            await record_time_entry_changes(
+                [(None, entry) for entry in new_entries.values()] + list(closed_entries.values())
+            )
+        except Exception as e:
+            # The punches are stored; rollups and presence catch up on their next rebuild/resync
+            logger.error(f"Failed to record scan batch changes: {e}")
+    
+    # Repeats of a key within the batch report as duplicates of its first occurrence
+    response, seen = [], set()
+    for event in batch.events:
+        result = results[event.idempotency_key]
+        if event.idempotency_key in seen and result.status != "duplicate":
+            result = result.copy(update={"status": "duplicate"})
+        seen.add(event.idempotency_key)
+        response.append(result)
+    return ScanBatchResponse(results=response)
+
 @api_router.put("/time-entries/{entry_id}", response_model=TimeEntry)
 async def update_time_entry(entry_id: str, time_entry: TimeEntryUpdate, current_user: dict = Depends(get_current_user)):
     """Update time entry (admin only)"""
@@ -627,10 +3193,14 @@ async def update_time_entry(entry_id: str, time_entry: TimeEntryUpdate, current_
             delta = check_out - check_in
             update_data["total_hours"] = delta.total_seconds() / 3600
     
-    if update_data:
-        await db.time_entries.update_one({"id": entry_id}, {"$set": update_data})
+    if not update_data:
+        return existing_entry
     
-    updated_entry = await db.time_entries.find_one({"id": entry_id})
+    update_data["updated_at"] = datetime.utcnow()
+    updated_entry = await db.time_entries.find_one_and_update(
+        {"id": entry_id}, {"$set": update_data}, return_document=ReturnDocument.AFTER
+    )
+    await record_time_entry_changes([(existing_entry, updated_entry)])
     return updated_entry
 
 @api_router.delete("/time-entries/{entry_id}")
@@ -639,12 +3209,317 @@ async def delete_time_entry(entry_id: str, current_user: dict = Depends(get_curr
     if current_user["type"] not in ["owner", "admin"]:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    result = await db.time_entries.delete_one({"id": entry_id})
-    if result.deleted_count == 0:
+    deleted_entry = await db.time_entries.find_one_and_delete({"id": entry_id})
+    if not deleted_entry:
         raise HTTPException(status_code=404, detail="Time entry not found")
+    await write_tombstone("time_entries", deleted_entry)
+    await record_time_entry_changes([(deleted_entry, None)])
     
     return {"message": "Time entry deleted successfully"}
 
+# === SYNC ROUTES ===
+
+# A sync cursor holds one keyset position per source: the (updated_at, id) of
+# the last document returned, or (updated_at, None) once everything up to that
+# time has been delivered.
+SYNC_SOURCES = ("employees", "time_entries", "tombstones")
+
+async def write_tombstone(collection: str, document: dict):
+    """Remember a deletion so incremental sync can report it"""
+    await write_tombstones(collection, [document])
+
+async def write_tombstones(collection: str, documents: List[dict]):
+    now = datetime.utcnow()
+    await db.tombstones.insert_many([
+        {"collection": collection, "id": document["id"], "company_id": document.get("company_id"), "updated_at": now}
+        for document in documents
+    ])
+
+def _sync_millis(value: datetime) -> int:
+    return int(value.replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+def _sync_datetime(millis: int) -> datetime:
+    return datetime.fromtimestamp(millis / 1000, tz=timezone.utc).replace(tzinfo=None)
+
+def encode_sync_cursor(positions: dict) -> str:
+    raw = json.dumps({source: [_sync_millis(at), last_id] for source, (at, last_id) in positions.items()})
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_sync_cursor(cursor: str) -> dict:
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return {source: (_sync_datetime(int(raw[source][0])), raw[source][1]) for source in SYNC_SOURCES}
+    except (ValueError, TypeError, KeyError, IndexError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _after_position(at: datetime, last_id: Optional[str]) -> dict:
+    if last_id is None:
+        return {"updated_at": {"$gt": at}}
+    return {"$or": [{"updated_at": {"$gt": at}}, {"updated_at": at, "id": {"$gt": last_id}}]}
+
+@api_router.get("/sync", response_model=SyncResponse)
+async def sync_changes(
+    since: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=1000),
+    current_user: dict = Depends(get_current_user)
+):
+    """Employees, time entries and deletions changed after `since`, oldest
+    first. Without `since` every current document is returned. Keep calling
+    with the returned cursor while has_more is true; 410 means the cursor is
+    older than the deletion history and the client must start over."""
+    now = datetime.utcnow()
+    # Changes newer than this may still be joined by slower concurrent writes
+    horizon = now - timedelta(seconds=SYNC_SETTLE_SECONDS)
+    horizon = horizon.replace(microsecond=horizon.microsecond // 1000 * 1000)
+    if since:
+        positions = decode_sync_cursor(since)
+        if positions["tombstones"][0] < now - timedelta(days=SYNC_TOMBSTONE_RETENTION_DAYS):
+            raise HTTPException(status_code=410, detail="Sync cursor expired; reload all data")
+    else:
+        # A full load has nothing to delete locally, so deletions start from now
+        positions = {"employees": (datetime.min, None), "time_entries": (datetime.min, None), "tombstones": (horizon, None)}
+    
+    scope = {} if current_user["type"] == "owner" else {"company_id": current_user["company_id"]}
+    results = {}
+    has_more = False
+    for source in SYNC_SOURCES:
+        at, last_id = positions[source]
+        if at >= horizon:
+            results[source] = []
+            continue
+        query = {"$and": [scope, _after_position(at, last_id), {"updated_at": {"$lte": horizon}}]}
+        mongo_cursor = db[source].find(query, {"_id": 0}).sort([("updated_at", 1), ("id", 1)]).limit(limit)
+        documents = await mongo_cursor.to_list(limit)
+        results[source] = documents
+        if len(documents) == limit:
+            has_more = True
+            positions[source] = (documents[-1]["updated_at"], documents[-1]["id"])
+        else:
+            positions[source] = (horizon, None)
+    
+    return SyncResponse(
+        employees=results["employees"],
+        time_entries=results["time_entries"],
+        deleted=[
+            SyncDeletion(collection=tombstone["collection"], id=tombstone["id"], deleted_at=tombstone["updated_at"])
+            for tombstone in results["tombstones"]
+        ],
+        cursor=encode_sync_cursor(positions),
+        has_more=has_more
+    )
+
+# === PRESENCE ROUTES ===
+
+def presence_company_id(current_user: dict, company_id: Optional[str]) -> str:
+    """Owners pick a company; everyone else sees their own"""
+    if current_user["type"] == "owner":
+        if not company_id:
+            raise HTTPException(status_code=400, detail="company_id is required")
+        return company_id
+    if not current_user.get("company_id"):
+        raise HTTPException(status_code=403, detail="Access denied")
+    return current_user["company_id"]
+
+@api_router.get("/presence")
+async def get_presence(company_id: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    """Who is currently checked in at a company"""
+    return presence_board.snapshot(presence_company_id(current_user, company_id))
+
+@api_router.get("/presence/stream")
+async def stream_presence(
+    request: Request,
+    company_id: Optional[str] = None,
+    current_user: dict = Depends(get_stream_user)
+):
+    """Server-Sent Events: a snapshot, then one check_in/check_out event per punch"""
+    company_id = presence_company_id(current_user, company_id)
+    
+    async def events():
+        queue = presence_board.subscribe(company_id)
+        try:
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), PRESENCE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle connection
+                    yield ": heartbeat\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            presence_board.unsubscribe(company_id, queue)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# === DELETION JOB ROUTES ===
+
+@api_router.get("/deletion-jobs", response_model=List[DeletionJob])
+async def get_deletion_jobs(current_user: dict = Depends(get_current_user)):
+    """List recent cascade deletion jobs (owner for all, admin for their company)"""
+    if current_user["type"] not in ["owner", "admin"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    query = {} if current_user["type"] == "owner" else {"company_id": current_user["company_id"]}
+    return await db.deletion_jobs.find(query).sort("created_at", -1).to_list(100)
+
+@api_router.get("/deletion-jobs/{job_id}", response_model=DeletionJob)
+async def get_deletion_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    """Get the progress of a cascade deletion job"""
+    if current_user["type"] not in ["owner", "admin"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    job = await db.deletion_jobs.find_one({"id": job_id})
+    if not job or (current_user["type"] != "owner" and job["company_id"] != current_user["company_id"]):
+        raise HTTPException(status_code=404, detail="Deletion job not found")
+    return job
+
+# === REPORT ROUTES ===
+
+def _week_start(date: str) -> str:
+    day = datetime.strptime(date, "%Y-%m-%d")
+    return (day - timedelta(days=day.weekday())).strftime("%Y-%m-%d")
+
+@api_router.get("/reports/hours", response_model=HoursReport)
+async def get_hours_report(
+    date_from: str = Query(..., pattern=DATE_PATTERN),
+    date_to: str = Query(..., pattern=DATE_PATTERN),
+    period: str = Query("day", pattern="^(day|week|month)$"),
+    group_by: str = Query("employee", pattern="^(employee|company)$"),
+    employee_id: Optional[str] = None,
+    company_id: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Report worked hours per employee or company, by day, week or month.
+    Month totals cover every month touched by the date range."""
+    query = {}
+    if current_user["type"] != "owner":
+        query["company_id"] = current_user["company_id"]
+    elif company_id:
+        query["company_id"] = company_id
+    if employee_id:
+        query["employee_id"] = employee_id
+    
+    if period == "month":
+        query.update({"period": "month", "key": {"$gte": date_from[:7], "$lte": date_to[:7]}})
+    else:
+        query.update({"period": "day", "key": {"$gte": date_from, "$lte": date_to}})
+    
+    totals = {}
+    async for rollup in db.hours_rollups.find(query, {"_id": 0}):
+        period_key = _week_start(rollup["key"]) if period == "week" else rollup["key"]
+        group = rollup["employee_id"] if group_by == "employee" else rollup.get("company_id")
+        row = totals.setdefault((period_key, group), HoursReportRow(
+            period=period_key,
+            employee_id=group if group_by == "employee" else None,
+            company_id=rollup.get("company_id"),
+            total_hours=0.0,
+            entry_count=0
+        ))
+        row.total_hours += rollup["total_hours"]
+        row.entry_count += rollup["entry_count"]
+    
+    rows = []
+    for row in totals.values():
+        if row.entry_count:
+            row.total_hours = round(row.total_hours, 4)
+            rows.append(row)
+    rows.sort(key=lambda row: (row.period, row.employee_id or row.company_id or ""))
+    return HoursReport(period=period, group_by=group_by, date_from=date_from, date_to=date_to, rows=rows)
+
+# === SYSTEM ROUTES ===
+
+@api_router.get("/system/indexes")
+async def get_indexes_status(current_user: dict = Depends(get_current_user)):
+    """Report drift between declared and actual indexes (owner only)"""
+    if current_user["type"] != "owner":
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    drift = await get_index_drift()
+    return {"in_sync": not drift, "drift": drift}
+
+@api_router.get("/system/cache")
+async def get_cache_stats(current_user: dict = Depends(get_current_user)):
+    """Report in-process cache counters (owner only)"""
+    if current_user["type"] != "owner":
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    return {
+        "users": user_cache.stats(),
+        "companies": company_names_cache.stats(),
+        "qr_images": qr_image_cache.stats(),
+        "tokens": token_cache.stats(),
+        "token_revocations": token_revocations.stats(),
+        "change_versions": change_versions.stats(),
+    }
+
+@api_router.get("/system/bcrypt-pool")
+async def get_bcrypt_pool_stats(current_user: dict = Depends(get_current_user)):
+    """Report password hashing pool utilisation (owner only)"""
+    if current_user["type"] != "owner":
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    return bcrypt_pool.stats()
+
+@api_router.get("/system/login-throttle")
+async def get_login_throttle_stats(current_user: dict = Depends(get_current_user)):
+    """Report login throttling counters (owner only)"""
+    if current_user["type"] != "owner":
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    return login_throttle.stats()
+
+@api_router.get("/system/write-behind")
+async def get_write_behind_stats(current_user: dict = Depends(get_current_user)):
+    """Report write-behind queue depth and flush latency (owner only)"""
+    if current_user["type"] != "owner":
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    return time_entry_buffer.stats()
+
+@api_router.get("/system/presence")
+async def get_presence_stats(current_user: dict = Depends(get_current_user)):
+    """Report presence board size and subscriber counts (owner only)"""
+    if current_user["type"] != "owner":
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    return presence_board.stats()
+
+@api_router.get("/system/deletion-jobs")
+async def get_deletion_job_stats(current_user: dict = Depends(get_current_user)):
+    """Report cascade deletion worker counters and job backlog (owner only)"""
+    if current_user["type"] != "owner":
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    return await cascade_deleter.stats()
+
+@api_router.get("/system/migrations")
+async def get_migrations_status(current_user: dict = Depends(get_current_user)):
+    """Report applied and pending migrations (owner only)"""
+    if current_user["type"] != "owner":
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    state = await get_migration_state()
+    history = await db.migrations.find({"_id": {"$regex": "^migration:"}}).sort("_id", 1).to_list(None)
+    return {
+        "version": state["version"],
+        "latest_version": LATEST_MIGRATION,
+        "indexes_current": state["index_fingerprint"] == index_specs_fingerprint(),
+        "pending": [name for version, name, _ in MIGRATIONS if version > state["version"]],
+        "applied": [
+            {
+                "version": int(migration["_id"].split(":", 1)[1]),
+                "name": migration["name"],
+                "duration_ms": migration["duration_ms"],
+                "applied_at": migration["applied_at"],
+                "applied_by": migration["applied_by"],
+            }
+            for migration in history
+        ],
+    }
+
 # === ORIGINAL ROUTES (for compatibility) ===
 
 @api_router.get("/")
@@ -663,9 +3538,126 @@ async def get_status_checks():
     status_checks = await db.status_checks.find().to_list(1000)
     return [StatusCheck(**status_check) for status_check in status_checks]
 
+# === METRICS ===
+
+class MetricsMiddleware:
+    """Times every HTTP request, labelled by route template rather than raw
+    path so ids do not explode the label set"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+        
+        http_requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_requests_in_flight.dec()
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            http_requests_total.inc(method=scope["method"], route=path, status=str(status))
+            http_request_seconds.observe(elapsed, method=scope["method"], route=path)
+
+def _cache_samples(stat: str):
+    caches = {
+        "users": user_cache,
+        "companies": company_names_cache,
+        "qr_images": qr_image_cache,
+        "tokens": token_cache,
+    }
+    return [({"cache": name}, cache.stats()[stat]) for name, cache in caches.items()]
+
+for _stat, _type, _help in (
+    ("hits", "counter", "Cache lookups that found a live entry"),
+    ("misses", "counter", "Cache lookups that missed or found an expired entry"),
+    ("evictions", "counter", "Entries evicted to stay within max_size"),
+    ("size", "gauge", "Entries currently cached"),
+    ("hit_rate", "gauge", "Hits divided by lookups since startup"),
+):
+    metrics_registry.collected(
+        f"timetracker_cache_{_stat}{'_total' if _type == 'counter' else ''}", _help, _type,
+        lambda stat=_stat: _cache_samples(stat)
+    )
+
+metrics_registry.collected(
+    "timetracker_bcrypt_pool_in_flight", "bcrypt calls running or queued", "gauge",
+    lambda: [({}, bcrypt_pool.in_flight)]
+)
+metrics_registry.collected(
+    "timetracker_bcrypt_rejected_total", "bcrypt calls rejected because the pool was full", "counter",
+    lambda: [({}, bcrypt_pool.rejected)]
+)
+metrics_registry.collected(
+    "timetracker_write_behind_queue_depth", "Time entries waiting to be flushed", "gauge",
+    lambda: [({}, time_entry_buffer.stats()["queue_depth"])]
+)
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request):
+    """Prometheus scrape endpoint"""
+    if METRICS_TOKEN and not secrets.compare_digest(
+        request.headers.get("authorization", ""), f"Bearer {METRICS_TOKEN}"
+    ):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(metrics_registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # Include the router in the main app
 app.include_router(api_router)
 
+# === FRONTEND ===
+
+# Variants written next to each asset by `yarn build` (scripts/precompress.js)
+PRECOMPRESSED_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+# Everything under static/ has a content hash in its name
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+async def serve_frontend(path: str, request: Request):
+    """Serve the single-page app, preferring precompressed variants"""
+    if path.startswith("api/"):
+        raise HTTPException(status_code=404, detail="Not Found")
+    root = Path(FRONTEND_BUILD_DIR).resolve()
+    file_path = (root / path).resolve()
+    if not file_path.is_relative_to(root) or not file_path.is_file():
+        if "." in Path(path).name:
+            raise HTTPException(status_code=404, detail="Not Found")
+        # Client-side route: let the app's router handle it
+        file_path = root / "index.html"
+    
+    hashed = file_path.relative_to(root).parts[0] == "static"
+    headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL if hashed else "no-cache", "Vary": "Accept-Encoding"}
+    media_type = mimetypes.guess_type(file_path.name)[0] or "application/octet-stream"
+    available = tuple(
+        encoding for encoding, suffix in PRECOMPRESSED_SUFFIXES.items()
+        if file_path.with_name(file_path.name + suffix).is_file()
+    )
+    encoding = choose_encoding(request.headers.get("accept-encoding", ""), available) if available else None
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        file_path = file_path.with_name(file_path.name + PRECOMPRESSED_SUFFIXES[encoding])
+    
+    response = FileResponse(file_path, media_type=media_type, headers=headers, stat_result=os.stat(file_path))
+    if etag_matches(request, response.headers["etag"]):
+        return Response(status_code=304, headers={
+            "ETag": response.headers["etag"], "Cache-Control": headers["Cache-Control"], "Vary": "Accept-Encoding"
+        })
+    return response
+
+if FRONTEND_BUILD_DIR:
+    app.add_api_route("/{path:path}", serve_frontend, methods=["GET", "HEAD"], include_in_schema=False)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -673,6 +3665,18 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MIN_SIZE)
+app.add_middleware(MetricsMiddleware)
+if PROFILING_ENABLED:
+    install_framework_hooks()
+    app.add_middleware(
+        ProfilingMiddleware,
+        header=PROFILE_HEADER,
+        token=PROFILE_TOKEN,
+        sample_rate=PROFILE_SAMPLE_RATE,
+        slow_ms=PROFILE_SLOW_MS,
+        output_dir=PROFILE_DIR,
+    )
 
 # Configure logging
 logging.basicConfig(
@@ -681,11 +3685,46 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+_token_revocation_task: Optional[asyncio.Task] = None
+_presence_resync_task: Optional[asyncio.Task] = None
+_change_version_task: Optional[asyncio.Task] = None
+
 @app.on_event("startup")
 async def startup_event():
-    await init_default_data()
-    logger.info("Application started and default data initialized")
+    await run_migrations()
+    await token_revocations.refresh()
+    global _token_revocation_task
+    _token_revocation_task = asyncio.create_task(
+        refresh_periodically(token_revocations.refresh, TOKEN_REVOCATION_REFRESH_SECONDS, "token revocations")
+    )
+    await presence_board.load()
+    global _presence_resync_task
+    _presence_resync_task = asyncio.create_task(
+        refresh_periodically(presence_board.load, PRESENCE_RESYNC_SECONDS, "presence board")
+    )
+    await change_versions.refresh()
+    global _change_version_task
+    _change_version_task = asyncio.create_task(
+        refresh_periodically(change_versions.refresh, CHANGE_VERSION_REFRESH_SECONDS, "change versions")
+    )
+    if WRITE_BEHIND_ENABLED:
+        time_entry_buffer.start()
+    # Also resumes jobs interrupted by a previous shutdown or crash
+    cascade_deleter.start()
+    logger.info("Application started")
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    if _token_revocation_task is not None:
+        _token_revocation_task.cancel()
+    if _presence_resync_task is not None:
+        _presence_resync_task.cancel()
+    if _change_version_task is not None:
+        _change_version_task.cancel()
+    # Drain acknowledged-but-unwritten time entries before closing the client
+    await time_entry_buffer.stop()
+    await cascade_deleter.stop()
     client.close()
+    bcrypt_pool.shutdown()
+    if _qr_render_pool is not None:
+        _qr_render_pool.shutdown(wait=False)
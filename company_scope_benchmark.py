@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Company Scope Benchmark for TimeTracker Pro
+Compares the old two-step company view (load employees, then query time
+entries with a large $in) against the single indexed range scan on the
+denormalised time_entries.company_id. Runs against a scratch database on
+the MongoDB configured in backend/.env (MONGO_URL).
+
+Usage: python company_scope_benchmark.py [--employees 5000] [--entries-per-employee 20]
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+import server  # noqa: E402
+
+COMPANY_ID = "bench-company"
+SEED_CHUNK = 10000
+
+
+class CompanyScopeBenchmark:
+    def __init__(self, db_name, employees, entries_per_employee, iterations):
+        self.db = server.client[db_name]
+        self.employees = employees
+        self.entries_per_employee = entries_per_employee
+        self.iterations = iterations
+        server.db = self.db
+        print(f"🔧 Benchmarking against database: {db_name}")
+        print("=" * 60)
+
+    async def seed(self):
+        await server.client.drop_database(self.db.name)
+        await server.ensure_indexes()
+        now = datetime.utcnow()
+        employees = [
+            {
+                "id": str(uuid.uuid4()),
+                "name": f"Employee {i}",
+                "qr_code": f"QR-BENCH-{i}",
+                "company_id": COMPANY_ID,
+                "is_active": True,
+                "created_at": now,
+            }
+            for i in range(self.employees)
+        ]
+        await self.db.employees.insert_many(employees)
+
+        batch = []
+        for day in range(self.entries_per_employee):
+            check_in = now - timedelta(days=day)
+            for employee in employees:
+                batch.append({
+                    "id": str(uuid.uuid4()),
+                    "employee_id": employee["id"],
+                    "company_id": COMPANY_ID,
+                    "check_in": check_in,
+                    "check_out": check_in + timedelta(hours=8),
+                    "date": check_in.strftime("%Y-%m-%d"),
+                    "total_hours": 8.0,
+                    "created_at": now,
+                })
+                if len(batch) >= SEED_CHUNK:
+                    await self.db.time_entries.insert_many(batch)
+                    batch = []
+        if batch:
+            await self.db.time_entries.insert_many(batch)
+
+    async def old_path(self):
+        """The pre-denormalisation query: employees first, then $in on employee_id"""
+        employees = await self.db.employees.find({"company_id": COMPANY_ID}).to_list(None)
+        employee_ids = [emp["id"] for emp in employees]
+        return await self.db.time_entries.find({"employee_id": {"$in": employee_ids}}).to_list(1000)
+
+    async def new_path(self):
+        query = await server.time_entries_query({"type": "admin", "company_id": COMPANY_ID}, None, None, None)
+        return await self.db.time_entries.find(query).sort(server.TIME_ENTRY_SORT).to_list(1000)
+
+    async def measure(self, label, func):
+        timings = []
+        for _ in range(self.iterations):
+            start = time.perf_counter()
+            await func()
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        p99 = timings[min(int(len(timings) * 0.99), len(timings) - 1)]
+        print(
+            f"   {label:<10} mean {statistics.mean(timings):8.2f} ms  "
+            f"p50 {timings[len(timings) // 2]:8.2f} ms  p99 {p99:8.2f} ms"
+        )
+
+    async def run(self):
+        print(f"\n📦 Seeding {self.employees:,} employees x {self.entries_per_employee} entries...")
+        try:
+            await self.seed()
+            print(f"\n📊 Company view, {self.iterations} iterations")
+            await self.measure("old ($in)", self.old_path)
+            await self.measure("new (scan)", self.new_path)
+        finally:
+            await server.client.drop_database(self.db.name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare old and new company-scoped time entry queries")
+    parser.add_argument("--employees", type=int, default=5000)
+    parser.add_argument("--entries-per-employee", type=int, default=20)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--db", default="timetracker_company_scope_benchmark")
+    args = parser.parse_args()
+
+    benchmark = CompanyScopeBenchmark(args.db, args.employees, args.entries_per_employee, args.iterations)
+    asyncio.run(benchmark.run())
+    print("\n" + "=" * 60)
+    print("✅ Benchmark complete")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
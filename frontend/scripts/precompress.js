@@ -0,0 +1,43 @@
+// Write .br and .gz variants next to every compressible file in build/, so the
+// backend (FRONTEND_BUILD_DIR) can serve them without compressing per request.
+// Runs automatically after `yarn build` via the postbuild script.
+const fs = require('fs');
+const path = require('path');
+const zlib = require('zlib');
+
+const BUILD_DIR = path.resolve(__dirname, '..', 'build');
+const COMPRESSIBLE = /\.(js|css|html|json|svg|txt|map|ico)$/;
+// Not worth a request header round-trip below this
+const MIN_SIZE = 1024;
+
+const walk = (dir) =>
+  fs.readdirSync(dir, { withFileTypes: true }).flatMap((entry) => {
+    const fullPath = path.join(dir, entry.name);
+    return entry.isDirectory() ? walk(fullPath) : [fullPath];
+  });
+
+let written = 0;
+for (const file of walk(BUILD_DIR)) {
+  if (!COMPRESSIBLE.test(file)) continue;
+  const data = fs.readFileSync(file);
+  if (data.length < MIN_SIZE) continue;
+
+  const brotli = zlib.brotliCompressSync(data, {
+    params: {
+      [zlib.constants.BROTLI_PARAM_QUALITY]: zlib.constants.BROTLI_MAX_QUALITY,
+      [zlib.constants.BROTLI_PARAM_SIZE_HINT]: data.length,
+    },
+  });
+  const gzip = zlib.gzipSync(data, { level: zlib.constants.Z_BEST_COMPRESSION });
+  // Only keep variants that are actually smaller
+  if (brotli.length < data.length) {
+    fs.writeFileSync(`${file}.br`, brotli);
+    written += 1;
+  }
+  if (gzip.length < data.length) {
+    fs.writeFileSync(`${file}.gz`, gzip);
+    written += 1;
+  }
+}
+
+console.log(`Precompressed ${written} files in ${path.relative(process.cwd(), BUILD_DIR)}`);
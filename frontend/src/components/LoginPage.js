@@ -16,7 +16,7 @@ function LoginPage({ onLogin }) {
       const result = await authAPI.login(username, password);
       
       if (result.access_token && result.user) {
-        onLogin(result.user, result.access_token);
+        onLogin(result.user, result.access_token, result.refresh_token);
       } else {
         setError('Błędne dane logowania');
       }
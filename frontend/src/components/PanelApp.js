@@ -5,6 +5,7 @@ import UserDashboard from './UserDashboard';
 import AdminDashboard from './AdminDashboard';
 import OwnerDashboard from './OwnerDashboard';
 import { mockData } from '../utils/mockData';
+import { authAPI } from '../services/api';
 
 const PanelApp = () => {
   const [user, setUser] = useState(null);
@@ -33,14 +34,22 @@ const PanelApp = () => {
     setLoading(false);
   };
 
-  const handleLogin = (userData, token) => {
+  const handleLogin = (userData, token, refreshToken) => {
     localStorage.setItem('token', token);
+    if (refreshToken) {
+      localStorage.setItem('refreshToken', refreshToken);
+    }
     localStorage.setItem('user', JSON.stringify(userData));
     setUser(userData);
   };
 
   const handleLogout = () => {
+    const refreshToken = localStorage.getItem('refreshToken');
+    if (refreshToken) {
+      authAPI.logout(refreshToken).catch(() => {});
+    }
     localStorage.removeItem('token');
+    localStorage.removeItem('refreshToken');
     localStorage.removeItem('user');
     setUser(null);
   };
@@ -27,12 +27,42 @@ api.interceptors.request.use(
 );
 
 // Handle auth errors
+let refreshPromise = null;
+
+const refreshAccessToken = async () => {
+  const refreshToken = localStorage.getItem('refreshToken');
+  if (!refreshToken) {
+    throw new Error('No refresh token');
+  }
+  // Use a bare axios call so this request skips the interceptors below
+  const response = await axios.post(`${API_URL}/auth/refresh`, { refresh_token: refreshToken });
+  localStorage.setItem('token', response.data.access_token);
+  localStorage.setItem('refreshToken', response.data.refresh_token);
+  return response.data.access_token;
+};
+
 api.interceptors.response.use(
   (response) => response,
-  (error) => {
+  async (error) => {
+    const originalRequest = error.config;
+    if (error.response?.status === 401 && originalRequest && !originalRequest._retried) {
+      originalRequest._retried = true;
+      try {
+        // Share one refresh between concurrent requests that hit 401 together
+        refreshPromise = refreshPromise || refreshAccessToken();
+        const token = await refreshPromise;
+        originalRequest.headers.Authorization = `Bearer ${token}`;
+        return api(originalRequest);
+      } catch (refreshError) {
+        // Fall through to a full re-login
+      } finally {
+        refreshPromise = null;
+      }
+    }
     if (error.response?.status === 401) {
       // Token expired or invalid
       localStorage.removeItem('token');
+      localStorage.removeItem('refreshToken');
       localStorage.removeItem('user');
       window.location.href = '/panel';
     }
@@ -46,6 +76,11 @@ export const authAPI = {
     const response = await api.post('/auth/login', { username, password });
     return response.data;
   },
+
+  logout: async (refreshToken) => {
+    const response = await api.post('/auth/logout', { refresh_token: refreshToken });
+    return response.data;
+  },
 };
 
 // Companies API
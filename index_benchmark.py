@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Index Benchmark for TimeTracker Pro
+Measures get_current_user and login latency with and without the declared
+indexes at several collection sizes. Runs against a scratch database on the
+MongoDB configured in backend/.env (MONGO_URL).
+
+Usage: python index_benchmark.py [--sizes 10000 100000 1000000] [--iterations 200]
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+import bcrypt  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+
+import server  # noqa: E402
+
+# Cheap hash so the benchmark measures the lookup, not bcrypt
+PASSWORD = "bench123"
+PASSWORD_HASH = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(rounds=4)).decode("utf-8")
+SEED_CHUNK = 10000
+# login() reads the client address for throttling
+BENCH_REQUEST = Request({"type": "http", "client": ("127.0.0.1", 0), "headers": []})
+
+
+class IndexBenchmark:
+    def __init__(self, db_name, iterations):
+        self.db = server.client[db_name]
+        self.iterations = iterations
+        self.results = []
+        server.db = self.db
+        print(f"🔧 Benchmarking against database: {db_name}")
+        print("=" * 60)
+
+    async def seed_users(self, size):
+        """Drop the scratch database and insert `size` users"""
+        await server.client.drop_database(self.db.name)
+        now = datetime.utcnow()
+        for start in range(0, size, SEED_CHUNK):
+            batch = [
+                {
+                    "id": str(uuid.uuid4()),
+                    "username": f"user{i}",
+                    "password_hash": PASSWORD_HASH,
+                    "type": "user",
+                    "role": "user",
+                    "company_id": None,
+                    "company_name": None,
+                    "created_at": now,
+                }
+                for i in range(start, min(start + SEED_CHUNK, size))
+            ]
+            await self.db.users.insert_many(batch)
+
+    async def sample_users(self):
+        """Pick users spread across the collection so lookups are not all cached at the front"""
+        users = await self.db.users.find({}, {"_id": 0, "id": 1, "username": 1}).to_list(None)
+        step = max(len(users) // self.iterations, 1)
+        return users[::step][:self.iterations]
+
+    async def time_calls(self, func, args_list):
+        timings = []
+        for args in args_list:
+            start = time.perf_counter()
+            await func(*args)
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
+
+    async def run_size(self, size):
+        print(f"\n📦 Seeding {size:,} users...")
+        await self.seed_users(size)
+        users = await self.sample_users()
+
+        for indexed in (False, True):
+            if indexed:
+                await server.ensure_indexes()
+            else:
+                await self.db.users.drop_indexes()
+
+            current_user_args = [({"user_id": u["id"]},) for u in users]
+            login_args = [
+                (server.LoginRequest(username=u["username"], password=PASSWORD), BENCH_REQUEST) for u in users
+            ]
+            for name, func, args in (
+                ("get_current_user", server.get_current_user, current_user_args),
+                ("login", server.login, login_args),
+            ):
+                # Every sampled user must be a cache miss, or later passes time nothing but the cache
+                server.user_cache.clear()
+                timings = await self.time_calls(func, args)
+                self.record(size, indexed, name, timings)
+
+    def record(self, size, indexed, name, timings):
+        timings.sort()
+        result = {
+            "size": size,
+            "indexed": indexed,
+            "operation": name,
+            "mean_ms": statistics.mean(timings),
+            "p50_ms": timings[len(timings) // 2],
+            "p99_ms": timings[min(int(len(timings) * 0.99), len(timings) - 1)],
+        }
+        self.results.append(result)
+        label = "with indexes" if indexed else "no indexes"
+        print(
+            f"   {name:<17} {label:<13} "
+            f"mean {result['mean_ms']:8.2f} ms  p50 {result['p50_ms']:8.2f} ms  p99 {result['p99_ms']:8.2f} ms"
+        )
+
+    async def run(self, sizes):
+        try:
+            for size in sizes:
+                await self.run_size(size)
+        finally:
+            await server.client.drop_database(self.db.name)
+        return self.results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark user lookups with and without indexes")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--db", default="timetracker_index_benchmark")
+    args = parser.parse_args()
+
+    benchmark = IndexBenchmark(args.db, args.iterations)
+    asyncio.run(benchmark.run(args.sizes))
+    print("\n" + "=" * 60)
+    print("✅ Benchmark complete")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
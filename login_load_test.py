@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Login Load Test for TimeTracker Pro
+Fires bursts of concurrent logins and measures the latency of an unrelated
+endpoint while they are in flight, to check that bcrypt work no longer
+stalls the event loop.
+
+Usage: python login_load_test.py [--url http://localhost:8001] [--logins 200] [--concurrency 32]
+"""
+
+import argparse
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+class LoginLoadTester:
+    def __init__(self, backend_url, logins, concurrency):
+        self.base_url = f"{backend_url}/api"
+        self.logins = logins
+        self.concurrency = concurrency
+        self.login_statuses = {}
+        self.lock = threading.Lock()
+        print(f"🔧 Load testing backend at: {self.base_url}")
+        print("=" * 60)
+
+    def do_login(self, _):
+        response = requests.post(
+            f"{self.base_url}/auth/login",
+            json={"username": "admin", "password": "admin123"},
+            timeout=60,
+        )
+        with self.lock:
+            self.login_statuses[response.status_code] = self.login_statuses.get(response.status_code, 0) + 1
+
+    def probe(self, stop_event, samples):
+        """Hit a cheap unrelated endpoint in a loop, recording latency in ms"""
+        session = requests.Session()
+        while not stop_event.is_set():
+            start = time.perf_counter()
+            session.get(f"{self.base_url}/", timeout=60)
+            samples.append((time.perf_counter() - start) * 1000)
+
+    def measure(self, with_logins):
+        samples = []
+        stop_event = threading.Event()
+        prober = threading.Thread(target=self.probe, args=(stop_event, samples))
+        prober.start()
+        if with_logins:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                list(pool.map(self.do_login, range(self.logins)))
+        else:
+            time.sleep(3)
+        stop_event.set()
+        prober.join()
+        return samples
+
+    @staticmethod
+    def summarize(label, samples):
+        samples.sort()
+        p50 = samples[len(samples) // 2]
+        p99 = samples[min(int(len(samples) * 0.99), len(samples) - 1)]
+        print(
+            f"   {label:<16} requests {len(samples):6d}  mean {statistics.mean(samples):8.2f} ms  "
+            f"p50 {p50:8.2f} ms  p99 {p99:8.2f} ms"
+        )
+        return p99
+
+    def run(self):
+        print("\n📊 Baseline (no logins in flight)")
+        self.summarize("GET /api/", self.measure(with_logins=False))
+
+        print(f"\n📊 Under load ({self.logins} logins, concurrency {self.concurrency})")
+        start = time.perf_counter()
+        p99 = self.summarize("GET /api/", self.measure(with_logins=True))
+        elapsed = time.perf_counter() - start
+        print(f"   logins took {elapsed:.2f} s, statuses: {self.login_statuses}")
+        return p99
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure API latency while logins are in flight")
+    parser.add_argument("--url", default="http://localhost:8001")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    tester = LoginLoadTester(args.url, args.logins, args.concurrency)
+    try:
+        tester.run()
+    except requests.exceptions.ConnectionError:
+        print(f"❌ Could not connect to {args.url}")
+        return 1
+    print("\n" + "=" * 60)
+    print("✅ Load test complete")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+Shared fixtures for the backend behaviour tests.
+Each test gets a fresh in-memory mongomock database (mongomock-motor) and
+fresh in-memory mirrors, and calls the server's functions directly rather
+than through the app lifespan.
+"""
+
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "timetracker_tests")
+
+import mongomock_motor  # noqa: E402  (backend/requirements.txt; the suite needs it)
+from mongomock import filtering  # noqa: E402
+
+import server  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def db(monkeypatch):
+    # mongomock knows {"$type": "null"} but raises NotImplementedError for it.
+    # OPEN_TIME_ENTRY_FILTER and the partial unique index on open entries use
+    # it, so teach it the server's meaning: an explicit null, not a missing field.
+    monkeypatch.setitem(filtering.TYPE_MAP, "null", lambda value: value is None)
+    database = mongomock_motor.AsyncMongoMockClient()["timetracker_tests"]
+    monkeypatch.setattr(server, "db", database)
+    monkeypatch.setattr(server, "token_revocations", server.TokenRevocations())
+    monkeypatch.setattr(server, "change_versions", server.ChangeVersions())
+    monkeypatch.setattr(server, "presence_board", server.PresenceBoard(server.PRESENCE_SUBSCRIBER_QUEUE))
+    await server.ensure_indexes()
+    return database
+
+
+@pytest.fixture
+async def company(db):
+    """Company c1 with an active employee (badge QR-1) and its admin"""
+    now = datetime.utcnow()
+    await db.companies.insert_one({"id": "c1", "name": "Company 1", "created_at": now})
+    employee = server.Employee(id="e1", name="Employee 1", qr_code="QR-1", company_id="c1").dict()
+    await db.employees.insert_one(dict(employee))
+    admin = {"id": "u1", "username": "admin1", "type": "admin", "company_id": "c1", "created_at": now}
+    await db.users.insert_one(dict(admin))
+    return {"id": "c1", "employee": employee, "admin": admin}
+
+
+@pytest.fixture
+def fail_next(monkeypatch, db):
+    """fail_next("time_entries", "bulk_write", error) makes the next call of
+    that method on that collection raise error. An optional `before(original,
+    collection, *args, **kwargs)` coroutine runs first, e.g. to let part of a
+    bulk write land; with error=None its result is returned instead, e.g. to
+    race another write in ahead of the call."""
+    def install(collection_name, method, error, before=None):
+        # Collections are created on every attribute access, so patch the class
+        collection_class = type(db[collection_name])
+        original = getattr(collection_class, method)
+        armed = [True]
+
+        async def wrapper(collection, *args, **kwargs):
+            if collection.name == collection_name and armed[0]:
+                armed[0] = False
+                if before is not None:
+                    result = await before(original, collection, *args, **kwargs)
+                    if error is None:
+                        return result
+                raise error
+            return await original(collection, *args, **kwargs)
+
+        monkeypatch.setattr(collection_class, method, wrapper)
+    return install
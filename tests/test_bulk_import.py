@@ -0,0 +1,58 @@
+"""Streamed CSV/NDJSON bulk import and export (POST /api/employees/import)"""
+
+import pytest
+from starlette.requests import Request
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+def upload(body: bytes, chunk_size=7):
+    """A request whose body arrives in small chunks, split mid-line and mid-character"""
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)] or [b""]
+    messages = [{"type": "http.request", "body": chunk, "more_body": True} for chunk in chunks]
+    messages[-1]["more_body"] = False
+
+    async def receive():
+        return messages.pop(0)
+    return Request({"type": "http", "method": "POST", "headers": []}, receive)
+
+
+async def import_employees(body, admin):
+    return await server.import_employees(upload(body), format="csv", current_user=admin)
+
+
+async def test_csv_export_round_trips_through_import(db, company):
+    await db.employees.update_one({"id": "e1"}, {"$set": {"name": 'Line one\r\nline "two", three'}})
+    response = await server.export_employees(format="csv", current_user=company["admin"])
+    exported = "".join([chunk async for chunk in response.body_iterator]).encode()
+    await db.employees.delete_many({})
+
+    report = await import_employees(exported, company["admin"])
+
+    assert (report.total_rows, report.inserted, report.errors) == (1, 1, [])
+    imported = await db.employees.find_one({}, {"_id": 0})
+    assert imported["name"] == 'Line one\r\nline "two", three'
+    assert imported["qr_code"] == "QR-1"
+
+
+async def test_excel_byte_order_mark_is_ignored(db, company):
+    body = "\ufeffname,qr_code\nAda,QR-ADA\nGrace,QR-GRACE\n".encode("utf-8")
+
+    report = await import_employees(body, company["admin"])
+
+    assert (report.inserted, report.errors) == (2, [])
+    imported = await db.employees.find({"id": {"$ne": "e1"}}, {"_id": 0}).sort("name", 1).to_list(None)
+    assert [(e["name"], e["qr_code"]) for e in imported] == [("Ada", "QR-ADA"), ("Grace", "QR-GRACE")]
+
+
+async def test_malformed_rows_are_reported_and_skipped(db, company):
+    body = b'name,qr_code\n"Ada" x,QR-ADA\n\nGrace,QR-GRACE,extra\nAlan,QR-ALAN\n"Unterminated,QR-X\n'
+
+    report = await import_employees(body, company["admin"])
+
+    assert report.inserted == 1
+    assert [(error.row, error.error.split(":")[0]) for error in report.errors] == [
+        (1, "Invalid CSV"), (2, "Expected 2 columns, got 3"), (4, "Invalid CSV")
+    ]
@@ -0,0 +1,192 @@
+"""Background cascade deletion of companies and employees (CascadeDeleter)"""
+
+from datetime import datetime, timedelta
+
+import anyio
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+DEPENDENTS = ("users", "employees", "time_entries", "hours_rollups")
+
+
+async def add_time_entries(employee_id, company_id, count):
+    start = datetime(2026, 1, 5, 8)
+    entries = [
+        server.TimeEntry(
+            employee_id=employee_id,
+            company_id=company_id,
+            check_in=start + timedelta(days=day),
+            check_out=start + timedelta(days=day, hours=8),
+            date=(start + timedelta(days=day)).strftime("%Y-%m-%d"),
+            total_hours=8.0
+        ).dict()
+        for day in range(count)
+    ]
+    await server.db.time_entries.insert_many([dict(entry) for entry in entries])
+    await server.record_time_entry_changes([(None, entry) for entry in entries])
+
+
+@pytest.fixture
+async def two_companies(db, company):
+    """c1 (to be deleted) and c2 (must survive), each with users, employees and entries"""
+    await add_time_entries("e1", "c1", 5)
+    await db.employees.insert_one(server.Employee(id="e2", name="Other", qr_code="QR-2", company_id="c2").dict())
+    await db.users.insert_one({"id": "u2", "username": "admin2", "type": "admin", "company_id": "c2"})
+    await add_time_entries("e2", "c2", 3)
+    return company
+
+
+@pytest.fixture
+def deleter():
+    return server.CascadeDeleter(batch_size=2, batch_pause_ms=0)
+
+
+async def run_next_job(deleter):
+    job = await deleter._claim()
+    assert job is not None
+    await deleter._execute(job)
+    return await server.db.deletion_jobs.find_one({"id": job["id"]})
+
+
+async def counts(db, company_id):
+    return {name: await db[name].count_documents({"company_id": company_id}) for name in DEPENDENTS}
+
+
+async def test_company_job_deletes_dependents_in_batches(db, two_companies, deleter):
+    job = await deleter.enqueue("company", "c1", "c1")
+
+    finished = await run_next_job(deleter)
+
+    assert finished["id"] == job["id"]
+    assert finished["status"] == "done"
+    assert await counts(db, "c1") == {name: 0 for name in DEPENDENTS}
+    assert await counts(db, "c2") == {"users": 1, "employees": 1, "time_entries": 3, "hours_rollups": 4}
+    steps = {step["collection"]: (step["total"], step["deleted"], step["done"]) for step in finished["steps"]}
+    assert steps["time_entries"] == (5, 5, True)
+    assert deleter.counters["batches"] >= 3 + 1 + 1
+    assert server.token_revocations.is_revoked("u1", 0)
+    assert await db.tombstones.count_documents({"collection": "time_entries", "company_id": "c1"}) == 5
+
+
+async def test_employee_job_keeps_the_rest_of_the_company(db, two_companies, deleter):
+    await db.employees.delete_one({"id": "e1"})
+    await deleter.enqueue("employee", "e1", "c1")
+
+    finished = await run_next_job(deleter)
+
+    assert finished["status"] == "done"
+    assert await db.time_entries.count_documents({"employee_id": "e1"}) == 0
+    assert await db.hours_rollups.count_documents({"employee_id": "e1"}) == 0
+    assert await db.users.count_documents({"company_id": "c1"}) == 1
+
+
+async def test_job_of_a_dead_worker_resumes_from_its_progress(db, two_companies, deleter):
+    job = await deleter.enqueue("employee", "e1", "c1")
+    await db.time_entries.delete_many({"employee_id": "e1", "date": {"$in": ["2026-01-05", "2026-01-06"]}})
+    await db.deletion_jobs.update_one({"id": job["id"]}, {"$set": {
+        "status": "running",
+        "lease_owner": "dead-worker",
+        "lease_expires_at": datetime.utcnow() - timedelta(seconds=1),
+        "steps.0.total": 5,
+        "steps.0.deleted": 2,
+    }})
+
+    finished = await run_next_job(deleter)
+
+    assert finished["status"] == "done"
+    step = finished["steps"][0]
+    assert (step["total"], step["deleted"], step["done"]) == (5, 5, True)
+    assert await db.time_entries.count_documents({"employee_id": "e1"}) == 0
+
+
+async def test_job_leased_by_a_live_worker_is_not_claimed(db, deleter):
+    job = await deleter.enqueue("employee", "e1", "c1")
+    await db.deletion_jobs.update_one({"id": job["id"]}, {"$set": {
+        "status": "running",
+        "lease_owner": "other-worker",
+        "lease_expires_at": datetime.utcnow() + timedelta(seconds=60),
+    }})
+
+    assert await deleter._claim() is None
+
+
+async def test_job_fails_after_max_attempts(db, deleter, monkeypatch):
+    monkeypatch.setattr(server, "CASCADE_MAX_ATTEMPTS", 1)
+
+    async def broken_step(job, index, step):
+        raise RuntimeError("db blip")
+    monkeypatch.setattr(deleter, "_run_step", broken_step)
+    await deleter.enqueue("employee", "e1", "c1")
+
+    finished = await run_next_job(deleter)
+
+    assert finished["status"] == "failed"
+    assert finished["error"] == "db blip"
+    assert finished["attempts"] == 1
+
+
+async def test_worker_survives_when_recording_a_failure_fails(db, deleter, monkeypatch):
+    monkeypatch.setattr(server, "CASCADE_POLL_SECONDS", 0.05)
+    run_step, save = deleter._run_step, deleter._save
+
+    async def broken_step(job, index, step):
+        raise RuntimeError("db blip 1")
+
+    async def broken_save(job, fields, increments=None):
+        if "error" in fields:
+            raise RuntimeError("db blip 2")
+        return await save(job, fields, increments)
+    monkeypatch.setattr(deleter, "_run_step", broken_step)
+    monkeypatch.setattr(deleter, "_save", broken_save)
+    deleter.start()
+    try:
+        await deleter.enqueue("employee", "ghost", "c1")
+        await anyio.sleep(0.1)
+        monkeypatch.setattr(deleter, "_run_step", run_step)
+        monkeypatch.setattr(deleter, "_save", save)
+
+        job = await deleter.enqueue("employee", "e1", "c1")
+        with anyio.fail_after(2):
+            while (await db.deletion_jobs.find_one({"id": job["id"]}))["status"] != "done":
+                await anyio.sleep(0.02)
+        assert not deleter._task.done()
+    finally:
+        await deleter.stop()
+
+
+async def test_stop_hands_running_jobs_back(db, deleter):
+    job = await deleter.enqueue("employee", "e1", "c1")
+    await db.deletion_jobs.update_one({"id": job["id"]}, {"$set": {
+        "status": "running", "lease_owner": server.WORKER_ID, "lease_expires_at": datetime.utcnow() + timedelta(seconds=60),
+    }})
+
+    deleter.start()
+    await deleter.stop()
+
+    released = await db.deletion_jobs.find_one({"id": job["id"]})
+    assert released["lease_expires_at"] is None
+
+
+async def test_stop_finishes_the_current_batch_and_resumes_cleanly(db, two_companies, monkeypatch):
+    deleter = server.CascadeDeleter(batch_size=2, batch_pause_ms=20)
+    job = await deleter.enqueue("employee", "e1", "c1")
+    deleter.start()
+    with anyio.fail_after(2):
+        while deleter.counters["batches"] < 1:
+            await anyio.sleep(0.005)
+
+    await deleter.stop()
+
+    stopped = await db.deletion_jobs.find_one({"id": job["id"]})
+    remaining = await db.time_entries.count_documents({"employee_id": "e1"})
+    assert stopped["status"] == "running" and stopped["lease_expires_at"] is None
+    assert stopped["steps"][0]["deleted"] == 5 - remaining
+    assert await db.tombstones.count_documents({"collection": "time_entries"}) == 5 - remaining
+
+    finished = await run_next_job(server.CascadeDeleter(batch_size=2, batch_pause_ms=0))
+
+    assert finished["status"] == "done"
+    assert await db.tombstones.count_documents({"collection": "time_entries"}) == 5
@@ -0,0 +1,101 @@
+"""Response compression negotiation (compression.CompressionMiddleware)"""
+
+import gzip
+import zlib
+
+import brotli
+import pytest
+from starlette.responses import Response, StreamingResponse
+
+from compression import CompressionMiddleware, choose_encoding
+
+pytestmark = pytest.mark.anyio
+
+BODY = b'{"rows": [' + b",".join(b'{"id": %d}' % i for i in range(500)) + b"]}"
+
+
+async def call(response, accept_encoding="br, gzip", minimum_size=1024):
+    """Run response through the middleware; returns (headers, [body chunks])"""
+    app = CompressionMiddleware(response, minimum_size=minimum_size)
+    messages = []
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    await app(scope, receive, send)
+    headers = {key.decode(): value.decode() for key, value in messages[0]["headers"]}
+    return headers, [message.get("body", b"") for message in messages[1:]]
+
+
+def json_response(**kwargs):
+    return Response(BODY, media_type="application/json", **kwargs)
+
+
+def test_choose_encoding_prefers_brotli_and_honours_q_values():
+    assert choose_encoding("gzip, deflate, br") == "br"
+    assert choose_encoding("br;q=0, gzip") == "gzip"
+    assert choose_encoding("*") == "br"
+    assert choose_encoding("*, br;q=0") == "gzip"
+    assert choose_encoding("identity") is None
+    assert choose_encoding("") is None
+
+
+async def test_brotli_and_gzip_bodies_decode_to_the_original():
+    br_headers, br_body = await call(json_response())
+    gzip_headers, gzip_body = await call(json_response(), "gzip")
+
+    assert br_headers["content-encoding"] == "br"
+    assert brotli.decompress(b"".join(br_body)) == BODY
+    assert gzip_headers["content-encoding"] == "gzip"
+    assert gzip.decompress(b"".join(gzip_body)) == BODY
+    assert int(gzip_headers["content-length"]) == len(b"".join(gzip_body)) < len(BODY)
+    assert "Accept-Encoding" in gzip_headers["vary"]
+
+
+async def test_compressed_responses_carry_a_weak_etag():
+    headers, _ = await call(json_response(headers={"ETag": '"employees-3-abc"'}))
+
+    assert headers["etag"] == 'W/"employees-3-abc"'
+
+
+async def test_small_unaccepted_and_precompressed_responses_pass_through():
+    small_headers, small_body = await call(json_response(), minimum_size=len(BODY) + 1)
+    identity_headers, _ = await call(json_response(), "identity")
+    encoded_headers, encoded_body = await call(
+        Response(b"already", media_type="application/json", headers={"Content-Encoding": "gzip"})
+    )
+    image_headers, _ = await call(Response(BODY, media_type="image/png"))
+
+    assert "content-encoding" not in small_headers and small_body == [BODY]
+    assert "content-encoding" not in identity_headers
+    assert encoded_headers["content-encoding"] == "gzip" and encoded_body == [b"already"]
+    assert "content-encoding" not in image_headers
+
+
+async def test_event_streams_are_never_compressed():
+    async def events():
+        yield b"data: 1\n\n"
+        yield b"data: 2\n\n"
+
+    headers, body = await call(StreamingResponse(events(), media_type="text/event-stream"))
+
+    assert "content-encoding" not in headers
+    assert b"".join(body) == b"data: 1\n\ndata: 2\n\n"
+
+
+async def test_streamed_chunks_are_decodable_as_they_arrive():
+    async def rows():
+        for i in range(3):
+            yield b"row %d\n" % i
+
+    headers, chunks = await call(StreamingResponse(rows(), media_type="text/csv"), "gzip")
+    decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    received = [decoder.decompress(chunk) for chunk in chunks if chunk]
+
+    assert headers["content-encoding"] == "gzip" and "content-length" not in headers
+    assert received[:3] == [b"row 0\n", b"row 1\n", b"row 2\n"]
+
@@ -0,0 +1,67 @@
+"""Conditional list requests answered from change versions (ChangeVersions)"""
+
+import anyio
+import pytest
+from starlette.requests import Request
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+OWNER = {"id": "owner", "type": "owner", "company_id": None}
+OTHER_ADMIN = {"id": "u2", "type": "admin", "company_id": "c2"}
+
+
+async def list_employees(user, etag=None):
+    headers = [(b"if-none-match", etag.encode())] if etag else []
+    response = await server.get_employees(Request({"type": "http", "headers": headers}), user)
+    return response.status_code, response.headers["etag"]
+
+
+async def add_employee(admin, name="New"):
+    await server.create_employee(server.EmployeeCreate(name=name, company_id="c1"), admin)
+
+
+async def test_unchanged_list_is_not_modified(db, company):
+    status, etag = await list_employees(company["admin"])
+
+    assert status == 200
+    assert await list_employees(company["admin"], etag) == (304, etag)
+    assert (await list_employees(company["admin"], f'"stale", W/{etag}'))[0] == 304
+
+
+async def test_write_invalidates_its_company_and_the_owner_only(db, company):
+    _, admin_etag = await list_employees(company["admin"])
+    _, owner_etag = await list_employees(OWNER)
+    _, other_etag = await list_employees(OTHER_ADMIN)
+
+    await add_employee(company["admin"])
+
+    assert (await list_employees(company["admin"], admin_etag))[0] == 200
+    assert (await list_employees(OWNER, owner_etag))[0] == 200
+    assert (await list_employees(OTHER_ADMIN, other_etag))[0] == 304
+
+
+async def test_other_workers_see_the_bump_after_refresh(db, company):
+    other_worker = server.ChangeVersions()
+    await other_worker.refresh()
+    _, etag = await list_employees(company["admin"])
+
+    await add_employee(company["admin"])
+    assert other_worker.etag("employees", "c1") != server.change_versions.etag("employees", "c1")
+    await other_worker.refresh()
+
+    assert other_worker.etag("employees", "c1") == server.change_versions.etag("employees", "c1") != etag
+
+
+async def test_recreated_counter_does_not_reuse_an_old_etag(db, company):
+    await add_employee(company["admin"])
+    _, etag = await list_employees(company["admin"])
+
+    await db.change_versions.delete_many({})
+    await anyio.sleep(0.01)
+    restarted = server.ChangeVersions()
+    await restarted.bump("employees", ["c1"])
+
+    assert restarted.versions["employees:c1"][0] == 1
+    assert restarted.etag("employees", "c1") != etag
@@ -0,0 +1,127 @@
+"""Sliding-window login throttling with exponential lockout (LoginThrottle)"""
+
+import anyio
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+MAX_FAILURES = 3
+WINDOW = 60
+BASE = server.LOGIN_LOCKOUT_BASE_SECONDS
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(server.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture(params=["memory", "mongo"])
+def throttle(request, db):
+    store = server.MemoryAttemptStore(100) if request.param == "memory" else server.MongoAttemptStore()
+    return server.LoginThrottle(store, {"user": (MAX_FAILURES, WINDOW), "ip": (MAX_FAILURES, WINDOW)})
+
+
+async def fail(throttle, times, keys=None):
+    for _ in range(times):
+        await throttle.reserve(keys or {"user": "alice"})
+        await throttle.record_failure(keys or {"user": "alice"})
+
+
+async def retry_after(throttle, keys=None):
+    """Seconds until the keys may log in again; 0 when not locked out"""
+    keys = keys or {"user": "alice"}
+    try:
+        attempt = await throttle.reserve(keys)
+    except HTTPException as e:
+        assert e.status_code == 429
+        return int(e.headers["Retry-After"])
+    for kind, key in keys.items():
+        await throttle.store.release(f"{kind}:{key}", attempt)
+    return 0
+
+
+async def test_locks_out_after_max_failures(throttle, clock):
+    await fail(throttle, MAX_FAILURES - 1)
+    assert await retry_after(throttle) == 0
+
+    await fail(throttle, 1)
+    assert await retry_after(throttle) == BASE + 1
+
+    clock[0] += BASE + 1
+    assert await retry_after(throttle) == 0
+
+
+async def test_failures_slide_out_of_the_window(throttle, clock):
+    await fail(throttle, MAX_FAILURES - 1)
+    clock[0] += WINDOW + 1
+    await fail(throttle, MAX_FAILURES - 1)
+
+    assert await retry_after(throttle) == 0
+
+
+async def test_repeated_lockouts_double(throttle, clock):
+    await fail(throttle, MAX_FAILURES)
+    clock[0] += BASE + 1
+    await fail(throttle, MAX_FAILURES)
+
+    assert await retry_after(throttle) == 2 * BASE + 1
+
+
+async def test_lockouts_reset_after_a_quiet_window(throttle, clock):
+    await fail(throttle, MAX_FAILURES)
+    clock[0] += BASE + WINDOW + 1
+    await fail(throttle, MAX_FAILURES)
+
+    assert await retry_after(throttle) == BASE + 1
+
+
+async def test_success_clears_the_account_but_not_the_ip(throttle, clock):
+    keys = {"user": "alice", "ip": "10.0.0.1"}
+    await fail(throttle, MAX_FAILURES - 1, keys)
+    await throttle.record_success(keys, await throttle.reserve(keys))
+    await fail(throttle, 1, keys)
+
+    assert await retry_after(throttle, {"user": "alice"}) == 0
+    assert await retry_after(throttle, {"ip": "10.0.0.1"}) == BASE + 1
+
+
+async def test_concurrent_guesses_verify_at_most_the_allowed_passwords(throttle, db, company, monkeypatch):
+    await db.users.update_one({"id": "u1"}, {"$set": {"password_hash": "bcrypt hash"}})
+    monkeypatch.setattr(server, "login_throttle", throttle)
+    verified = []
+
+    async def slow_verify(password, password_hash):
+        verified.append(password)
+        await anyio.sleep(0.05)
+        return False
+    monkeypatch.setattr(server, "verify_password", slow_verify)
+    statuses = []
+
+    async def guess(n):
+        request = Request({"type": "http", "headers": [], "client": (f"10.0.0.{n}", 4000)})
+        try:
+            await server.login(server.LoginRequest(username="admin1", password=f"guess-{n}"), request)
+        except HTTPException as e:
+            statuses.append(e.status_code)
+
+    async with anyio.create_task_group() as tasks:
+        for n in range(20):
+            tasks.start_soon(guess, n)
+
+    assert len(verified) == MAX_FAILURES
+    assert sorted(statuses) == [401] * MAX_FAILURES + [429] * (20 - MAX_FAILURES)
+    assert BASE <= await retry_after(throttle, {"user": "admin1"}) <= BASE + 1
+
+
+async def test_correct_password_does_not_count_against_the_ip(throttle, clock):
+    keys = {"user": "alice", "ip": "10.0.0.1"}
+    for _ in range(MAX_FAILURES):
+        await throttle.record_success(keys, await throttle.reserve(keys))
+
+    assert await retry_after(throttle, {"ip": "10.0.0.1"}) == 0
@@ -0,0 +1,60 @@
+"""Versioned migrations applied once across workers under a lock (run_migrations)"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def migrations(monkeypatch):
+    applied = []
+
+    def migration(name, effect=None):
+        async def run():
+            applied.append(name)
+            if effect:
+                await effect()
+        return run
+    monkeypatch.setattr(server, "LATEST_MIGRATION", 2)
+    return applied, migration
+
+
+async def take_over_lock():
+    await server.db.migrations.update_one({"_id": "lock"}, {"$set": {
+        "owner": "other-worker", "expires_at": datetime.utcnow() + timedelta(seconds=60)
+    }})
+
+
+async def test_migrations_run_once_and_release_the_lock(db, migrations, monkeypatch):
+    applied, migration = migrations
+    monkeypatch.setattr(server, "MIGRATIONS", [(1, "first", migration("first")), (2, "second", migration("second"))])
+
+    await server.run_migrations()
+    await server.run_migrations()
+
+    assert applied == ["first", "second"]
+    assert (await server.get_migration_state())["version"] == 2
+    assert await db.migrations.find_one({"_id": "lock"}) is None
+
+
+async def test_worker_that_lost_the_lock_stops_without_recording(db, migrations, monkeypatch):
+    applied, migration = migrations
+    monkeypatch.setattr(server, "MIGRATIONS", [
+        (1, "slow", migration("slow", take_over_lock)), (2, "second", migration("second"))
+    ])
+    assert await server._acquire_migration_lock()
+
+    with pytest.raises(server.MigrationLockLost):
+        await server.apply_pending_migrations()
+
+    assert applied == ["slow"]
+    assert (await server.get_migration_state())["version"] == 0
+    assert (await db.migrations.find_one({"_id": "lock"}))["owner"] == "other-worker"
+
+
+def test_waiters_outlast_a_dead_holders_lock():
+    assert server.MIGRATION_WAIT_SECONDS > server.MIGRATION_LOCK_SECONDS
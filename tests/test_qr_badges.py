@@ -0,0 +1,43 @@
+"""QR badge images and printable badge sheets (GET /api/companies/{id}/qr-badges)"""
+
+import io
+import re
+import zipfile
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def fresh_qr_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(server, "qr_image_cache", server.TTLCache(100, None))
+    monkeypatch.setattr(server, "QR_CACHE_DIR", str(tmp_path))
+
+
+async def badges(company_id, admin, **params):
+    response = await server.export_company_qr_badges(company_id, current_user=admin, **params)
+    return response.body
+
+
+async def test_company_without_employees_gets_a_blank_pdf_page(db, company):
+    await db.employees.delete_many({})
+
+    pdf = await badges("c1", company["admin"], format="pdf", image_format="png")
+
+    assert pdf.startswith(b"%PDF")
+    assert len(re.findall(rb"/Type\s*/Page\b", pdf)) == 1
+
+
+async def test_badges_are_rendered_once_and_reused_from_disk(db, company, tmp_path, monkeypatch):
+    first = await badges("c1", company["admin"], format="zip", image_format="svg")
+    monkeypatch.setattr(server, "qr_image_cache", server.TTLCache(100, None))
+    monkeypatch.setattr(server, "render_qr", None)  # any render now fails
+
+    again = await badges("c1", company["admin"], format="zip", image_format="svg")
+
+    assert len(list(tmp_path.glob("*.svg"))) == 1
+    assert zipfile.ZipFile(io.BytesIO(again)).read("QR-1_Employee_1.svg") == \
+        zipfile.ZipFile(io.BytesIO(first)).read("QR-1_Employee_1.svg")
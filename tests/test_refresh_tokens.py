@@ -0,0 +1,69 @@
+"""Rotating refresh tokens with reuse detection (POST /api/auth/refresh, /api/auth/logout)"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def session(db, company):
+    """Tokens issued by a login of u1"""
+    await db.users.update_one({"id": "u1"}, {"$set": {"role": "admin"}})
+    return await server.build_login_response(await db.users.find_one({"id": "u1"}))
+
+
+async def refresh(token):
+    return await server.refresh_access_token(server.RefreshRequest(refresh_token=token))
+
+
+async def rejected(token):
+    with pytest.raises(HTTPException) as error:
+        await refresh(token)
+    return error.value.status_code
+
+
+async def test_refresh_rotates_the_token_within_its_family(db, session):
+    rotated = await refresh(session.refresh_token)
+
+    assert rotated.refresh_token != session.refresh_token
+    assert rotated.user.id == "u1" and rotated.user.company_name == "Company 1"
+    assert len(await db.refresh_tokens.distinct("family_id")) == 1
+    assert (await refresh(rotated.refresh_token)).refresh_token
+
+
+async def test_reusing_a_rotated_token_ends_the_whole_session(db, session):
+    rotated = await refresh(session.refresh_token)
+
+    assert await rejected(session.refresh_token) == 401
+    assert await rejected(rotated.refresh_token) == 401
+    assert await db.refresh_tokens.count_documents({}) == 0
+
+
+async def test_reuse_leaves_other_logins_alone(db, session):
+    other = await server.build_login_response(await db.users.find_one({"id": "u1"}))
+    await refresh(session.refresh_token)
+
+    await rejected(session.refresh_token)
+
+    assert (await refresh(other.refresh_token)).user.id == "u1"
+
+
+async def test_expired_and_unknown_tokens_are_rejected(db, session):
+    await db.refresh_tokens.update_many({}, {"$set": {"expires_at": datetime.utcnow() - timedelta(seconds=1)}})
+
+    assert await rejected(session.refresh_token) == 401
+    assert await rejected("never-issued") == 401
+
+
+async def test_logout_revokes_the_family(db, session):
+    rotated = await refresh(session.refresh_token)
+
+    await server.logout(server.RefreshRequest(refresh_token=rotated.refresh_token))
+
+    assert await rejected(rotated.refresh_token) == 401
+    assert await db.refresh_tokens.count_documents({}) == 0
@@ -0,0 +1,76 @@
+"""Incremental hours rollups and GET /api/reports/hours"""
+
+from datetime import datetime
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+async def create(admin, check_in, check_out=None):
+    entry = server.TimeEntryCreate(employee_id="e1", check_in=check_in, check_out=check_out)
+    return await server.create_time_entry(entry, admin)
+
+
+async def rollups(db):
+    """Non-empty rollup documents keyed by (employee_id, period, key)"""
+    return {
+        (rollup["employee_id"], rollup["period"], rollup["key"]):
+            (rollup["company_id"], round(rollup["total_hours"], 6), rollup["entry_count"])
+        async for rollup in db.hours_rollups.find({}, {"_id": 0})
+        if rollup["entry_count"]
+    }
+
+
+async def report(admin, date_from, date_to, period="day", group_by="employee"):
+    return await server.get_hours_report(
+        date_from=date_from, date_to=date_to, period=period, group_by=group_by,
+        employee_id=None, company_id=None, current_user=admin
+    )
+
+
+@pytest.fixture
+async def entries(db, company):
+    """Entries written through the routes: created, closed by an update and deleted"""
+    admin = company["admin"]
+    await create(admin, datetime(2026, 1, 5, 8), datetime(2026, 1, 5, 16))
+    opened = await create(admin, datetime(2026, 1, 6, 9))
+    await server.update_time_entry(opened.id, server.TimeEntryUpdate(check_out=datetime(2026, 1, 6, 17)), admin)
+    await create(admin, datetime(2026, 1, 6, 18), datetime(2026, 1, 6, 20))
+    removed = await create(admin, datetime(2026, 2, 2, 8), datetime(2026, 2, 2, 12))
+    await server.update_time_entry(removed.id, server.TimeEntryUpdate(check_in=datetime(2026, 2, 2, 9)), admin)
+    await server.delete_time_entry(removed.id, admin)
+    return admin
+
+
+async def test_incremental_rollups_match_a_full_rebuild(db, entries):
+    incremental = await rollups(db)
+
+    await server.rebuild_hours_rollups()
+
+    assert incremental == await rollups(db)
+    assert incremental == {
+        ("e1", "day", "2026-01-05"): ("c1", 8.0, 1),
+        ("e1", "day", "2026-01-06"): ("c1", 10.0, 2),
+        ("e1", "month", "2026-01"): ("c1", 18.0, 3),
+    }
+
+
+async def test_report_totals_by_day_week_and_month(db, entries):
+    days = await report(entries, "2026-01-01", "2026-02-28")
+    weeks = await report(entries, "2026-01-01", "2026-02-28", period="week", group_by="company")
+    months = await report(entries, "2026-01-15", "2026-02-28", period="month")
+
+    assert [(row.period, row.total_hours, row.entry_count) for row in days.rows] == [
+        ("2026-01-05", 8.0, 1), ("2026-01-06", 10.0, 2),
+    ]
+    assert [(row.period, row.company_id, row.total_hours) for row in weeks.rows] == [("2026-01-05", "c1", 18.0)]
+    assert [(row.period, row.employee_id, row.total_hours) for row in months.rows] == [("2026-01", "e1", 18.0)]
+
+
+async def test_report_is_limited_to_the_users_company(db, entries):
+    other = {"id": "u2", "type": "admin", "company_id": "c2"}
+
+    assert (await report(other, "2026-01-01", "2026-02-28")).rows == []
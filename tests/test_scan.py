@@ -0,0 +1,90 @@
+"""QR scan check-in/check-out toggle (POST /api/time-entries/scan)"""
+
+from datetime import datetime, timedelta
+
+import anyio
+import pytest
+from fastapi import HTTPException
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+async def scan(admin, qr_code="QR-1"):
+    return await server.scan_time_entry(server.ScanRequest(qr_code=qr_code), admin)
+
+
+@pytest.fixture
+def interleaved(monkeypatch, db):
+    """Yield to other tasks before every write, so concurrent scans really race"""
+    collection_class = type(db.time_entries)
+
+    def yielding(original):
+        async def method(collection, *args, **kwargs):
+            await anyio.sleep(0)
+            return await original(collection, *args, **kwargs)
+        return method
+    for name in ("find_one_and_update", "insert_one"):
+        monkeypatch.setattr(collection_class, name, yielding(getattr(collection_class, name)))
+
+
+async def test_scans_toggle_between_check_in_and_check_out(db, company):
+    first = await scan(company["admin"])
+    second = await scan(company["admin"])
+
+    assert (first.action, second.action) == ("check_in", "check_out")
+    assert second.time_entry.id == first.time_entry.id
+    assert second.time_entry.total_hours is not None
+    assert await db.time_entries.count_documents(server.OPEN_TIME_ENTRY_FILTER) == 0
+
+
+async def test_concurrent_double_scan_checks_in_once(db, company, interleaved):
+    actions = []
+
+    async def scan_once():
+        actions.append((await scan(company["admin"])).action)
+
+    async with anyio.create_task_group() as tasks:
+        tasks.start_soon(scan_once)
+        tasks.start_soon(scan_once)
+
+    assert sorted(actions) == ["check_in", "check_out"]
+    assert await db.time_entries.count_documents({"employee_id": "e1"}) == 1
+    assert await db.time_entries.count_documents(server.OPEN_TIME_ENTRY_FILTER) == 0
+
+
+async def test_badge_of_another_company_is_not_found(db, company):
+    await db.employees.insert_one(server.Employee(id="e2", name="Other", qr_code="QR-2", company_id="c2").dict())
+
+    with pytest.raises(HTTPException) as error:
+        await scan(company["admin"], "QR-2")
+
+    assert error.value.status_code == 404
+    assert await db.time_entries.count_documents({}) == 0
+
+
+async def test_migration_closes_duplicate_open_entries(db, company):
+    await db.time_entries.drop_index("open_entries_by_employee")
+    await db.time_entries.create_index(
+        "employee_id", name="open_entries_by_employee", partialFilterExpression=server.OPEN_TIME_ENTRY_FILTER
+    )
+    start = datetime(2026, 1, 5, 8)
+    entries = [
+        server.TimeEntry(employee_id="e1", company_id="c1", check_in=start + timedelta(hours=hour), date="2026-01-05").dict()
+        for hour in (0, 2, 3)
+    ]
+    await db.time_entries.insert_many([dict(entry) for entry in entries])
+
+    closed = await server.close_duplicate_open_entries()
+
+    assert closed == 2
+    stored = await db.time_entries.find({}, {"_id": 0}).sort("check_in", 1).to_list(None)
+    assert [(e["check_out"], e["total_hours"]) for e in stored] == [
+        (start + timedelta(hours=2), 2.0), (start + timedelta(hours=3), 1.0), (None, None)
+    ]
+    # The non-unique index is dropped for ensure_indexes to rebuild as unique. mongomock
+    # ignores partialFilterExpression when building over existing documents (it sees the
+    # closed entries as duplicates), so only the absence of a non-unique one is checked.
+    indexes = await db.time_entries.index_information()
+    assert indexes.get("open_entries_by_employee", {"unique": True}).get("unique")
@@ -0,0 +1,119 @@
+"""Idempotency keys of offline kiosk scan batches (POST /api/time-entries/scan-batch)"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+def scan_batch(*keys):
+    return server.ScanBatchRequest(events=[
+        {"idempotency_key": key, "qr_code": "QR-1", "scanned_at": datetime.utcnow()} for key in keys
+    ])
+
+
+async def test_replayed_batch_reports_original_result(db, company):
+    first = await server.scan_time_entries_batch(scan_batch("k1"), company["admin"])
+    replay = await server.scan_time_entries_batch(scan_batch("k1"), company["admin"])
+
+    assert first.results[0].status == "applied"
+    assert replay.results[0].status == "duplicate"
+    assert replay.results[0].action == "check_in"
+    assert replay.results[0].time_entry_id == first.results[0].time_entry_id
+    assert await db.time_entries.count_documents({}) == 1
+
+
+async def test_failed_batch_releases_keys_for_retry(db, company, fail_next):
+    fail_next("time_entries", "bulk_write", RuntimeError("db blip"))
+    with pytest.raises(RuntimeError):
+        await server.scan_time_entries_batch(scan_batch("k1"), company["admin"])
+    assert await db.scan_events.count_documents({}) == 0
+
+    retry = await server.scan_time_entries_batch(scan_batch("k1"), company["admin"])
+
+    assert retry.results[0].status == "applied"
+    assert retry.results[0].action == "check_in"
+    assert await db.time_entries.count_documents({"check_out": None}) == 1
+
+
+async def test_stale_pending_key_is_claimed_again(db, company):
+    abandoned_at = datetime.utcnow() - timedelta(seconds=server.SCAN_CLAIM_LEASE_SECONDS + 1)
+    await db.scan_events.insert_one({"idempotency_key": "k1", "status": "pending", "created_at": abandoned_at})
+
+    result = await server.scan_time_entries_batch(scan_batch("k1"), company["admin"])
+
+    assert result.results[0].status == "applied"
+    event = await db.scan_events.find_one({"idempotency_key": "k1"})
+    assert event["status"] == "applied"
+
+
+async def test_pending_key_within_lease_is_a_duplicate(db, company):
+    await db.scan_events.insert_one({"idempotency_key": "k1", "status": "pending", "created_at": datetime.utcnow()})
+
+    result = await server.scan_time_entries_batch(scan_batch("k1", "k2"), company["admin"])
+
+    assert [r.status for r in result.results] == ["duplicate", "applied"]
+    assert await db.time_entries.count_documents({}) == 1
+
+
+@pytest.fixture
+async def second_employee(db, company):
+    await db.employees.insert_one(server.Employee(id="e2", name="Employee 2", qr_code="QR-2", company_id="c1").dict())
+
+
+def kiosk_batch(*events):
+    return server.ScanBatchRequest(events=[
+        {"idempotency_key": key, "qr_code": qr_code, "scanned_at": datetime.utcnow()} for key, qr_code in events
+    ])
+
+
+async def test_partial_bulk_failure_keeps_the_written_keys(db, company, second_employee, fail_next):
+    async def online_scan_first(original, collection, *args, **kwargs):
+        await server.scan_time_entry(server.ScanRequest(qr_code="QR-1"), company["admin"])
+        return await original(collection, *args, **kwargs)
+    fail_next("time_entries", "bulk_write", None, online_scan_first)
+
+    result = await server.scan_time_entries_batch(kiosk_batch(("k1", "QR-1"), ("k2", "QR-2")), company["admin"])
+    retry = await server.scan_time_entries_batch(kiosk_batch(("k1", "QR-1"), ("k2", "QR-2")), company["admin"])
+
+    assert [(r.status, r.error) for r in result.results] == [("error", "Employee is already checked in"), ("applied", None)]
+    assert [r.status for r in retry.results] == ["duplicate", "duplicate"]
+    assert await db.scan_events.count_documents({"status": {"$ne": "pending"}}) == 2
+    assert await db.time_entries.count_documents({"employee_id": "e1"}) == 1
+    assert await db.time_entries.count_documents({"employee_id": "e2"}) == 1
+
+
+async def test_failed_write_releases_only_its_own_key(db, company, second_employee, fail_next):
+    async def second_insert_fails(original, collection, operations, *args, **kwargs):
+        await original(collection, operations[:1], *args, **kwargs)
+    error = BulkWriteError({"writeErrors": [{"index": 1, "code": 6, "errmsg": "host unreachable"}], "nInserted": 1})
+    fail_next("time_entries", "bulk_write", error, second_insert_fails)
+
+    result = await server.scan_time_entries_batch(kiosk_batch(("k1", "QR-1"), ("k2", "QR-2")), company["admin"])
+    retry = await server.scan_time_entries_batch(kiosk_batch(("k1", "QR-1"), ("k2", "QR-2")), company["admin"])
+
+    assert [r.status for r in result.results] == ["applied", "error"]
+    assert [(r.status, r.action) for r in retry.results] == [("duplicate", "check_in"), ("applied", "check_in")]
+    assert await db.time_entries.count_documents({}) == 2
+
+
+async def test_check_out_of_an_entry_closed_meanwhile_is_an_error(db, company, fail_next):
+    def offline(key, minutes_ago):
+        return server.ScanBatchRequest(events=[
+            {"idempotency_key": key, "qr_code": "QR-1", "scanned_at": datetime.utcnow() - timedelta(minutes=minutes_ago)}
+        ])
+    await server.scan_time_entries_batch(offline("k1", 10), company["admin"])
+
+    async def online_scan_first(original, collection, *args, **kwargs):
+        await server.scan_time_entry(server.ScanRequest(qr_code="QR-1"), company["admin"])
+        return await original(collection, *args, **kwargs)
+    fail_next("time_entries", "bulk_write", None, online_scan_first)
+    result = await server.scan_time_entries_batch(offline("k2", 5), company["admin"])
+
+    assert (result.results[0].status, result.results[0].error) == ("error", "Employee is already checked out")
+    entries = await db.time_entries.find({}, {"_id": 0}).to_list(None)
+    assert len(entries) == 1 and entries[0]["check_out"] is not None
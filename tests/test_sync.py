@@ -0,0 +1,107 @@
+"""Incremental sync cursors (GET /api/sync)"""
+
+from datetime import datetime, timedelta
+
+import anyio
+import pytest
+from fastapi import HTTPException
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+OWNER = {"id": "owner", "type": "owner", "company_id": None}
+ADMIN = {"id": "u1", "type": "admin", "company_id": "c1"}
+
+
+@pytest.fixture(autouse=True)
+def no_settle_time(monkeypatch):
+    monkeypatch.setattr(server, "SYNC_SETTLE_SECONDS", 0)
+
+
+async def add_employees(db, count, company_id="c1", prefix="e"):
+    updated_at = datetime.utcnow().replace(microsecond=0) - timedelta(seconds=10)
+    await db.employees.insert_many([
+        server.Employee(
+            id=f"{prefix}{i}", name=f"Employee {i}", qr_code=f"QR-{prefix}{i}", company_id=company_id, updated_at=updated_at
+        ).dict()
+        for i in range(count)
+    ])
+
+
+async def sync(since=None, limit=500, user=ADMIN):
+    return await server.sync_changes(since=since, limit=limit, current_user=user)
+
+
+async def test_pages_through_a_full_load_then_returns_nothing(db):
+    await add_employees(db, 3)
+
+    first = await sync(limit=2)
+    second = await sync(first.cursor, limit=2)
+    idle = await sync(second.cursor)
+
+    assert (len(first.employees), first.has_more) == (2, True)
+    assert (len(second.employees), second.has_more) == (1, False)
+    assert {e.id for e in first.employees + second.employees} == {"e0", "e1", "e2"}
+    assert idle.employees == [] and idle.deleted == [] and not idle.has_more
+
+
+async def test_reports_changes_and_deletions_after_the_cursor(db):
+    await add_employees(db, 2)
+    loaded = await sync()
+    await anyio.sleep(0.01)
+
+    await db.employees.update_one({"id": "e0"}, {"$set": {"name": "Renamed", "updated_at": datetime.utcnow()}})
+    deleted = await db.employees.find_one_and_delete({"id": "e1"})
+    await server.write_tombstone("employees", deleted)
+    await anyio.sleep(0.01)
+    delta = await sync(loaded.cursor)
+
+    assert [e.name for e in delta.employees] == ["Renamed"]
+    assert [(d.collection, d.id) for d in delta.deleted] == [("employees", "e1")]
+
+
+async def test_changes_inside_the_settle_time_are_held_back_not_skipped(db, monkeypatch):
+    monkeypatch.setattr(server, "SYNC_SETTLE_SECONDS", 60)
+    await db.employees.insert_one(server.Employee(id="fresh", name="Fresh", qr_code="QR-F", company_id="c1").dict())
+
+    held = await sync()
+    monkeypatch.setattr(server, "SYNC_SETTLE_SECONDS", 0)
+    later = await sync(held.cursor)
+
+    assert held.employees == []
+    assert [e.id for e in later.employees] == ["fresh"]
+
+
+async def test_only_the_users_company_is_synced(db):
+    await add_employees(db, 1, "c1", "a")
+    await add_employees(db, 1, "c2", "b")
+
+    assert [e.id for e in (await sync()).employees] == ["a0"]
+    assert {e.id for e in (await sync(user=OWNER)).employees} == {"a0", "b0"}
+
+
+async def test_cursor_older_than_deletion_history_is_gone(db):
+    expired = datetime.utcnow() - timedelta(days=server.SYNC_TOMBSTONE_RETENTION_DAYS + 1)
+    cursor = server.encode_sync_cursor({source: (expired, None) for source in server.SYNC_SOURCES})
+
+    with pytest.raises(HTTPException) as gone:
+        await sync(cursor)
+    with pytest.raises(HTTPException) as invalid:
+        await sync("not-a-cursor")
+
+    assert gone.value.status_code == 410
+    assert invalid.value.status_code == 400
+
+
+async def test_entries_flushed_late_are_synced_after_the_cursor(db, company):
+    buffer = server.TimeEntryWriteBuffer(100, 100, 10)
+    await buffer.add(server.TimeEntry(employee_id="e1", company_id="c1", check_in=datetime(2026, 1, 5, 8), date="2026-01-05").dict())
+    await anyio.sleep(0.01)
+    loaded = await sync()
+    await anyio.sleep(0.01)
+
+    await buffer._flush([await buffer._queue.get()])
+    delta = await sync(loaded.cursor)
+
+    assert len(delta.time_entries) == 1
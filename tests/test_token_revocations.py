@@ -0,0 +1,67 @@
+"""Access token revocation shared between workers (TokenRevocations)"""
+
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+OWNER = {"id": "owner", "type": "owner", "company_id": None}
+
+
+@pytest.fixture
+async def admin(db, company):
+    await db.users.update_one({"id": "u1"}, {"$set": {"role": "admin", "token_version": 0}})
+    return await db.users.find_one({"id": "u1"})
+
+
+async def authenticate(token):
+    payload = server.verify_token(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token))
+    return await server.get_current_user(payload)
+
+
+@pytest.fixture
+async def other_worker(db):
+    """A second worker's mirror, already loaded once"""
+    mirror = server.TokenRevocations()
+    await mirror.refresh()
+    return mirror
+
+
+async def test_user_change_revokes_old_tokens_on_other_workers_after_refresh(db, admin, other_worker, monkeypatch):
+    token = server.create_access_token(server.token_claims(admin))
+    assert (await authenticate(token))["id"] == "u1"
+
+    await server.update_user("u1", server.UserUpdate(type="user"), OWNER)
+    assert server.token_revocations.is_revoked("u1", 0)
+    assert not other_worker.is_revoked("u1", 0)
+
+    await other_worker.refresh()
+    monkeypatch.setattr(server, "token_revocations", other_worker)
+    with pytest.raises(HTTPException) as revoked:
+        await authenticate(token)
+
+    assert revoked.value.status_code == 401
+    assert revoked.value.detail == "Token revoked"
+    fresh = await db.users.find_one({"id": "u1"})
+    assert (await authenticate(server.create_access_token(server.token_claims(fresh))))["type"] == "user"
+
+
+async def test_deleted_user_is_revoked_at_every_version(db, admin, other_worker):
+    await server.delete_user("u1", OWNER)
+    await other_worker.refresh()
+
+    assert other_worker.is_revoked("u1", server.TOKEN_VERSION_REVOKED - 1)
+    assert not other_worker.is_revoked("someone-else", 0)
+
+
+async def test_revocations_only_move_forward(db, other_worker):
+    await server.token_revocations.revoke("u1", 5)
+    await server.token_revocations.revoke("u1", 3)
+    await other_worker.refresh()
+
+    assert other_worker.is_revoked("u1", 4)
+    assert not other_worker.is_revoked("u1", 5)
+    assert other_worker.stats()["size"] == 1
@@ -0,0 +1,133 @@
+"""Write-behind buffer for POST /api/time-entries (TimeEntryWriteBuffer)"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from pymongo.errors import BulkWriteError
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+def closed_entries(count, employee_id="e1"):
+    start = datetime(2026, 1, 5, 8)
+    return [
+        server.TimeEntry(
+            employee_id=employee_id,
+            company_id="c1",
+            check_in=start + timedelta(days=day),
+            check_out=start + timedelta(days=day, hours=8),
+            date=(start + timedelta(days=day)).strftime("%Y-%m-%d"),
+            total_hours=8.0
+        ).dict()
+        for day in range(count)
+    ]
+
+
+def open_entry(employee_id, check_in):
+    return server.TimeEntry(
+        employee_id=employee_id, company_id="c1", check_in=check_in, date=check_in.strftime("%Y-%m-%d")
+    ).dict()
+
+
+async def month_rollup(db, employee_id="e1"):
+    return await db.hours_rollups.find_one({"employee_id": employee_id, "period": "month", "key": "2026-01"})
+
+
+def partial_write(landed, errors):
+    """A bulk error after the first `landed` rows of the batch were written"""
+    async def before(original, collection, documents, *args, **kwargs):
+        await original(collection, list(documents)[:landed], *args, **kwargs)
+    error = BulkWriteError({"writeErrors": errors, "nInserted": landed})
+    return error, before
+
+
+async def test_partial_bulk_error_records_every_written_entry(db, fail_next):
+    error, before = partial_write(4, [{"index": 4, "code": 6, "errmsg": "host unreachable"}])
+    fail_next("time_entries", "insert_many", error, before)
+    buffer = server.TimeEntryWriteBuffer(100, 100, 10)
+
+    await buffer._flush(closed_entries(5))
+
+    assert await db.time_entries.count_documents({}) == 5
+    assert (await month_rollup(db))["entry_count"] == 5
+    assert buffer.counters["flushed"] == 5
+    assert buffer.counters["dropped"] == 0
+
+
+async def test_dropped_entries_do_not_hide_written_ones(db, monkeypatch, fail_next):
+    monkeypatch.setattr(server.TimeEntryWriteBuffer, "FLUSH_RETRIES", 1)
+    error, before = partial_write(2, [{"index": 2, "code": 6, "errmsg": "host unreachable"}])
+    fail_next("time_entries", "insert_many", error, before)
+    buffer = server.TimeEntryWriteBuffer(100, 100, 10)
+
+    await buffer._flush(closed_entries(3))
+
+    assert buffer.counters["flushed"] == 2
+    assert buffer.counters["dropped"] == 1
+    assert (await month_rollup(db))["entry_count"] == 2
+
+
+async def test_entries_written_by_an_earlier_attempt_count_as_flushed(db):
+    entries = closed_entries(2)
+    await db.time_entries.insert_one(dict(entries[0]))
+    buffer = server.TimeEntryWriteBuffer(100, 100, 10)
+
+    await buffer._flush(entries)
+
+    assert await db.time_entries.count_documents({}) == 2
+    assert buffer.counters["flushed"] == 2
+    assert buffer.counters["conflicts"] == 0
+
+
+async def test_second_open_entry_is_discarded_as_a_conflict(db):
+    await db.time_entries.insert_one(open_entry("e1", datetime(2026, 1, 5, 8)))
+    buffer = server.TimeEntryWriteBuffer(100, 100, 10)
+
+    await buffer._flush([open_entry("e1", datetime(2026, 1, 5, 9)), open_entry("e2", datetime(2026, 1, 5, 9))])
+
+    assert await db.time_entries.count_documents({"employee_id": "e1"}) == 1
+    assert buffer.counters["flushed"] == 1
+    assert buffer.counters["conflicts"] == 1
+
+
+async def test_flusher_survives_a_failure_after_writing(db, monkeypatch):
+    record = server.record_time_entry_changes
+    calls = []
+
+    async def failing_once(changes):
+        calls.append(len(changes))
+        if len(calls) == 1:
+            raise RuntimeError("rollup write failed")
+        await record(changes)
+    monkeypatch.setattr(server, "record_time_entry_changes", failing_once)
+    buffer = server.TimeEntryWriteBuffer(100, 2, 10)
+    buffer.start()
+
+    for entry in closed_entries(4):
+        await buffer.add(entry)
+    await buffer.stop()
+
+    assert await db.time_entries.count_documents({}) == 4
+    assert buffer.counters["flushed"] == 4
+    assert len(calls) >= 2
+
+
+async def test_second_open_check_in_is_rejected_before_queueing(db, company, monkeypatch):
+    buffer = server.TimeEntryWriteBuffer(100, 100, 10)
+    monkeypatch.setattr(server, "WRITE_BEHIND_ENABLED", True)
+    monkeypatch.setattr(server, "time_entry_buffer", buffer)
+    check_in = server.TimeEntryCreate(employee_id="e1", check_in=datetime(2026, 1, 5, 8))
+
+    await server.create_time_entry(check_in, company["admin"])
+    with pytest.raises(HTTPException) as queued:
+        await server.create_time_entry(check_in, company["admin"])
+    await buffer._flush([await buffer._queue.get()])
+    with pytest.raises(HTTPException) as stored:
+        await server.create_time_entry(check_in, company["admin"])
+
+    assert queued.value.status_code == stored.value.status_code == 409
+    assert buffer._queue.empty()
+    assert await db.time_entries.count_documents({"employee_id": "e1"}) == 1
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+User List Round-Trip Benchmark for TimeTracker Pro
+Counts MongoDB commands issued by GET /api/users (get_users) and fails if
+they exceed the budget, guarding against a return of the per-user company
+lookup. Runs against a scratch database on the MongoDB configured in
+backend/.env (MONGO_URL).
+
+Usage: python users_roundtrip_benchmark.py [--users 1000] [--companies 50] [--max-round-trips 3]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+from pymongo import monitoring  # noqa: E402
+
+import server  # noqa: E402
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts commands sent to the server, grouped by command name"""
+
+    def __init__(self):
+        self.commands = {}
+
+    def reset(self):
+        self.commands = {}
+
+    @property
+    def total(self):
+        return sum(self.commands.values())
+
+    def started(self, event):
+        self.commands[event.command_name] = self.commands.get(event.command_name, 0) + 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+class UsersRoundTripBenchmark:
+    def __init__(self, db_name, users, companies):
+        self.counter = CommandCounter()
+        self.client = AsyncIOMotorClient(os.environ["MONGO_URL"], event_listeners=[self.counter])
+        self.db = self.client[db_name]
+        self.users = users
+        self.companies = companies
+        server.db = self.db
+        print(f"🔧 Benchmarking against database: {db_name}")
+        print("=" * 60)
+
+    async def seed(self):
+        await self.client.drop_database(self.db.name)
+        now = datetime.utcnow()
+        companies = [
+            {"id": str(uuid.uuid4()), "name": f"Company {i}", "created_at": now}
+            for i in range(self.companies)
+        ]
+        await self.db.companies.insert_many(companies)
+        await self.db.users.insert_many([
+            {
+                "id": str(uuid.uuid4()),
+                "username": f"user{i}",
+                "password_hash": "unused",
+                "type": "user",
+                "role": "user",
+                "company_id": companies[i % len(companies)]["id"],
+                "company_name": None,
+                "created_at": now,
+            }
+            for i in range(self.users)
+        ])
+
+    async def measure(self, label):
+        self.counter.reset()
+        start = time.perf_counter()
+        await server.get_users(current_user={"type": "owner"})
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"   {label:<12} round trips {self.counter.total:5d}  {elapsed:8.2f} ms  {self.counter.commands}")
+        return self.counter.total
+
+    async def run(self):
+        print(f"\n📦 Seeding {self.users:,} users across {self.companies} companies...")
+        try:
+            await self.seed()
+            server.company_names_cache.clear()
+            print("\n📊 GET /api/users")
+            cold = await self.measure("cold cache")
+            warm = await self.measure("warm cache")
+        finally:
+            await self.client.drop_database(self.db.name)
+            self.client.close()
+        return cold, warm
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count MongoDB round trips made by get_users")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--companies", type=int, default=50)
+    parser.add_argument("--max-round-trips", type=int, default=3)
+    parser.add_argument("--db", default="timetracker_users_roundtrip_benchmark")
+    args = parser.parse_args()
+
+    benchmark = UsersRoundTripBenchmark(args.db, args.users, args.companies)
+    cold, warm = asyncio.run(benchmark.run())
+    print("\n" + "=" * 60)
+    if cold > args.max_round_trips:
+        print(f"❌ get_users made {cold} round trips (budget {args.max_round_trips})")
+        return 1
+    print(f"✅ get_users within budget: {cold} cold / {warm} warm round trips")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())